@@ -0,0 +1,325 @@
+"""
+Benchmarks for the Cap rate limiting strategies.
+
+Every limiter class is mounted on a FastAPI route and driven in-process
+through httpx's ASGI transport, so the numbers include FastAPI's dependency
+handling but no network stack between client and app. For each strategy the
+suite reports:
+
+- requests/sec through the app, next to an unlimited baseline route,
+- p50/p99 of the time spent inside the limiter dependency,
+- Redis commands per request (from `INFO stats`),
+- memory per key for each key cardinality (from `INFO memory`, or
+  `tracemalloc` snapshots for the in-memory backend).
+
+Usage:
+    python benchmarks/bench_limiters.py
+    python benchmarks/bench_limiters.py --redis-url redis://localhost:6379/15
+    python benchmarks/bench_limiters.py --backend memory
+    python benchmarks/bench_limiters.py --cardinalities 1,10000,1000000,10000000
+
+Without `--redis-url` a throwaway Redis is started with testcontainers, like
+the test suite does. The benchmark flushes the database it runs against.
+"""
+
+import argparse
+import asyncio
+import gc
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+from fastapi import Depends, FastAPI, Request, Response
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapicap import (  # noqa: E402
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap.backends import MemoryBackend  # noqa: E402
+from fastapicap.base_limiter import BaseLimiter  # noqa: E402
+
+# Limits are high enough that the measured requests are never rejected, so
+# every strategy is timed on its allow path.
+HIGH = 10**9
+
+# Allocations made under this directory are what the in-memory backend keeps
+# per key: its store and the key strings.
+PACKAGE_DIR = Path(__file__).resolve().parent.parent / "fastapicap"
+
+
+def _client_key(request: Request) -> str:
+    return request.headers.get("x-client", "bench")
+
+
+STRATEGIES: Dict[str, Callable[[], BaseLimiter]] = {
+    "fixed_window": lambda: RateLimiter(limit=HIGH, seconds=60, key_func=_client_key),
+    "sliding_window": lambda: SlidingWindowRateLimiter(
+        limit=HIGH, seconds=60, key_func=_client_key
+    ),
+    "sliding_log": lambda: SlidingWindowLogRateLimiter(
+        limit=HIGH, window_seconds=60, key_func=_client_key
+    ),
+    "token_bucket": lambda: TokenBucketRateLimiter(
+        capacity=HIGH, tokens_per_second=HIGH, key_func=_client_key
+    ),
+    "leaky_bucket": lambda: LeakyBucketRateLimiter(
+        capacity=HIGH, leaks_per_second=HIGH, key_func=_client_key
+    ),
+    "gcra": lambda: GCRARateLimiter(
+        burst=HIGH, tokens_per_second=HIGH, key_func=_client_key
+    ),
+}
+
+
+class _Request:
+    """The minimal request a limiter needs, for populating keys directly."""
+
+    __slots__ = ("headers",)
+
+    def __init__(self, client: str) -> None:
+        self.headers = {"x-client": client}
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_app(limiter: Optional[BaseLimiter], samples: List[float]) -> FastAPI:
+    """
+    Build an app with one route guarded by `limiter`, timing each check.
+
+    With `limiter=None` the route is unlimited, which gives the baseline
+    cost of the app itself.
+    """
+    app = FastAPI()
+    dependencies = []
+    if limiter is not None:
+
+        async def timed_limiter(request: Request, response: Response) -> None:
+            start = time.perf_counter()
+            try:
+                await limiter(request, response)
+            finally:
+                samples.append(time.perf_counter() - start)
+
+        dependencies.append(Depends(timed_limiter))
+
+    @app.get("/bench", dependencies=dependencies)
+    async def bench() -> Dict[str, bool]:
+        return {"ok": True}
+
+    return app
+
+
+_info_supported = True
+
+
+async def _redis_counter(field: str, section: str) -> Optional[int]:
+    global _info_supported
+    if Cap.redis is None or not _info_supported:
+        return None
+    try:
+        info = await Cap.redis.info(section)
+    except Exception:
+        # Some Redis stand-ins lack INFO and drop the connection after the
+        # error, so stop asking and reconnect.
+        _info_supported = False
+        await Cap.redis.connection_pool.disconnect()
+        return None
+    value = info.get(field)
+    return int(value) if value is not None else None
+
+
+async def measure_throughput(
+    limiter: Optional[BaseLimiter], requests: int, concurrency: int, clients: int
+) -> Dict[str, Any]:
+    samples: List[float] = []
+    app = build_app(limiter, samples)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up: load scripts and let FastAPI build its dependency graph.
+        await client.get("/bench")
+        samples.clear()
+        counter = iter(range(requests))
+
+        async def worker() -> None:
+            for i in counter:
+                headers = {"x-client": str(i % clients)}
+                r = await client.get("/bench", headers=headers)
+                if r.status_code != 200:
+                    raise RuntimeError(f"Unexpected status {r.status_code}")
+
+        commands_before = await _redis_counter("total_commands_processed", "stats")
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        commands_after = await _redis_counter("total_commands_processed", "stats")
+
+    result: Dict[str, Any] = {"rps": requests / elapsed}
+    if samples:
+        result["p50_us"] = _percentile(samples, 50) * 1e6
+        result["p99_us"] = _percentile(samples, 99) * 1e6
+    if commands_before is not None and commands_after is not None:
+        # The INFO call issued after the run counts as one command.
+        result["commands_per_request"] = (commands_after - commands_before - 1) / requests
+    return result
+
+
+async def measure_memory(
+    make_limiter: Callable[[], BaseLimiter], cardinality: int, chunk: int = 2000
+) -> Optional[float]:
+    """
+    Populate `cardinality` distinct keys and return the bytes used per key.
+
+    On Redis this is the growth of the dataset (`used_memory_dataset`), which
+    leaves out client buffers. In memory it is the growth of what fastapicap
+    itself holds on to, from `tracemalloc` snapshots taken once the writes
+    are done, so tasks, requests and replies the benchmark is finished with
+    are not counted.
+    """
+    limiter = make_limiter()
+    response = Response()
+    await flush()
+    gc.collect()
+    memory = isinstance(Cap.backend, MemoryBackend)
+    if memory:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+    else:
+        before = await _redis_counter("used_memory_dataset", "memory")
+        if before is None:
+            return None
+    for offset in range(0, cardinality, chunk):
+        await asyncio.gather(
+            *(
+                limiter(_Request(str(i)), response)
+                for i in range(offset, min(offset + chunk, cardinality))
+            )
+        )
+    if not memory:
+        after = await _redis_counter("used_memory_dataset", "memory")
+        if after is None:
+            return None
+        return (after - before) / cardinality
+    # Let the loop release the finished tasks of the last chunk.
+    await asyncio.sleep(0)
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    package = [tracemalloc.Filter(True, str(PACKAGE_DIR / "*"))]
+    stats = after.filter_traces(package).compare_to(
+        before.filter_traces(package), "filename"
+    )
+    return sum(stat.size_diff for stat in stats) / cardinality
+
+
+async def flush() -> None:
+    if isinstance(Cap.backend, MemoryBackend):
+        Cap.backend._data.clear()
+    else:
+        await Cap.redis.flushdb()
+
+
+def _format(value: Optional[float], digits: int = 1) -> str:
+    return "n/a" if value is None else f"{value:,.{digits}f}"
+
+
+async def run(args: argparse.Namespace) -> None:
+    strategies = args.strategies.split(",") if args.strategies else list(STRATEGIES)
+    cardinalities = [int(c) for c in args.cardinalities.split(",")]
+
+    print(f"backend={args.backend} requests={args.requests} concurrency={args.concurrency}")
+    await flush()
+    baseline = await measure_throughput(None, args.requests, args.concurrency, 1)
+    print(f"{'baseline (no limiter)':<24} {baseline['rps']:>10,.0f} req/s")
+    print()
+    header = f"{'strategy':<16} {'req/s':>10} {'p50 µs':>9} {'p99 µs':>9} {'cmd/req':>8}"
+    header += "".join(f" {f'B/key@{c:,}':>14}" for c in cardinalities)
+    print(header)
+    print("-" * len(header))
+    for name in strategies:
+        make_limiter = STRATEGIES[name]
+        await flush()
+        result = await measure_throughput(
+            make_limiter(), args.requests, args.concurrency, args.clients
+        )
+        row = (
+            f"{name:<16} {result['rps']:>10,.0f} {result['p50_us']:>9.1f}"
+            f" {result['p99_us']:>9.1f}"
+            f" {_format(result.get('commands_per_request'), 2):>8}"
+        )
+        for cardinality in cardinalities:
+            per_key = await measure_memory(make_limiter, cardinality)
+            row += f" {_format(per_key):>14}"
+        print(row, flush=True)
+    await flush()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--backend", choices=("redis", "memory"), default="redis")
+    parser.add_argument(
+        "--redis-url",
+        help="Redis to benchmark against (it is flushed). Defaults to a "
+        "throwaway testcontainers Redis.",
+    )
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument(
+        "--clients",
+        type=int,
+        default=100,
+        help="Distinct keys used by the throughput run.",
+    )
+    parser.add_argument(
+        "--cardinalities",
+        default="1,1000,100000",
+        help="Comma-separated key counts for the memory measurement.",
+    )
+    parser.add_argument(
+        "--strategies",
+        help=f"Comma-separated subset of: {', '.join(STRATEGIES)}.",
+    )
+    parser.add_argument(
+        "--batch", action="store_true", help="Enable script call batching."
+    )
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        if args.backend == "memory":
+            Cap.init_backend(MemoryBackend())
+        else:
+            url = args.redis_url
+            if url is None:
+                from testcontainers.redis import RedisContainer
+
+                redis = stack.enter_context(RedisContainer())
+                host = redis.get_container_host_ip()
+                port = redis.get_exposed_port(6379)
+                url = f"redis://{host}:{port}/0"
+            Cap.init_app(url, batch=args.batch)
+
+        async def session() -> None:
+            try:
+                await run(args)
+            finally:
+                await Cap.close()
+
+        asyncio.run(session())
+
+
+if __name__ == "__main__":
+    main()
@@ -8,9 +8,18 @@ Available limiters:
 - RateLimiter: Fixed window rate limiting.
 - SlidingWindowRateLimiter: Sliding window counter.
 - TokenBucketRateLimiter: Token bucket algorithm.
+- LeasedTokenBucketRateLimiter: Token bucket served from local token leases.
 - LeakyBucketRateLimiter: Leaky bucket algorithm.
 - GCRARateLimiter: Generalized Cell Rate Algorithm (GCRA).
 - SlidingWindowLogRateLimiter: Precise sliding window log algorithm.
+- MultiRateLimiter: Several limits checked in one atomic call.
+- AdaptiveRateLimiter: Scales another limiter's rate with service health.
+
+RateLimitMiddleware applies limiters from a table of RateLimitRule entries
+before routing. Every limiter can report a client's Quota without consuming
+it, with `peek` and `peek_many`. `fastapicap.keys` provides ready-made key
+functions (route templates, client IPs behind proxies, IP networks, API
+keys and JWT subjects).
 
 Usage:
     from fastapicap import RateLimiter, SlidingWindowRateLimiter, ...
@@ -20,17 +29,28 @@ Usage:
 from .strategy.fixed_window import RateLimiter
 from .strategy.sliding_window import SlidingWindowRateLimiter
 from .strategy.token_bucket import TokenBucketRateLimiter
+from .strategy.leased_token_bucket import LeasedTokenBucketRateLimiter
 from .strategy.leaky_bucket import LeakyBucketRateLimiter
 from .strategy.gcra import GCRARateLimiter
 from .strategy.sliding_window_log import SlidingWindowLogRateLimiter
+from .strategy.multi import MultiRateLimiter
+from .strategy.adaptive import AdaptiveRateLimiter
+from .middleware import RateLimitMiddleware, RateLimitRule
+from .base_limiter import Quota
 from .connection import Cap
 
 __all__ = [
     "Cap",
     "RateLimiter",
     "TokenBucketRateLimiter",
+    "LeasedTokenBucketRateLimiter",
     "SlidingWindowRateLimiter",
     "LeakyBucketRateLimiter",
     "GCRARateLimiter",
     "SlidingWindowLogRateLimiter",
+    "MultiRateLimiter",
+    "AdaptiveRateLimiter",
+    "RateLimitMiddleware",
+    "RateLimitRule",
+    "Quota",
 ]
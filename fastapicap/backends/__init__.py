@@ -0,0 +1,21 @@
+"""
+Storage backends for Cap.
+
+- Backend: Abstract base class for all backends.
+- RedisBackend: Evaluates the Lua scripts on a Redis server (the default).
+- MemoryBackend: Native in-process implementation of every algorithm.
+- CircuitBreakerBackend: Timeout and circuit breaker around another backend.
+"""
+
+from .base import Backend
+from .circuit_breaker import BackendUnavailable, CircuitBreakerBackend
+from .memory_backend import MemoryBackend
+from .redis_backend import RedisBackend
+
+__all__ = [
+    "Backend",
+    "BackendUnavailable",
+    "CircuitBreakerBackend",
+    "MemoryBackend",
+    "RedisBackend",
+]
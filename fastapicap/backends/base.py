@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+import asyncio
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from ..metrics import Metrics
+
+
+class Backend(ABC):
+    """
+    Abstract base class for Cap storage backends.
+
+    A backend executes the rate limiting scripts defined in `fastapicap.lua`.
+    Limiters never talk to their storage directly; they hand the script,
+    its keys and its arguments to `Cap.backend.run` and interpret the
+    result. This makes the storage pluggable: the Redis backend evaluates
+    the Lua scripts on the server, while other backends may implement the
+    same scripts natively, as long as they return identical results.
+
+    Attributes:
+        server_time (bool): Whether limiters should let the scripts read the
+            storage's own clock instead of passing the worker's time.
+            Defaults to False.
+        metrics (Optional[Metrics]): Where to report backend events such as
+            script reloads. Set by `Cap.init_metrics`. Defaults to None.
+
+    Example:
+        class MyBackend(Backend):
+            async def run(self, script, keys, args):
+                ...
+    """
+
+    server_time: bool = False
+    metrics: Optional["Metrics"] = None
+
+    @abstractmethod
+    async def run(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        """
+        Execute a rate limiting script atomically.
+
+        Args:
+            script (str): One of the Lua scripts from `fastapicap.lua`.
+            keys (Sequence[str]): The keys the script operates on (`KEYS`).
+            args (Sequence[Any]): The script arguments (`ARGV`).
+
+        Returns:
+            Any: The value the script returns.
+        """
+
+    async def run_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        """
+        Execute a script once per `(keys, args)` pair, in order.
+
+        Each call is atomic on its own, not the group. The Redis backend
+        sends all calls in one pipeline. Defaults to running the calls one
+        after the other with `run`.
+
+        Returns:
+            List[Any]: The value of each call, in order.
+        """
+        return [await self.run(script, keys, args) for keys, args in calls]
+
+    async def run_readonly(
+        self, script: str, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        """
+        Execute a script that only reads state, such as `PEEK_LUA`.
+
+        Backends that can serve reads more cheaply (from a replica, or with
+        read-only commands) override this. Defaults to `run`.
+
+        Args:
+            script (str): A read-only script from `fastapicap.lua`.
+            keys (Sequence[str]): The keys the script reads (`KEYS`).
+            args (Sequence[Any]): The script arguments (`ARGV`).
+
+        Returns:
+            Any: The value the script returns.
+        """
+        return await self.run(script, keys, args)
+
+    async def run_readonly_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        """
+        Execute a read-only script once per `(keys, args)` pair.
+
+        The Redis backend sends all calls in one pipeline. Defaults to
+        running the calls concurrently with `run_readonly`.
+
+        Returns:
+            List[Any]: The value of each call, in order.
+        """
+        return list(
+            await asyncio.gather(
+                *(self.run_readonly(script, keys, args) for keys, args in calls)
+            )
+        )
+
+    # Optional key management, used by the administrative methods of
+    # limiters (`reset`, `reset_all`, `count_keys`); see `supports_scan`.
+    #
+    # `scan_keys(prefix, count=1000)` iterates over the stored keys that
+    # start with the literal `prefix` (not a glob pattern), in batches of
+    # about `count` keys. Iteration is incremental, so a keyspace of any size
+    # is walked without blocking the storage; keys written or deleted
+    # meanwhile may or may not be reported.
+    #
+    # `unlink(keys)` deletes keys, reclaiming their memory in the background
+    # if the storage can, and returns how many of them existed. Missing keys
+    # are ignored.
+    scan_keys: Optional[Callable[..., AsyncIterator[List[str]]]] = None
+    unlink: Optional[Callable[[Sequence[str]], Awaitable[int]]] = None
+
+    @property
+    def supports_scan(self) -> bool:
+        """
+        Whether the backend can enumerate and delete its keys, that is
+        defines both `scan_keys` and `unlink`.
+        """
+        return self.scan_keys is not None and self.unlink is not None
+
+    async def close(self) -> None:
+        """
+        Release any resources held by the backend.
+        """
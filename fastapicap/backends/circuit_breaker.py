@@ -0,0 +1,206 @@
+import asyncio
+import math
+import time
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    AsyncIterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import ReadOnlyError
+from redis.exceptions import TimeoutError as RedisTimeoutError
+
+from .base import Backend
+
+if TYPE_CHECKING:
+    from ..metrics import Metrics
+
+# Errors that mean the storage is unreachable or unhealthy, as opposed to
+# errors in a script call. `ReadOnlyError` is what a demoted primary replies
+# during a failover.
+DEFAULT_ERRORS: Tuple[Type[BaseException], ...] = (
+    asyncio.TimeoutError,
+    OSError,
+    RedisConnectionError,
+    RedisTimeoutError,
+    ReadOnlyError,
+)
+
+
+class BackendUnavailable(Exception):
+    """
+    Raised by `CircuitBreakerBackend` when its backend failed or the circuit
+    is open and there is no fallback.
+
+    Attributes:
+        retry_after (int): Seconds until the backend will be tried again,
+            or 0 if the circuit is still closed.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        super().__init__("The rate limit backend is unavailable.")
+        self.retry_after = retry_after
+
+
+class CircuitBreakerBackend(Backend):
+    """
+    Bounds the time limiters spend on a slow or failing backend.
+
+    Every script call gets a timeout. After `failure_threshold` consecutive
+    failures the circuit opens, and for `cooldown_seconds` calls do not
+    reach the backend at all. The first call after the cool-down is let
+    through as a probe: if it succeeds the circuit closes, otherwise it
+    opens for another cool-down.
+
+    Calls that fail or are short-circuited run on `fallback` if one is
+    given, e.g. a `MemoryBackend` enforcing the same limits per process.
+    Without a fallback they raise `BackendUnavailable`, which limiters
+    handle according to `Cap.failure_mode`.
+
+    Usually set up through `Cap.init_failure_policy` rather than directly.
+
+    Args:
+        backend (Backend): The backend to protect.
+        timeout_ms (Optional[float]): The time budget of one script call,
+            in milliseconds, or `None` for no timeout. Defaults to None.
+        failure_threshold (int): Consecutive failures that open the
+            circuit. Defaults to 5.
+        cooldown_seconds (float): How long the circuit stays open.
+            Defaults to 10.
+        fallback (Optional[Backend]): The backend used while `backend` is
+            unavailable. Defaults to None.
+        errors (Tuple[Type[BaseException], ...]): The exceptions counted as
+            failures. Other exceptions, such as script errors, are raised
+            unchanged. Defaults to `DEFAULT_ERRORS`.
+
+    Raises:
+        ValueError: If `timeout_ms` or `cooldown_seconds` is not positive,
+            or `failure_threshold` is less than 1.
+    """
+
+    def __init__(
+        self,
+        backend: Backend,
+        timeout_ms: Optional[float] = None,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 10.0,
+        fallback: Optional[Backend] = None,
+        errors: Tuple[Type[BaseException], ...] = DEFAULT_ERRORS,
+    ) -> None:
+        if timeout_ms is not None and timeout_ms <= 0:
+            raise ValueError("Timeout must be positive.")
+        if failure_threshold < 1:
+            raise ValueError("Failure threshold must be at least 1.")
+        if cooldown_seconds <= 0:
+            raise ValueError("Cool-down must be positive.")
+        self.backend = backend
+        self.timeout: Optional[float] = (
+            timeout_ms / 1000 if timeout_ms is not None else None
+        )
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown_seconds
+        self.fallback = fallback
+        self.errors = errors
+        self.failures = 0
+        # Monotonic time until which the circuit is open; 0 when closed.
+        self.open_until = 0.0
+        self._probing = False
+
+    @property
+    def server_time(self) -> bool:
+        return self.backend.server_time
+
+    @property
+    def metrics(self) -> Optional["Metrics"]:
+        return self.backend.metrics
+
+    @metrics.setter
+    def metrics(self, metrics: Optional["Metrics"]) -> None:
+        self.backend.metrics = metrics
+
+    @property
+    def state(self) -> str:
+        """
+        `"closed"`, `"open"` or `"half-open"` (the cool-down is over and the
+        next call will probe the backend).
+        """
+        if not self.open_until:
+            return "closed"
+        return "open" if time.monotonic() < self.open_until else "half-open"
+
+    async def run(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        return await self._call("run", script, keys, args)
+
+    async def run_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        return await self._call("run_many", script, calls)
+
+    async def run_readonly(
+        self, script: str, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        return await self._call("run_readonly", script, keys, args)
+
+    async def run_readonly_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        return await self._call("run_readonly_many", script, calls)
+
+    # Key management is administrative, not on the request path: it goes
+    # straight to the backend and its errors reach the caller.
+
+    @property
+    def supports_scan(self) -> bool:
+        return self.backend.supports_scan
+
+    def scan_keys(self, prefix: str, count: int = 1000) -> AsyncIterator[List[str]]:
+        return self.backend.scan_keys(prefix, count)
+
+    async def unlink(self, keys: Sequence[str]) -> int:
+        return await self.backend.unlink(keys)
+
+    async def _call(self, method: str, *args: Any) -> Any:
+        # Runs one of the `Backend` methods through the breaker.
+        probe = False
+        if self.open_until:
+            if self._probing or time.monotonic() < self.open_until:
+                return await self._unavailable(method, args, None)
+            probe = self._probing = True
+        try:
+            call = getattr(self.backend, method)(*args)
+            if self.timeout is None:
+                result = await call
+            else:
+                result = await asyncio.wait_for(call, self.timeout)
+        except self.errors as exc:
+            self.failures += 1
+            if probe or self.failures >= self.failure_threshold:
+                self.open_until = time.monotonic() + self.cooldown
+            return await self._unavailable(method, args, exc)
+        finally:
+            if probe:
+                self._probing = False
+        self.failures = 0
+        self.open_until = 0.0
+        return result
+
+    async def _unavailable(
+        self, method: str, args: Tuple[Any, ...], error: Optional[BaseException]
+    ) -> Any:
+        if self.fallback is not None:
+            return await getattr(self.fallback, method)(*args)
+        retry_after = 0
+        if self.open_until:
+            retry_after = max(0, math.ceil(self.open_until - time.monotonic()))
+        raise BackendUnavailable(retry_after) from error
+
+    async def close(self) -> None:
+        await self.backend.close()
+        if self.fallback is not None:
+            await self.fallback.close()
@@ -0,0 +1,697 @@
+import math
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence
+
+from .. import lua
+from .base import Backend
+
+# Largest expiry (in ms) the Lua scripts ever set on a key.
+_MAX_EXPIRE = 2147483647
+
+
+def _ceil(value: float) -> float:
+    # Lua's math.ceil passes infinities through instead of raising.
+    return math.ceil(value) if math.isfinite(value) else value
+
+
+def _div(a: float, b: float) -> float:
+    # Lua division by zero yields +/-inf (or nan) instead of raising.
+    if b:
+        return a / b
+    return math.copysign(math.inf, a) if a else math.nan
+
+
+def _now(arg: Any, clock: int) -> float:
+    # An empty `now` argument selects the server clock, which for this
+    # backend is its own clock.
+    return float(arg) if arg not in ("", b"") else clock
+
+
+def _int_reply(value: float) -> int:
+    """
+    Convert a Lua number into the integer reply Redis would send.
+
+    Redis truncates numbers towards zero. Non-finite values have no defined
+    conversion, so they are clamped to the largest expiry the scripts use.
+    """
+    if math.isfinite(value):
+        return int(value)
+    return _MAX_EXPIRE
+
+
+class _Entry:
+    """
+    Per-key state. `value` and `extra` hold up to two fields, so the bucket
+    strategies need no extra container per key.
+    """
+
+    __slots__ = ("value", "extra", "expires")
+
+    def __init__(self, value: Any, extra: Any = None, expires: float = math.inf) -> None:
+        self.value = value
+        self.extra = extra
+        self.expires = expires
+
+
+class MemoryBackend(Backend):
+    """
+    In-process backend implementing every Cap algorithm without Redis.
+
+    Each Lua script in `fastapicap.lua` has a native Python counterpart that
+    reads and writes the same state and returns the same values, so limiters
+    behave identically whether they run against Redis or in memory. Because
+    state lives in the process, limits are not shared between workers; use
+    this backend for single-process deployments, sidecars and tests.
+
+    Keys expire exactly like their Redis counterparts. Expired keys are
+    dropped when accessed, and every call also inspects a few of the least
+    recently written keys and drops them if expired, so memory stays
+    proportional to the number of live keys without a separate cleanup task.
+    `max_keys` additionally bounds the total number of keys by evicting the
+    least recently written ones.
+
+    Args:
+        max_keys (Optional[int]): The maximum number of keys to keep.
+            `None` means no limit besides expiry. Defaults to None.
+        sweep_batch (int): How many keys to inspect for expiry on each call.
+            Defaults to 2.
+
+    Raises:
+        ValueError: If `max_keys` is not positive or `sweep_batch` is negative.
+
+    Example:
+        Cap.init_backend(MemoryBackend(max_keys=1_000_000))
+    """
+
+    def __init__(self, max_keys: Optional[int] = None, sweep_batch: int = 2) -> None:
+        if max_keys is not None and max_keys <= 0:
+            raise ValueError("max_keys must be a positive integer.")
+        if sweep_batch < 0:
+            raise ValueError("sweep_batch must not be negative.")
+        self.max_keys = max_keys
+        self.sweep_batch = sweep_batch
+        self._data: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._handlers: Dict[str, Callable[[Sequence[str], Sequence[Any], int], Any]] = {
+            lua.FIXED_WINDOW: self._fixed_window,
+            lua.SLIDING_WINDOW: self._sliding_window,
+            lua.TOKEN_BUCKET: self._token_bucket,
+            lua.TOKEN_BUCKET_LEASE: self._token_bucket_lease,
+            lua.LEAKY_BUCKET: self._leaky_bucket,
+            # State is kept as Python objects, so the layouts are the same.
+            lua.TOKEN_BUCKET_PACKED: self._token_bucket,
+            lua.TOKEN_BUCKET_LEASE_PACKED: self._token_bucket_lease,
+            lua.LEAKY_BUCKET_PACKED: self._leaky_bucket,
+            lua.GCRA_LUA: self._gcra,
+            lua.SLIDING_LOG_LUA: self._sliding_log,
+            lua.SLIDING_LOG_BUCKETED_LUA: self._sliding_log_bucketed,
+            lua.MULTI_LUA: self._multi,
+            lua.PEEK_LUA: self._peek,
+            lua.ADAPTIVE_LUA: self._adaptive,
+        }
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    async def run(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        handler = self._handlers.get(script)
+        if handler is None:
+            raise NotImplementedError(
+                "This script is not supported by the in-memory backend."
+            )
+        clock = int(time.time() * 1000)
+        if self.sweep_batch:
+            self._sweep(clock)
+        return handler(keys, args, clock)
+
+    async def scan_keys(
+        self, prefix: str, count: int = 1000
+    ) -> AsyncIterator[List[str]]:
+        clock = int(time.time() * 1000)
+        batch: List[str] = []
+        # Iterate over a snapshot, since limiters keep writing between batches.
+        for key in list(self._data):
+            if not key.startswith(prefix):
+                continue
+            entry = self._data.get(key)
+            if entry is None or entry.expires <= clock:
+                continue
+            batch.append(key)
+            if len(batch) >= count:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def unlink(self, keys: Sequence[str]) -> int:
+        clock = int(time.time() * 1000)
+        deleted = 0
+        for key in keys:
+            entry = self._data.pop(key, None)
+            if entry is not None and entry.expires > clock:
+                deleted += 1
+        return deleted
+
+    def _sweep(self, clock: int) -> None:
+        data = self._data
+        for _ in range(self.sweep_batch):
+            if not data:
+                return
+            key = next(iter(data))
+            if data[key].expires <= clock:
+                del data[key]
+            else:
+                data.move_to_end(key)
+
+    def _get(self, key: str, clock: int) -> Optional[_Entry]:
+        entry = self._data.get(key)
+        if entry is not None and entry.expires <= clock:
+            del self._data[key]
+            return None
+        return entry
+
+    def _put(self, key: str, entry: Optional[_Entry], value: Any, extra: Any = None) -> _Entry:
+        data = self._data
+        if entry is None:
+            entry = data[key] = _Entry(value, extra)
+            if self.max_keys is not None and len(data) > self.max_keys:
+                data.popitem(last=False)
+        else:
+            entry.value = value
+            entry.extra = extra
+            data.move_to_end(key)
+        return entry
+
+    # The handlers below mirror the Lua scripts line by line. `clock` is the
+    # backend's own time, used where Redis would use its server clock (key
+    # expiry and `TIME`); timestamps passed in ARGV are used as-is.
+
+    def _fixed_window(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        limit = float(args[0])
+        expire_time = float(args[1])
+        entry = self._get(key, clock)
+        entry = self._put(key, entry, (entry.value if entry else 0) + 1)
+        current = entry.value
+        ttl: float = expire_time
+        if current == 1:
+            entry.expires = clock + expire_time
+        else:
+            ttl = entry.expires - clock if entry.expires != math.inf else -1
+        reply = [_int_reply(max(0, limit - current)), _int_reply(limit), _int_reply(ttl)]
+        if current > limit:
+            return [0, _int_reply(ttl), *reply]
+        return [1, 0, *reply]
+
+    def _sliding_window(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        window_size = float(args[1])
+        limit = float(args[2])
+        if args[0] in ("", b""):
+            curr_window = clock - clock % window_size
+            curr_key = f"{keys[0]}:{int(curr_window)}"
+            prev_key = f"{keys[0]}:{int(curr_window - window_size)}"
+        else:
+            curr_key, prev_key = keys[0], keys[1]
+            curr_window = float(args[0])
+        entry = self._get(curr_key, clock)
+        entry = self._put(curr_key, entry, (entry.value if entry else 0) + 1)
+        curr_count = entry.value
+        if curr_count == 1:
+            entry.expires = clock + window_size * 2
+        prev = self._get(prev_key, clock)
+        prev_count = prev.value if prev else 0
+        elapsed = clock - curr_window
+        weight = min(1, max(0, _div(elapsed, window_size)))
+        total = curr_count + prev_count * (1 - weight)
+        reset = _int_reply(window_size - elapsed)
+        reply = [_int_reply(max(0, math.floor(limit - total))), _int_reply(limit), reset]
+        if total > limit:
+            return [0, reset, *reply]
+        return [1, 0, *reply]
+
+    def _token_bucket(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        capacity = float(args[0])
+        refill_rate = float(args[1])
+        now = _now(args[2], clock)
+        cost = float(args[3]) if len(args) > 3 else 1
+        entry = self._get(key, clock)
+        if entry is None:
+            tokens, last_refill = capacity, now
+        else:
+            tokens, last_refill = entry.value, entry.extra
+        delta = max(0, now - last_refill)
+        refill = delta * refill_rate if refill_rate > 0 else 0
+        tokens = min(capacity, tokens + refill)
+        allowed, retry_after = 0, 0
+        if tokens >= cost:
+            tokens -= cost
+            allowed = 1
+        else:
+            retry_after = _ceil(_div(cost - tokens, refill_rate))
+        entry = self._put(key, entry, tokens, now)
+        entry.expires = clock + min(_ceil(_div(capacity, refill_rate)), _MAX_EXPIRE)
+        return [
+            allowed,
+            _int_reply(retry_after),
+            _int_reply(math.floor(tokens)),
+            _int_reply(capacity),
+            _int_reply(_ceil(_div(capacity - tokens, refill_rate))),
+        ]
+
+    def _token_bucket_lease(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        capacity = float(args[0])
+        refill_rate = float(args[1])
+        now = _now(args[2], clock)
+        requested = float(args[3])
+        returned = float(args[4])
+        entry = self._get(key, clock)
+        if entry is None:
+            tokens, last_refill = capacity, now
+        else:
+            tokens, last_refill = entry.value, entry.extra
+        delta = max(0, now - last_refill)
+        refill = delta * refill_rate if refill_rate > 0 else 0
+        tokens = min(capacity, tokens + refill + returned)
+        granted = min(requested, math.floor(tokens))
+        retry_after = 0
+        if granted > 0:
+            tokens -= granted
+        else:
+            granted = 0
+            if requested > 0:
+                retry_after = _ceil(_div(1 - tokens, refill_rate))
+        entry = self._put(key, entry, tokens, now)
+        entry.expires = clock + min(_ceil(_div(capacity, refill_rate)), _MAX_EXPIRE)
+        return [
+            _int_reply(granted),
+            _int_reply(retry_after),
+            _int_reply(math.floor(tokens)),
+            _int_reply(capacity),
+            _int_reply(_ceil(_div(capacity - tokens, refill_rate))),
+        ]
+
+    def _leaky_bucket(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        capacity = float(args[0])
+        leak_rate = float(args[1])
+        now = _now(args[2], clock)
+        entry = self._get(key, clock)
+        if entry is None:
+            level, last_leak = 0, now
+        else:
+            level, last_leak = entry.value, entry.extra
+        delta = max(0, now - last_leak)
+        level = max(0, level - delta * leak_rate)
+        allowed, retry_after = 0, 0
+        if level + 1 <= capacity:
+            level += 1
+            allowed = 1
+        else:
+            retry_after = _ceil(_div(level - capacity + 1, leak_rate))
+            if retry_after < 1:
+                retry_after = 1
+        entry = self._put(key, entry, level, now)
+        entry.expires = clock + min(_ceil(_div(capacity, leak_rate)), _MAX_EXPIRE)
+        return [
+            allowed,
+            _int_reply(retry_after),
+            _int_reply(math.floor(capacity - level)),
+            _int_reply(capacity),
+            _int_reply(min(_ceil(_div(level, leak_rate)), _MAX_EXPIRE)) if level > 0 else 0,
+        ]
+
+    def _gcra(self, keys: Sequence[str], args: Sequence[Any], clock: int) -> List[int]:
+        key = keys[0]
+        burst = float(args[0])
+        period = float(args[2])
+        now = _now(args[3], clock)
+        cost = float(args[4]) if len(args) > 4 else 1
+        entry = self._get(key, clock)
+        tat = entry.value if entry else now
+        new_tat = max(tat, now) + period * cost
+        allowed, retry_after = 0, 0.0
+        if new_tat - now <= burst * period:
+            entry = self._put(key, entry, new_tat)
+            entry.expires = clock + math.ceil(burst * period)
+            allowed = 1
+            tat = new_tat
+        else:
+            retry_after = new_tat - burst * period - now
+            tat = max(tat, now)
+        remaining = max(0, math.floor((burst * period - (tat - now)) / period + 1e-9))
+        return [
+            allowed,
+            _int_reply(retry_after),
+            _int_reply(remaining),
+            _int_reply(burst),
+            _int_reply(_ceil(tat - now)),
+        ]
+
+    def _sliding_log(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        now = _now(args[0], clock)
+        window = float(args[1])
+        limit = float(args[2])
+        entry = self._get(key, clock)
+        log = entry.value if entry else array("d")
+        del log[: bisect_right(log, now - window)]
+        count = len(log)
+        reset = _int_reply(_ceil(window - (now - (log[0] if count else now))))
+        if count < limit:
+            # Members are the timestamps themselves, so requests in the
+            # same millisecond collapse into one entry, as with ZADD.
+            index = bisect_left(log, now)
+            if index == len(log) or log[index] != now:
+                log.insert(index, now)
+            entry = self._put(key, entry, log)
+            entry.expires = clock + window
+            return [1, 0, _int_reply(limit - count - 1), _int_reply(limit), reset]
+        return [0, reset, 0, _int_reply(limit), reset]
+
+    def _sliding_log_bucketed(
+        self, keys: Sequence[str], args: Sequence[Any], clock: int
+    ) -> List[int]:
+        key = keys[0]
+        now = _now(args[0], clock)
+        window = float(args[1])
+        limit = float(args[2])
+        bucket = float(args[3])
+        min_time = now - window
+        entry = self._get(key, clock)
+        counts: Dict[float, int] = entry.value if entry else {}
+        for start in [start for start in counts if start + bucket <= min_time]:
+            del counts[start]
+        count = sum(counts.values())
+        if count < limit:
+            current = now - now % bucket
+            oldest = min(counts, default=current)
+            counts[current] = counts.get(current, 0) + 1
+            entry = self._put(key, entry, counts)
+            entry.expires = clock + window + bucket
+            reset = _ceil(min(oldest, current) + bucket + window - now)
+            return [1, 0, _int_reply(limit - count - 1), _int_reply(limit), _int_reply(reset)]
+        reset = _int_reply(_ceil(min(counts) + bucket + window - now))
+        return [0, reset, 0, _int_reply(limit), reset]
+
+    def _multi(self, keys: Sequence[str], args: Sequence[Any], clock: int) -> List[int]:
+        server_clock = args[0] in ("", b"")
+        now = _now(args[0], clock)
+        commits = []
+        quotas = []
+        denied = False
+        retry_after = 0.0
+        k = 0
+        for a in range(1, len(args), 3):
+            kind = args[a]
+            if isinstance(kind, bytes):
+                kind = kind.decode()
+            p1 = float(args[a + 1])
+            p2 = float(args[a + 2])
+            key = keys[k]
+            k += 1
+            entry = self._get(key, clock)
+            blocked = False
+            wait = 0.0
+            value = extra = None
+            # See MULTI_LUA for `left`, `reset0` and `reset1`.
+            if kind == "fixed_window":
+                current = entry.value if entry else 0
+                left = p1 - current
+                if entry is None or entry.expires == math.inf:
+                    reset0, reset1 = 0.0, p2
+                else:
+                    reset0 = reset1 = entry.expires - clock
+                if current + 1 > p1:
+                    blocked = True
+                    wait = reset1
+            elif kind == "sliding_window":
+                if server_clock:
+                    curr_window = now - now % p2
+                    prev_key = f"{key}:{int(curr_window - p2)}"
+                    key = f"{key}:{int(curr_window)}"
+                    entry = self._get(key, clock)
+                else:
+                    prev_key = keys[k]
+                    k += 1
+                prev = self._get(prev_key, clock)
+                curr_count = entry.value if entry else 0
+                prev_count = prev.value if prev else 0
+                elapsed = now % p2
+                left = p1 - (curr_count + prev_count * (1 - _div(elapsed, p2)))
+                reset0 = reset1 = p2 - elapsed
+                if left < 1:
+                    blocked = True
+                    wait = p2 - elapsed
+            elif kind == "token_bucket":
+                if entry is None:
+                    tokens, last_refill = p1, now
+                else:
+                    tokens, last_refill = entry.value, entry.extra
+                tokens = min(p1, tokens + max(0, now - last_refill) * p2)
+                left = tokens
+                reset0 = _ceil(_div(p1 - tokens, p2))
+                reset1 = _ceil(_div(p1 - tokens + 1, p2))
+                if tokens < 1:
+                    blocked = True
+                    wait = _ceil(_div(1 - tokens, p2))
+                value, extra = tokens - 1, now
+            elif kind == "leaky_bucket":
+                if entry is None:
+                    level, last_leak = 0, now
+                else:
+                    level, last_leak = entry.value, entry.extra
+                level = max(0, level - max(0, now - last_leak) * p2)
+                left = p1 - level
+                reset0 = min(_ceil(_div(level, p2)), _MAX_EXPIRE) if level > 0 else 0
+                reset1 = min(_ceil(_div(level + 1, p2)), _MAX_EXPIRE)
+                if level + 1 > p1:
+                    blocked = True
+                    wait = max(1, _ceil(_div(level - p1 + 1, p2)))
+                value, extra = level + 1, now
+            elif kind == "gcra":
+                tat = entry.value if entry else now
+                value = max(tat, now) + p2
+                left = _div(p1 * p2 - (max(tat, now) - now), p2) + 1e-9
+                reset0 = _ceil(max(tat, now) - now)
+                reset1 = _ceil(value - now)
+                if value - now > p1 * p2:
+                    blocked = True
+                    wait = value - p1 * p2 - now
+            elif kind == "sliding_log":
+                log = entry.value if entry else array("d")
+                del log[: bisect_right(log, now - p2)]
+                left = p1 - len(log)
+                if log:
+                    reset0 = reset1 = _ceil(p2 - (now - log[0]))
+                else:
+                    reset0, reset1 = 0.0, p2
+                if len(log) >= p1:
+                    blocked = True
+                    wait = reset0
+                value = log
+            else:
+                raise ValueError(f"Unknown rule kind: {kind}")
+            if blocked:
+                denied = True
+                retry_after = max(retry_after, wait)
+            commits.append((kind, key, value, extra, p1, p2))
+            quotas.append((left, reset0, reset1, p1))
+
+        remaining = limit = reset = None
+        for left, reset0, reset1, p1 in quotas:
+            rule_reset = reset0
+            if not denied:
+                left, rule_reset = left - 1, reset1
+            left = max(0, math.floor(left))
+            if remaining is None or left < remaining or (
+                left == remaining and rule_reset > reset
+            ):
+                remaining, limit, reset = left, p1, rule_reset
+        quota = [_int_reply(remaining), _int_reply(limit), _int_reply(reset)]
+
+        if denied:
+            return [0, _int_reply(_ceil(retry_after)), *quota]
+
+        # Entries are looked up again because storing one rule's state may
+        # evict another's when `max_keys` is reached.
+        for kind, key, value, extra, p1, p2 in commits:
+            entry = self._get(key, clock)
+            if kind in ("fixed_window", "sliding_window"):
+                entry = self._put(key, entry, (entry.value if entry else 0) + 1)
+                if entry.value == 1:
+                    entry.expires = clock + (p2 if kind == "fixed_window" else p2 * 2)
+            elif kind in ("token_bucket", "leaky_bucket"):
+                entry = self._put(key, entry, value, extra)
+                entry.expires = clock + min(_ceil(_div(p1, p2)), _MAX_EXPIRE)
+            elif kind == "gcra":
+                entry = self._put(key, entry, value)
+                entry.expires = clock + math.ceil(p1 * p2)
+            else:
+                index = bisect_left(value, now)
+                if index == len(value) or value[index] != now:
+                    value.insert(index, now)
+                entry = self._put(key, entry, value)
+                entry.expires = clock + p2
+        return [1, 0, *quota]
+
+    def _peek(self, keys: Sequence[str], args: Sequence[Any], clock: int) -> List[int]:
+        server_clock = args[0] in ("", b"")
+        now = _now(args[0], clock)
+        allowed = 1
+        retry_after = 0.0
+        remaining = limit = reset = None
+        k = 0
+        for a in range(1, len(args), 4):
+            kind = args[a]
+            if isinstance(kind, bytes):
+                kind = kind.decode()
+            p1 = float(args[a + 1])
+            p2 = float(args[a + 2])
+            p3 = float(args[a + 3])
+            key = keys[k]
+            k += 1
+            blocked = False
+            wait = 0.0
+            if kind == "fixed_window":
+                entry = self._get(key, clock)
+                left = p1 - (entry.value if entry else 0)
+                rule_reset = 0.0
+                if entry is not None and entry.expires != math.inf:
+                    rule_reset = entry.expires - clock
+                if left < 1:
+                    blocked = True
+                    wait = rule_reset
+            elif kind == "sliding_window":
+                if server_clock:
+                    curr_window = now - now % p2
+                    prev_key = f"{key}:{int(curr_window - p2)}"
+                    key = f"{key}:{int(curr_window)}"
+                else:
+                    prev_key = keys[k]
+                    k += 1
+                entry = self._get(key, clock)
+                prev = self._get(prev_key, clock)
+                curr_count = entry.value if entry else 0
+                prev_count = prev.value if prev else 0
+                elapsed = now % p2
+                left = p1 - (curr_count + prev_count * (1 - _div(elapsed, p2)))
+                rule_reset = p2 - elapsed
+                if left < 1:
+                    blocked = True
+                    wait = rule_reset
+            elif kind == "token_bucket":
+                entry = self._get(key, clock)
+                if entry is None:
+                    tokens, last_refill = p1, now
+                else:
+                    tokens, last_refill = entry.value, entry.extra
+                tokens = min(p1, tokens + max(0, now - last_refill) * p2)
+                left = tokens
+                rule_reset = _ceil(_div(p1 - tokens, p2))
+                if tokens < 1:
+                    blocked = True
+                    wait = _ceil(_div(1 - tokens, p2))
+            elif kind == "leaky_bucket":
+                entry = self._get(key, clock)
+                if entry is None:
+                    level, last_leak = 0, now
+                else:
+                    level, last_leak = entry.value, entry.extra
+                level = max(0, level - max(0, now - last_leak) * p2)
+                left = p1 - level
+                rule_reset = min(_ceil(_div(level, p2)), _MAX_EXPIRE) if level > 0 else 0
+                if level + 1 > p1:
+                    blocked = True
+                    wait = max(1, _ceil(_div(level - p1 + 1, p2)))
+            elif kind == "gcra":
+                entry = self._get(key, clock)
+                tat = max(entry.value if entry else now, now)
+                left = _div(p1 * p2 - (tat - now), p2) + 1e-9
+                rule_reset = _ceil(tat - now)
+                if tat + p2 - now > p1 * p2:
+                    blocked = True
+                    wait = tat + p2 - p1 * p2 - now
+            elif kind == "sliding_log":
+                entry = self._get(key, clock)
+                log = entry.value if entry else array("d")
+                first = bisect_right(log, now - p2)
+                count = len(log) - first
+                left = p1 - count
+                rule_reset = _ceil(p2 - (now - log[first])) if count else 0
+                if count >= p1:
+                    blocked = True
+                    wait = rule_reset
+            elif kind == "sliding_log_bucketed":
+                entry = self._get(key, clock)
+                counts: Dict[float, int] = entry.value if entry else {}
+                live = [start for start in counts if start + p3 > now - p2]
+                count = sum(counts[start] for start in live)
+                left = p1 - count
+                rule_reset = _ceil(min(live) + p3 + p2 - now) if live else 0
+                if count >= p1:
+                    blocked = True
+                    wait = rule_reset
+            else:
+                raise ValueError(f"Unknown rule kind: {kind}")
+            if blocked:
+                allowed = 0
+                retry_after = max(retry_after, wait)
+            left = max(0, math.floor(left))
+            if remaining is None or left < remaining or (
+                left == remaining and rule_reset > reset
+            ):
+                remaining, limit, reset = left, p1, rule_reset
+        return [
+            allowed,
+            _int_reply(_ceil(retry_after)),
+            _int_reply(remaining),
+            _int_reply(limit),
+            _int_reply(reset),
+        ]
+
+    def _adaptive(self, keys: Sequence[str], args: Sequence[Any], clock: int) -> str:
+        key = keys[0]
+        interval = float(args[0])
+        increase = float(args[1])
+        decrease = float(args[2])
+        min_factor = float(args[3])
+        signal = args[5]
+        entry = self._get(key, clock)
+        factor, (decreased, increased) = (
+            (entry.value, entry.extra) if entry else (1.0, (0.0, 0.0))
+        )
+        if signal in ("", b""):
+            return "%.14g" % factor
+        now = _now(args[6], clock)
+        if int(signal) == 1:
+            if now - decreased < interval:
+                return "%.14g" % factor
+            factor = max(min_factor, factor * decrease)
+            decreased = now
+        elif factor < 1 and now - decreased >= interval and now - increased >= interval:
+            factor = min(1.0, factor + increase)
+            increased = now
+        else:
+            return "%.14g" % factor
+        if factor >= 1:
+            self._data.pop(key, None)
+        else:
+            entry = self._put(key, entry, factor, (decreased, increased))
+            entry.expires = clock + float(args[4])
+        return "%.14g" % factor
@@ -0,0 +1,377 @@
+import asyncio
+import hashlib
+from typing import (
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from redis.asyncio import Redis, RedisCluster
+from redis.exceptions import NoScriptError, ResponseError
+
+from .. import lua
+from ..batching import ScriptBatcher
+from .base import Backend
+
+# The name of each script's function in the Redis Functions library.
+FUNCTION_NAMES: Dict[str, str] = {
+    lua.FIXED_WINDOW: "fixed_window",
+    lua.SLIDING_WINDOW: "sliding_window",
+    lua.TOKEN_BUCKET: "token_bucket",
+    lua.TOKEN_BUCKET_LEASE: "token_bucket_lease",
+    lua.LEAKY_BUCKET: "leaky_bucket",
+    lua.TOKEN_BUCKET_PACKED: "token_bucket_packed",
+    lua.TOKEN_BUCKET_LEASE_PACKED: "token_bucket_lease_packed",
+    lua.LEAKY_BUCKET_PACKED: "leaky_bucket_packed",
+    lua.GCRA_LUA: "gcra",
+    lua.SLIDING_LOG_LUA: "sliding_log",
+    lua.SLIDING_LOG_BUCKETED_LUA: "sliding_log_bucketed",
+    lua.MULTI_LUA: "multi",
+    lua.PEEK_LUA: "peek",
+    lua.ADAPTIVE_LUA: "adaptive",
+}
+
+# Scripts registered with the `no-writes` flag, so that `FCALL_RO` can run
+# them on replicas.
+READ_ONLY_SCRIPTS = frozenset({lua.PEEK_LUA})
+
+
+def build_library() -> Tuple[str, Dict[str, str]]:
+    """
+    Package every script in `FUNCTION_NAMES` as one Redis Functions library.
+
+    Each script body becomes a Lua function taking `KEYS` and `ARGV`, so the
+    scripts run unchanged. The library and function names carry a hash of
+    the code: function names are global on a server, and versioning them
+    lets different releases of Cap run side by side during a rolling
+    deployment.
+
+    Returns:
+        Tuple[str, Dict[str, str]]: The library code for `FUNCTION LOAD`, and
+            the function name registered for each script.
+    """
+    source = repr(list(FUNCTION_NAMES.items())).encode()
+    digest = hashlib.sha1(source).hexdigest()[:12]
+    library = f"fastapicap_{digest}"
+    parts = [f"#!lua name={library}"]
+    functions = {}
+    for script, name in FUNCTION_NAMES.items():
+        function = f"{library}_{name}"
+        if script in READ_ONLY_SCRIPTS:
+            register = (
+                f"redis.register_function{{function_name='{function}', "
+                f"callback={name}, flags={{'no-writes'}}}}"
+            )
+        else:
+            register = f"redis.register_function('{function}', {name})"
+        parts.append(f"local function {name}(KEYS, ARGV)\n{script}\nend\n{register}")
+        functions[script] = function
+    return "\n".join(parts), functions
+
+
+def _unknown_command(exc: ResponseError) -> bool:
+    return str(exc).lower().startswith("unknown command")
+
+
+def _glob_escape(text: str) -> str:
+    # Match `text` literally in a `SCAN MATCH` pattern.
+    for char in "\\*?[]":
+        text = text.replace(char, "\\" + char)
+    return text
+
+
+async def _drop_idle_connections(redis: Union[Redis, RedisCluster]) -> None:
+    # Some proxies drop the connection after an unknown command, so do not
+    # reuse the idle ones.
+    pool = getattr(redis, "connection_pool", None)
+    if pool is not None:
+        await pool.disconnect(inuse_connections=False)
+
+
+class RedisBackend(Backend):
+    """
+    Backend that evaluates the Lua scripts on a Redis server.
+
+    On Redis 7 and later, all scripts are installed at once as a Redis
+    Functions library (`FUNCTION LOAD`) on first use and executed with
+    `FCALL`. Functions are persisted and replicated by Redis, so they
+    survive restarts and failovers. On older servers each script is loaded
+    with `SCRIPT LOAD` the first time it is used and executed with
+    `EVALSHA`; the SHA1 hashes are cached per backend, so all limiters
+    sharing the backend share the loaded scripts.
+
+    Both paths recover on their own when the server loses the code (e.g.
+    after a failover to a fresh replica or `SCRIPT FLUSH`): the failing call
+    is retried with `EVAL`, which also reloads the script, and a missing
+    library is loaded again for the following calls.
+
+    Read-only scripts (`run_readonly`) are sent to `replica` if one is
+    given, with `FCALL_RO` or `EVALSHA_RO`. Servers older than Redis 7
+    receive plain `EVALSHA`.
+
+    Key scans (`scan_keys`) also go to `replica`, and walk every primary of
+    a cluster with `SCAN`; deletes use `UNLINK`, which frees memory in a
+    background thread.
+
+    Args:
+        redis (Union[Redis, RedisCluster]): The async Redis or Redis Cluster
+            client. On a cluster, scripts are loaded on every primary.
+        batch (bool): If `True`, concurrent calls are coalesced into one
+            pipelined round trip through a `ScriptBatcher`. Defaults to False.
+        batch_window_us (int): When batching, how long in microseconds to keep
+            collecting calls before flushing. Defaults to 0.
+        server_time (bool): If `True`, scripts read the time from the Redis
+            server (`TIME`) instead of the worker's clock, so every worker
+            shares one clock regardless of host clock skew. Defaults to False.
+        functions (Optional[bool]): `True` to require Redis Functions, `False`
+            to always use `EVALSHA`, `None` to use functions when the server
+            supports them. Defaults to None.
+        replica (Optional[Union[Redis, RedisCluster]]): A client for a
+            replica, used for read-only scripts. Defaults to None, which
+            sends them to `redis`.
+
+    Attributes:
+        redis: The async Redis client.
+        replica: The client used for read-only scripts.
+        batcher: The `ScriptBatcher` when batching is enabled, otherwise `None`.
+        server_time: Whether scripts use the Redis server clock.
+    """
+
+    def __init__(
+        self,
+        redis: Union[Redis, RedisCluster],
+        batch: bool = False,
+        batch_window_us: int = 0,
+        server_time: bool = False,
+        functions: Optional[bool] = None,
+        replica: Optional[Union[Redis, RedisCluster]] = None,
+    ) -> None:
+        self.redis = redis
+        self.replica = replica if replica is not None else redis
+        self.server_time = server_time
+        self.functions = functions
+        self.batcher = (
+            ScriptBatcher(redis, window_us=batch_window_us) if batch else None
+        )
+        self._shas: Dict[str, str] = {}
+        # Function name per script once the library is loaded; empty when
+        # functions are not used, `None` until the first call.
+        self._functions: Optional[Dict[str, str]] = {} if functions is False else None
+        self._loading: Optional[asyncio.Future] = None
+        # Whether the read client knows `EVALSHA_RO` (Redis 7+); `None`
+        # until the first read-only call.
+        self._evalsha_ro: Optional[bool] = None
+        self._replica_scripts: Set[str] = set()
+
+    async def _sha(self, script: str) -> str:
+        sha = self._shas.get(script)
+        if sha is None:
+            sha = await self.redis.script_load(script)
+            self._shas[script] = sha
+            if self.metrics is not None:
+                self.metrics.observe_script_load("script")
+        return sha
+
+    async def _load_library(self) -> Dict[str, str]:
+        code, functions = build_library()
+        try:
+            await self.redis.function_load(code, replace=True)
+        except ResponseError as exc:
+            if self.functions or not _unknown_command(exc):
+                raise
+            # Redis < 7.
+            await _drop_idle_connections(self.redis)
+            return {}
+        if self.metrics is not None:
+            self.metrics.observe_script_load("function")
+        return functions
+
+    async def _library(self) -> Dict[str, str]:
+        # Concurrent first calls share one `FUNCTION LOAD`.
+        loading = self._loading
+        if loading is None:
+            loading = self._loading = asyncio.ensure_future(self._load_library())
+        try:
+            self._functions = await asyncio.shield(loading)
+        finally:
+            if self._loading is loading and loading.done():
+                self._loading = None
+        return self._functions
+
+    async def run(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        functions = self._functions
+        if functions is None:
+            functions = await self._library()
+        function = functions.get(script)
+        try:
+            if function is not None:
+                if self.batcher is not None:
+                    return await self.batcher.fcall(function, len(keys), *keys, *args)
+                return await self.redis.fcall(function, len(keys), *keys, *args)
+            sha = self._shas.get(script) or await self._sha(script)
+            if self.batcher is not None:
+                return await self.batcher.evalsha(sha, len(keys), *keys, *args)
+            return await self.redis.evalsha(sha, len(keys), *keys, *args)
+        except NoScriptError:
+            pass
+        except ResponseError as exc:
+            if function is None or "function not found" not in str(exc).lower():
+                raise
+            # Load the library again on the next call.
+            if self._functions is functions:
+                self._functions = None
+        # The server lost the code. `EVAL` runs the script in the same round
+        # trip and caches it again, so a failover does not fail requests.
+        if self.metrics is not None:
+            self.metrics.observe_script_load("eval")
+        return await self.redis.eval(script, len(keys), *keys, *args)
+
+    async def run_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        if not calls:
+            return []
+        functions = self._functions
+        if functions is None:
+            functions = await self._library()
+        function = functions.get(script)
+        if function is not None:
+            command, name = "FCALL", function
+        else:
+            command = "EVALSHA"
+            name = self._shas.get(script) or await self._sha(script)
+        pipe = self.redis.pipeline(transaction=False)
+        for keys, args in calls:
+            pipe.execute_command(command, name, len(keys), *keys, *args)
+        results = await pipe.execute(raise_on_error=False)
+        for index, result in enumerate(results):
+            if not isinstance(result, Exception):
+                continue
+            if not isinstance(result, NoScriptError) and (
+                "function not found" not in str(result).lower()
+            ):
+                raise result
+            # The server lost the code, so the call did not run. `run`
+            # recovers from that.
+            if function is not None and self._functions is functions:
+                self._functions = None
+            keys, args = calls[index]
+            results[index] = await self.run(script, keys, args)
+        return results
+
+    async def _readonly_sha(self, script: str) -> str:
+        sha = self._shas.get(script) or await self._sha(script)
+        if self.replica is not self.redis and script not in self._replica_scripts:
+            # Replicas do not necessarily have the primary's script cache.
+            await self.replica.script_load(script)
+            self._replica_scripts.add(script)
+        return sha
+
+    def _readonly_command(self, script: str, function: Optional[str]) -> Tuple[str, str]:
+        if function is not None:
+            return "FCALL_RO", function
+        sha = self._shas[script]
+        return ("EVALSHA" if self._evalsha_ro is False else "EVALSHA_RO"), sha
+
+    async def run_readonly(
+        self, script: str, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        functions = self._functions
+        if functions is None:
+            functions = await self._library()
+        function = functions.get(script)
+        if function is None:
+            await self._readonly_sha(script)
+        command, name = self._readonly_command(script, function)
+        try:
+            result = await self.replica.execute_command(
+                command, name, len(keys), *keys, *args
+            )
+            if command == "EVALSHA_RO":
+                self._evalsha_ro = True
+            return result
+        except NoScriptError:
+            pass
+        except ResponseError as exc:
+            if command == "EVALSHA_RO" and _unknown_command(exc):
+                # Redis < 7: the script does not write, so `EVALSHA` is
+                # accepted by replicas as well.
+                self._evalsha_ro = False
+                await _drop_idle_connections(self.replica)
+                return await self.run_readonly(script, keys, args)
+            if function is None or "function not found" not in str(exc).lower():
+                raise
+            if self._functions is functions:
+                self._functions = None
+        if self.metrics is not None:
+            self.metrics.observe_script_load("eval")
+        return await self.replica.eval(script, len(keys), *keys, *args)
+
+    async def run_readonly_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        if not calls:
+            return []
+        functions = self._functions
+        if functions is None:
+            functions = await self._library()
+        function = functions.get(script)
+        first = []
+        if function is None:
+            await self._readonly_sha(script)
+            if self._evalsha_ro is None:
+                # Find out whether the server knows `EVALSHA_RO` with a single
+                # call, since an unknown command may cost the connection.
+                first = [await self.run_readonly(script, *calls[0])]
+                calls = calls[1:]
+        command, name = self._readonly_command(script, function)
+        pipe = self.replica.pipeline(transaction=False)
+        for keys, args in calls:
+            pipe.execute_command(command, name, len(keys), *keys, *args)
+        results = await pipe.execute(raise_on_error=False)
+        # Calls that failed (e.g. the server lost the script) are retried
+        # one by one, which recovers the same way `run_readonly` does.
+        for index, result in enumerate(results):
+            if isinstance(result, Exception):
+                keys, args = calls[index]
+                results[index] = await self.run_readonly(script, keys, args)
+        return first + results
+
+    async def scan_keys(
+        self, prefix: str, count: int = 1000
+    ) -> AsyncIterator[List[str]]:
+        batch: List[str] = []
+        async for key in self.replica.scan_iter(
+            match=_glob_escape(prefix) + "*", count=count
+        ):
+            batch.append(key.decode() if isinstance(key, bytes) else key)
+            if len(batch) >= count:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def unlink(self, keys: Sequence[str]) -> int:
+        if not keys:
+            return 0
+        # On a cluster, redis-py sends one `UNLINK` per slot.
+        return await self.redis.unlink(*keys)
+
+    async def close(self) -> None:
+        clients = [self.redis]
+        if self.replica is not self.redis:
+            clients.append(self.replica)
+        for client in clients:
+            # `aclose` replaced `close` in redis-py 5.0.1.
+            close = getattr(client, "aclose", None) or client.close
+            await close()
+            # A client built around an explicit pool does not close the pool.
+            pool = getattr(client, "connection_pool", None)
+            if pool is not None:
+                await pool.disconnect()
@@ -1,32 +1,174 @@
+import asyncio
+import functools
+import hashlib
 import inspect
+import sys
+import time
+import warnings
 from abc import ABC, abstractmethod
-from typing import Optional, Callable
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
 
 from redis.asyncio import Redis
 
+from .backends import Backend, BackendUnavailable
 from .connection import Cap
+from .lua import PEEK_LUA, SERVER_TIME
+from .metrics import Metrics, _MeteredBackend
 from fastapi import Request, Response
 
+# Upper bound on the number of keys kept in a limiter's deny cache.
+DENY_CACHE_MAX_KEYS = 100_000
+
+# Quota headers from the IETF RateLimit header fields draft.
+RATE_LIMIT_HEADERS = ("RateLimit-Limit", "RateLimit-Remaining", "RateLimit-Reset")
+
+# A rule as described to `PEEK_LUA`: the suffix of its key after the
+# client's full key, then its kind and three parameters.
+PeekRule = Tuple[str, str, float, float, float]
+
+# The keys and arguments of one call of a limiter's script.
+ScriptCall = Tuple[Sequence[str], Sequence[Any]]
+
+
+class Quota(NamedTuple):
+    """
+    The quota state of a client, as reported by `BaseLimiter.peek` and
+    `BaseLimiter.check_many`.
+
+    Attributes:
+        allowed (bool): Whether a request (of cost 1) would be allowed now.
+        remaining (int): The requests (or tokens) left right now.
+        limit (int): The size of the quota (limit, capacity or burst).
+        reset_ms (int): Milliseconds until the quota is fully restored.
+        retry_after_ms (int): Milliseconds until a request would be allowed,
+            or 0 if it would be allowed now.
+    """
+
+    allowed: bool
+    remaining: int
+    limit: int
+    reset_ms: int
+    retry_after_ms: int
+
+    @classmethod
+    def _from_reply(cls, reply: Sequence[Any]) -> "Quota":
+        return cls(reply[0] == 1, int(reply[2]), int(reply[3]), int(reply[4]), int(reply[1]))
+
+
+# The outcome of the limiter call being measured, while metrics are enabled.
+# `_reject` marks it as denied.
+_decision: ContextVar[Optional[List[str]]] = ContextVar("cap_decision", default=None)
+
+
+def _wrap_call(call: Callable) -> Callable:
+    """
+    Wrap a limiter's `__call__` to apply `Cap.failure_mode` when the backend
+    is unavailable, and to report its decisions to `Cap.metrics`.
+
+    With metrics disabled, the wrapper only checks `Cap.metrics` and awaits
+    the original method.
+    """
+
+    @functools.wraps(call)
+    async def __call__(self: "BaseLimiter", request: Request, response: Response):
+        metrics = Cap.metrics
+        if metrics is None:
+            try:
+                return await call(self, request, response)
+            except BackendUnavailable as exc:
+                return await self._backend_unavailable(request, response, exc)
+        decision = ["allowed"]
+        token = _decision.set(decision)
+        start = time.perf_counter()
+        try:
+            try:
+                return await call(self, request, response)
+            except BackendUnavailable as exc:
+                return await self._backend_unavailable(request, response, exc)
+        except BaseException:
+            if decision[0] == "allowed":
+                decision[0] = "error"
+            raise
+        finally:
+            _decision.reset(token)
+            metrics.observe_decision(
+                self._instance_id, decision[0], time.perf_counter() - start
+            )
+
+    __call__._cap_wrapped = True
+    return __call__
+
+
+def _definition_site(limiter: "BaseLimiter") -> str:
+    """
+    Locate where a limiter is created: the module and line of the first
+    caller outside Cap and outside the limiter's own constructors.
+
+    The same code creates its limiters at the same place in every worker
+    process, so the site tells limiters apart without breaking the sharing
+    of one limiter's state between processes.
+    """
+    frame = sys._getframe(1)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if (
+            module != "fastapicap"
+            and not module.startswith("fastapicap.")
+            and frame.f_locals.get("self") is not limiter
+        ):
+            return f"{module}:{frame.f_lineno}"
+        frame = frame.f_back
+    return ""
+
+
+def _callable_name(func: Callable) -> str:
+    # Bound methods are named after their function.
+    func = getattr(func, "__func__", func)
+    qualname = getattr(func, "__qualname__", type(func).__qualname__)
+    return f"{getattr(func, '__module__', None)}.{qualname}"
+
+
 class BaseLimiter(ABC):
     """
     Abstract base class for all Cap rate limiters.
 
-    Provides common logic for key extraction, limit handling, and Lua script
-    management. Subclasses should implement their own rate limiting logic
-    and call `_ensure_lua_sha` to load their Lua script into Redis.
+    Provides common logic for key extraction, limit handling, and access to
+    the shared storage backend. Subclasses should implement their own rate
+    limiting logic and run their Lua script through `Cap.backend`, obtained
+    with `_ensure_backend`.
 
     Args:
         key_func (Optional[Callable]): Async function to extract a unique key
-            from the request. Defaults to client IP and path.
+            from the request. Defaults to client IP and path. Its result is
+            memoized per request and shared by every limiter given the same
+            function.
         on_limit (Optional[Callable]): Async function called when the rate
             limit is exceeded. Defaults to raising HTTP 429.
         prefix (str): Redis key prefix for all limiter keys.
+        deny_cache (bool): If `True`, remember denied keys in process until
+            the retry time reported by the script, and reject further
+            requests for them without contacting the backend.
+            Defaults to False.
+        name (Optional[str]): A stable name for the limiter, used as its
+            Redis key namespace. Limiters given the same name share their
+            limits. It must not contain `:`, `{` or `}`, which delimit the
+            limiter's keys. Defaults to a hash of the limiter's
+            configuration, key function and definition site (see
+            `_make_instance_id`).
 
     Attributes:
         key_func: The function used to extract a unique key from the request.
         on_limit: The function called when the rate limit is exceeded.
         prefix: The Redis key prefix.
-        lua_sha: The SHA1 hash of the loaded Lua script in Redis.
+        deny_cache: Whether the deny cache is enabled.
+        name: The explicit limiter name, if any.
+        lua_sha: The SHA1 of the script loaded by the deprecated
+            `_ensure_lua_sha`, if any.
+
+    Raises:
+        ValueError: If `name` contains `:`, `{` or `}`.
 
     Example:
         class MyLimiter(BaseLimiter):
@@ -39,43 +181,697 @@ class BaseLimiter(ABC):
         key_func: Optional[Callable] = None,
         on_limit: Optional[Callable] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
     ) -> None:
-        self.key_func: Callable[[Request], str] = key_func or self._default_key_func
-        self.on_limit: Callable[[Request, Response, int], None] = (
-            on_limit or self._default_on_limit
-        )
+        if name is not None and any(char in name for char in ":{}"):
+            # Admin calls find a limiter's keys by the prefix `{prefix:name:`,
+            # which would also match the keys of a limiter named `name:...`.
+            raise ValueError("Limiter name must not contain ':', '{' or '}'.")
+        self.key_func = key_func or self._default_key_func
+        self.on_limit = on_limit or self._default_on_limit
         self.prefix: str = prefix
+        self.deny_cache: bool = deny_cache
+        self.name: Optional[str] = name
+        # The SHA1 of the script loaded by the deprecated `_ensure_lua_sha`.
         self.lua_sha: Optional[str] = None
+        self._site = _definition_site(self)
+        # The fraction of the configured rate enforced (see `_scale_rate`).
+        self._rate_factor: float = 1.0
+        self._denied: "OrderedDict[str, float]" = OrderedDict()
 
-    async def _ensure_lua_sha(self, lua_script: str) -> None:
+    def __init_subclass__(cls, **kwargs: Any) -> None:
+        super().__init_subclass__(**kwargs)
+        call = cls.__dict__.get("__call__")
+        if call is not None and not getattr(call, "__isabstractmethod__", False):
+            if not getattr(call, "_cap_wrapped", False):
+                cls.__call__ = _wrap_call(call)
+
+    # Whether `key_func` and `on_limit` are coroutine functions is resolved
+    # once when they are assigned, not on every request.
+
+    @property
+    def key_func(self) -> Callable[[Request], str]:
+        return self._memoized_key_func
+
+    @key_func.setter
+    def key_func(self, func: Callable[[Request], str]) -> None:
+        self._key_func = func
+        self._key_func_is_async = inspect.iscoroutinefunction(func)
+        self._key_func_timer: Optional[Tuple[Metrics, Callable]] = None
+        self._memoized_key_func = self._memoize_key_func(func)
+
+    def _memoize_key_func(
+        self, func: Callable[[Request], str]
+    ) -> Callable[[Request], str]:
+        """
+        Return `key_func` wrapped to run at most once per request.
+
+        The key is stored in `request.state`, under the function itself, so
+        every limiter given the same function reuses it for the rest of the
+        request, including a limiter applied by `RateLimitMiddleware`.
+        Requests without a `state` are not memoized, nor are functions
+        marked with `_cap_no_memo` (such as `keys.route`), whose key changes
+        once the request is routed.
+        """
+        if getattr(func, "_cap_no_memo", False):
+            if self._key_func_is_async:
+
+                async def unmemoized(request: Request) -> str:
+                    return await self._run_key_func()(request)
+
+            else:
+
+                def unmemoized(request: Request) -> str:
+                    return self._run_key_func()(request)
+
+            return unmemoized
+
+        def cached(request: Request) -> Tuple[Optional[Dict[Any, str]], Optional[str]]:
+            state = getattr(request, "state", None)
+            if state is None:
+                return None, None
+            keys = getattr(state, "_cap_keys", None)
+            if keys is None:
+                keys = state._cap_keys = {}
+            return keys, keys.get(func)
+
+        if self._key_func_is_async:
+
+            async def memoized(request: Request) -> str:
+                keys, key = cached(request)
+                if key is None:
+                    key = await self._run_key_func()(request)
+                    if keys is not None:
+                        keys[func] = key
+                return key
+
+        else:
+
+            def memoized(request: Request) -> str:
+                keys, key = cached(request)
+                if key is None:
+                    key = self._run_key_func()(request)
+                    if keys is not None:
+                        keys[func] = key
+                return key
+
+        return memoized
+
+    def _run_key_func(self) -> Callable[[Request], str]:
+        if Cap.metrics is None:
+            return self._key_func
+        return self._timed_key_func(Cap.metrics)
+
+    def _timed_key_func(self, metrics: Metrics) -> Callable[[Request], str]:
+        """
+        Return `key_func` wrapped to report its duration to `metrics`.
+
+        The wrapper is built once per metrics object.
+        """
+        timer = self._key_func_timer
+        if timer is not None and timer[0] is metrics:
+            return timer[1]
+        func = self._key_func
+
+        if self._key_func_is_async:
+
+            async def timed(request: Request) -> str:
+                start = time.perf_counter()
+                try:
+                    return await func(request)
+                finally:
+                    metrics.observe_key_func(
+                        self._instance_id, time.perf_counter() - start
+                    )
+
+        else:
+
+            def timed(request: Request) -> str:
+                start = time.perf_counter()
+                try:
+                    return func(request)
+                finally:
+                    metrics.observe_key_func(
+                        self._instance_id, time.perf_counter() - start
+                    )
+
+        self._key_func_timer = (metrics, timed)
+        return timed
+
+    @property
+    def on_limit(self) -> Callable[[Request, Response, int], None]:
+        return self._on_limit
+
+    @on_limit.setter
+    def on_limit(self, func: Callable[[Request, Response, int], None]) -> None:
+        self._on_limit = func
+        self._on_limit_is_async = inspect.iscoroutinefunction(func)
+
+    # The largest cost a request can ever be allowed with, for strategies
+    # that weigh requests.
+    _max_cost: Optional[float] = None
+
+    @property
+    def cost(self) -> Union[float, Callable[[Request], float]]:
+        return self._cost
+
+    @cost.setter
+    def cost(self, cost: Union[float, Callable[[Request], float]]) -> None:
+        # Only strategies that weigh requests set a cost.
+        self._cost = cost
+        if callable(cost):
+            self._cost_is_async = inspect.iscoroutinefunction(cost)
+            self._cost_arg: Optional[bytes] = None
+        else:
+            if cost <= 0:
+                raise ValueError("Cost must be positive.")
+            self._cost_is_async = False
+            self._cost_arg = self._encode_args(cost)[0]
+
+    async def _request_cost(self, request: Request) -> bytes:
         """
-        Ensure the Lua script is loaded into Redis and store its SHA1 hash.
+        Resolve the cost of a request as the script argument.
+
+        Returns:
+            bytes: The encoded cost, computed by the `cost` function if one
+                was given.
+
+        Raises:
+            ValueError: If the `cost` function returns a negative value, or
+                one the limiter could never allow.
+        """
+        if self._cost_arg is not None:
+            return self._cost_arg
+        cost = self._cost(request)
+        if self._cost_is_async:
+            cost = await cost
+        self._check_cost(cost)
+        return str(cost).encode()
+
+    def _check_cost(self, cost: float) -> None:
+        if cost < 0:
+            raise ValueError("Request cost must not be negative.")
+        if self._max_cost is not None and cost > self._max_cost:
+            # The script would deny it with a retry time that never comes.
+            raise ValueError(f"Request cost must not exceed {self._max_cost}.")
+
+    @property
+    def _instance_id(self) -> str:
+        return self._identity
+
+    @_instance_id.setter
+    def _instance_id(self, instance_id: str) -> None:
+        # The constant part of every key is built once per limiter.
+        self._identity = instance_id
+        self._key_prefix = f"{{{self.prefix}:{instance_id}:"
+
+    def _make_instance_id(self, kind: str, *params) -> str:
+        """
+        Derive the limiter's Redis key namespace from its configuration.
+
+        The identity must be the same in every worker process and across
+        restarts, so that all processes enforce one shared limit and keys
+        from previous deployments keep being used instead of piling up.
+        It is the explicit `name` if one was given, otherwise the strategy
+        kind plus a hash of the parameters that define the limit, the key
+        function's qualified name and the module and line creating the
+        limiter. Limiters defined in different places, e.g. on different
+        routes, therefore keep separate limits even when configured alike;
+        give them the same `name` to share one. Unnamed limiters move to new
+        keys when the line defining them moves, so give long-lived limits a
+        `name`.
 
         Args:
-            lua_script (str): The Lua script to load.
+            kind (str): A short identifier of the strategy.
+            *params: The parameters that define the limit.
+
+        Returns:
+            str: The limiter identity used in its Redis keys.
         """
-        if self.lua_sha is None:
-            redis = Cap.redis
-            self.lua_sha = await redis.script_load(lua_script)
+        if self.name is not None:
+            return self.name
+        identity = (params, _callable_name(self._key_func), self._site)
+        digest = hashlib.sha1(repr(identity).encode()).hexdigest()[:12]
+        return f"{kind}_{digest}"
 
-    # Helper method to safely call a function, whether sync or async
-    async def _safe_call(self, func: Callable, *args, **kwargs):
+    def _full_key(self, key: str) -> str:
         """
-        Safely calls a function, awaiting it if it's an asynchronous coroutine function,
-        or calling it directly if it's synchronous.
+        Build the Redis key for a client key.
+
+        The whole key is wrapped in a Redis Cluster hash tag, so that every
+        key a strategy derives from it (e.g. one per window) maps to the same
+        slot, while different clients spread across shards.
 
         Args:
-            func (Callable): The function to call.
-            *args: Positional arguments to pass to the function.
-            **kwargs: Keyword arguments to pass to the function.
+            key (str): The client key returned by `key_func`.
 
         Returns:
-            Any: The result of the function call.
+            str: The key in the form `{prefix:instance:key}`.
         """
-        if inspect.iscoroutinefunction(func):
-            return await func(*args, **kwargs)
+        return self._key_prefix + key + "}"
+
+    async def _reject(self, request: Request, response: Response, retry_after: int) -> None:
+        """
+        Call `on_limit` for a request that exceeded the limit.
+
+        Args:
+            request (Request): The incoming request.
+            response (Response): The response object.
+            retry_after (int): The retry-after value passed to `on_limit`.
+        """
+        decision = _decision.get()
+        if decision is not None:
+            decision[0] = "denied"
+        result = self._on_limit(request, response, retry_after)
+        if self._on_limit_is_async:
+            await result
+
+    async def _backend_unavailable(
+        self, request: Request, response: Response, exc: BackendUnavailable
+    ) -> None:
+        """
+        Handle a request the backend could not decide on, as configured by
+        `Cap.init_failure_policy`.
+
+        In `"open"` mode the request is allowed. In `"closed"` mode it is
+        rejected through `on_limit`, with the seconds until the backend is
+        tried again as the retry-after value. Otherwise the error is raised.
+
+        Raises:
+            BackendUnavailable: If the failure mode is `"raise"`.
+        """
+        mode = Cap.failure_mode
+        if mode == "open":
+            return
+        if mode == "closed":
+            await self._reject(request, response, exc.retry_after)
+            return
+        raise exc
+
+    # Optional hook: `_scale_rate(factor)` makes the limiter enforce `factor`
+    # (in (0, 1]) times its configured rate, as directed by an
+    # `AdaptiveRateLimiter`. The limiter keeps its identity, and with it its
+    # keys, so the clients' state carries over between rates. Limiters
+    # defining it can be adapted.
+    _scale_rate: Optional[Callable[[float], None]] = None
+
+    def _require(self, hook: str, method: str) -> None:
+        """
+        Raise a `TypeError` if the limiter does not define the optional
+        `hook` that `method` relies on.
+        """
+        if getattr(self, hook) is None:
+            raise TypeError(f"{type(self).__name__} does not support {method}.")
+
+    # Optional hook: `_peek_rules()` describes the limiter's state for
+    # `PEEK_LUA`: for each rule it checks, the suffix of its key after the
+    # client's full key, and its `PEEK_LUA` kind and parameters. Limiters
+    # defining it support `peek` and `peek_many`, and reset a client
+    # without scanning for its keys.
+    _peek_rules: Optional[Callable[[], List[PeekRule]]] = None
+
+    def _peek_call(
+        self, key: str, now: Union[int, bytes]
+    ) -> Tuple[List[str], Tuple[Any, ...]]:
+        args = getattr(self, "_peek_args", None)
+        if args is None:
+            rules = self._peek_rules()
+            args = self._peek_args = self._encode_args(
+                *(value for rule in rules for value in rule[1:])
+            )
+            self._peek_keys = [(rule[0], rule[1], rule[3]) for rule in rules]
+        full_key = self._full_key(key)
+        keys = []
+        for suffix, kind, window_ms in self._peek_keys:
+            rule_key = full_key + suffix
+            if kind == "sliding_window" and now != SERVER_TIME:
+                curr_window_start = now - (now % int(window_ms))
+                keys.append(f"{rule_key}:{curr_window_start}")
+                keys.append(f"{rule_key}:{curr_window_start - int(window_ms)}")
+            else:
+                keys.append(rule_key)
+        return keys, (now, *args)
+
+    async def peek(self, key: str) -> Quota:
+        """
+        Report a client's quota without consuming any of it.
+
+        The state is read with a read-only script, which the Redis backend
+        runs with `FCALL_RO` / `EVALSHA_RO`, on a replica if one is
+        configured. Peeking never changes the limit, the deny cache or the
+        `RateLimit-*` headers.
+
+        Args:
+            key (str): The client key, as returned by `key_func`.
+
+        Returns:
+            Quota: The client's current quota.
+
+        Raises:
+            TypeError: If the limiter does not support `peek`, that is does
+                not define `_peek_rules`.
+
+        Example:
+            quota = await limiter.peek(f"{user.id}:/reports")
+            return {"remaining": quota.remaining, "reset_ms": quota.reset_ms}
+        """
+        self._require("_peek_rules", "peek")
+        backend = self._ensure_backend()
+        now = SERVER_TIME if backend.server_time else int(time.time() * 1000)
+        keys, args = self._peek_call(key, now)
+        return Quota._from_reply(await backend.run_readonly(PEEK_LUA, keys, args))
+
+    async def peek_many(self, keys: Sequence[str]) -> List[Quota]:
+        """
+        Report the quota of many clients at once, without consuming any.
+
+        The Redis backend sends all reads in a single pipeline, so hundreds
+        of keys cost one round trip.
+
+        Args:
+            keys (Sequence[str]): The client keys, as returned by `key_func`.
+
+        Returns:
+            List[Quota]: The quota of each client, in order.
+
+        Raises:
+            TypeError: If the limiter does not support `peek`, that is does
+                not define `_peek_rules`.
+        """
+        self._require("_peek_rules", "peek_many")
+        backend = self._ensure_backend()
+        now = SERVER_TIME if backend.server_time else int(time.time() * 1000)
+        calls = [self._peek_call(key, now) for key in keys]
+        replies = await backend.run_readonly_many(PEEK_LUA, calls)
+        return [Quota._from_reply(reply) for reply in replies]
+
+    def _state_keys(self, key: str) -> Optional[List[str]]:
+        """
+        List the keys that may hold a client's state.
+
+        Built from `_peek_rules`. Sliding windows keep one key per window;
+        the windows around the current one are included as well, since the
+        process (or server) that wrote them may have a slightly different
+        clock.
+
+        Args:
+            key (str): The client key, as returned by `key_func`.
+
+        Returns:
+            Optional[List[str]]: The keys, or `None` if the limiter does not
+                describe its rules.
+        """
+        if self._peek_rules is None:
+            return None
+        rules = self._peek_rules()
+        full_key = self._full_key(key)
+        now = int(time.time() * 1000)
+        keys = []
+        for suffix, kind, _, window_ms, _ in rules:
+            rule_key = full_key + suffix
+            if kind == "sliding_window":
+                window = int(window_ms)
+                start = now - now % window
+                keys.extend(f"{rule_key}:{start + n * window}" for n in (-1, 0, 1))
+            else:
+                keys.append(rule_key)
+        return keys
+
+    def _forget(self, full_key: Optional[str] = None) -> None:
+        """
+        Drop what this process remembers about a client, or about every
+        client if `full_key` is `None`.
+        """
+        if full_key is None:
+            self._denied.clear()
+        else:
+            self._denied.pop(full_key, None)
+
+    def _scan_backend(self, method: str) -> Backend:
+        """
+        Return the backend for the administrative `method`, which needs the
+        backend's optional `scan_keys` and `unlink`.
+
+        Raises:
+            TypeError: If the backend does not support key scans.
+        """
+        backend = self._ensure_backend()
+        if not backend.supports_scan:
+            raise TypeError(
+                f"{type(Cap.backend).__name__} does not support {method}: "
+                "it does not define scan_keys and unlink."
+            )
+        return backend
+
+    async def reset(self, key: str) -> bool:
+        """
+        Clear a client's limit, as if it had never made a request.
+
+        The client's keys are deleted with `UNLINK` and the client is dropped
+        from this process's deny cache. Deny caches of other workers expire
+        on their own.
+
+        Args:
+            key (str): The client key, as returned by `key_func`.
+
+        Returns:
+            bool: Whether the client had any state.
+
+        Raises:
+            TypeError: If the backend does not support key scans.
+
+        Example:
+            await limiter.reset(f"{user.id}:/login")
+        """
+        backend = self._scan_backend("reset")
+        full_key = self._full_key(key)
+        self._forget(full_key)
+        keys = self._state_keys(key)
+        if keys is not None:
+            return await backend.unlink(keys) > 0
+        # Every key derived from the full key starts with it, and the full
+        # key ends with the closing brace of its hash tag, so the prefix
+        # matches no other client.
+        deleted = 0
+        async for batch in backend.scan_keys(full_key):
+            deleted += await backend.unlink(batch)
+        return deleted > 0
+
+    async def reset_all(
+        self, batch_size: int = 1000, pause_seconds: float = 0.0
+    ) -> int:
+        """
+        Clear the limits of every client of this limiter.
+
+        The keys are found with incremental `SCAN` (on the replica, if one
+        is configured) and deleted with `UNLINK` one batch at a time, so
+        millions of keys can be cleared without blocking Redis. Requests
+        keep being served meanwhile; clients that come back during the reset
+        may or may not be reset.
+
+        Limiters sharing this limiter's identity (see `_make_instance_id`)
+        are reset as well.
+
+        Args:
+            batch_size (int): The approximate number of keys per `SCAN` and
+                `UNLINK`. Defaults to 1000.
+            pause_seconds (float): How long to wait between batches, to
+                spread the load on the primary. Defaults to 0.
+
+        Returns:
+            int: The number of keys deleted.
+
+        Raises:
+            ValueError: If `batch_size` is less than 1 or `pause_seconds`
+                is negative.
+            TypeError: If the backend does not support key scans.
+        """
+        if batch_size < 1:
+            raise ValueError("Batch size must be at least 1.")
+        if pause_seconds < 0:
+            raise ValueError("Pause must not be negative.")
+        backend = self._scan_backend("reset_all")
+        self._forget()
+        deleted = 0
+        async for batch in backend.scan_keys(self._key_prefix, batch_size):
+            deleted += await backend.unlink(batch)
+            if pause_seconds:
+                await asyncio.sleep(pause_seconds)
+        return deleted
+
+    async def count_keys(self, batch_size: int = 1000) -> int:
+        """
+        Count the keys this limiter holds in the backend, with incremental
+        `SCAN`.
+
+        This is the number of storage keys, not of clients: a sliding
+        window keeps up to two keys per client, and a `MultiRateLimiter`
+        one per rule.
+
+        Args:
+            batch_size (int): The approximate number of keys per `SCAN`.
+                Defaults to 1000.
+
+        Returns:
+            int: The number of keys.
+
+        Raises:
+            TypeError: If the backend does not support key scans.
+        """
+        backend = self._scan_backend("count_keys")
+        count = 0
+        async for batch in backend.scan_keys(self._key_prefix, batch_size):
+            count += len(batch)
+        return count
+
+    # Optional hook: `_script_call(full_key, now, cost=b"1")` builds the keys
+    # and arguments of one call of `lua_script`, for the client's full key,
+    # the current time in ms (or `SERVER_TIME`) and the encoded request
+    # cost. Limiters defining it support `check_many`.
+    _script_call: Optional[
+        Callable[[str, Union[int, bytes], bytes], ScriptCall]
+    ] = None
+
+    async def check_many(
+        self, keys: Sequence[str], costs: Optional[Sequence[float]] = None
+    ) -> List[Quota]:
+        """
+        Count one request for each key, in a single round trip.
+
+        Meant for batch endpoints where one HTTP request carries many items
+        that are limited separately, e.g. events from many devices. The
+        Redis backend sends every check in one pipeline; each check is
+        still atomic, and a key listed twice is counted twice, in order.
+
+        Unlike calling the limiter, this never calls `on_limit`, does not
+        set headers, and neither reads nor fills the deny cache. A
+        `LeasedTokenBucketRateLimiter` checks the shared bucket directly.
+        All checks share one timestamp, so a plain `SlidingWindowLogRateLimiter`
+        (which keeps one entry per millisecond) counts a key repeated in a
+        batch once; give it a `bucket_seconds` to count every check.
+
+        Args:
+            keys (Sequence[str]): The client keys, in the form `key_func`
+                returns them.
+            costs (Optional[Sequence[float]]): The cost of each request, for
+                limiters that weigh requests (`TokenBucketRateLimiter` and
+                `GCRARateLimiter`). Defaults to the limiter's constant
+                `cost`, or 1 if its cost is computed per request.
+
+        Returns:
+            List[Quota]: The decision for each key, in order. `allowed`
+                tells whether the request was counted, `retry_after_ms` when
+                to try again if not.
+
+        Raises:
+            ValueError: If `costs` and `keys` differ in length, a cost is
+                negative or more than the limiter can ever allow, or the
+                limiter does not weigh requests.
+            TypeError: If the limiter does not support `check_many`, that is
+                does not define `_script_call`.
+
+        Example:
+            quotas = await limiter.check_many([event.device_id for event in events])
+            accepted = [e for e, q in zip(events, quotas) if q.allowed]
+        """
+        self._require("_script_call", "check_many")
+        if costs is None:
+            encoded = [getattr(self, "_cost_arg", None) or b"1"] * len(keys)
         else:
-            return func(*args, **kwargs)
+            if not hasattr(self, "_cost_arg"):
+                raise ValueError(f"{type(self).__name__} does not weigh requests.")
+            if len(costs) != len(keys):
+                raise ValueError("There must be one cost per key.")
+            for cost in costs:
+                self._check_cost(cost)
+            encoded = [str(cost).encode() for cost in costs]
+        if not keys:
+            return []
+        backend = self._ensure_backend()
+        now = SERVER_TIME if backend.server_time else int(time.time() * 1000)
+        calls = [
+            self._script_call(self._full_key(key), now, cost)
+            for key, cost in zip(keys, encoded)
+        ]
+        replies = await backend.run_many(self.lua_script, calls)
+        return [Quota._from_reply(reply) for reply in replies]
+
+    @staticmethod
+    def _set_headers(response: Response, reply: Sequence[Any]) -> None:
+        """
+        Set the `RateLimit-*` headers from a script reply.
+
+        Every script replies `{allowed, retry_after_ms, remaining, limit,
+        reset_ms}`, so the headers cost no extra backend call. Responses
+        without headers (such as test doubles) are left alone.
+
+        Args:
+            response (Response): The response to set the headers on.
+            reply (Sequence[Any]): The script reply.
+        """
+        headers = getattr(response, "headers", None)
+        if headers is None:
+            return
+        headers["RateLimit-Limit"] = str(reply[3])
+        headers["RateLimit-Remaining"] = str(reply[2])
+        # Whole seconds, rounded up so clients never retry too early.
+        headers["RateLimit-Reset"] = str(max(0, (int(reply[4]) + 999) // 1000))
+
+    @staticmethod
+    def _encode_args(*values) -> Tuple[bytes, ...]:
+        """
+        Encode constant script arguments once, so that they are not
+        converted again on every request.
+
+        Args:
+            *values: The argument values.
+
+        Returns:
+            Tuple[bytes, ...]: The values as the byte strings sent to Redis.
+        """
+        return tuple(str(value).encode() for value in values)
+
+    def _denied_for(self, full_key: str) -> Optional[float]:
+        """
+        Look up a key in the deny cache.
+
+        Args:
+            full_key (str): The full Redis key of the client.
+
+        Returns:
+            Optional[float]: The milliseconds left until the key may retry,
+                or `None` if the key is not (or no longer) denied.
+        """
+        if not self._denied:
+            return None
+        until = self._denied.get(full_key)
+        if until is None:
+            return None
+        remaining = (until - time.monotonic()) * 1000
+        if remaining <= 0:
+            del self._denied[full_key]
+            return None
+        return remaining
+
+    def _cache_denial(self, full_key: str, retry_ms: float) -> None:
+        """
+        Remember a denied key until its retry time, if the deny cache is enabled.
+
+        Args:
+            full_key (str): The full Redis key of the client.
+            retry_ms (float): The retry-after reported by the script, in ms.
+        """
+        if not self.deny_cache or retry_ms <= 0:
+            return
+        denied = self._denied
+        now = time.monotonic()
+        if full_key not in denied and len(denied) >= DENY_CACHE_MAX_KEYS:
+            for key in [k for k, until in denied.items() if until <= now]:
+                del denied[key]
+            if len(denied) >= DENY_CACHE_MAX_KEYS:
+                denied.popitem(last=False)
+        denied[full_key] = now + retry_ms / 1000
 
     @staticmethod
     async def _default_key_func(request: Request) -> str:
@@ -90,7 +886,7 @@ class BaseLimiter(ABC):
         """
         x_forwarded_for = request.headers.get("X-Forwarded-For")
         if x_forwarded_for:
-            client_ip = x_forwarded_for.split(",")[0].strip()
+            client_ip = x_forwarded_for.partition(",")[0].strip()
         else:
             client_ip = request.client.host if request.client else "unknown"
         return f"{client_ip}:{request.url.path}"
@@ -101,14 +897,23 @@ class BaseLimiter(ABC):
         Default handler when the rate limit is exceeded.
 
         Raises:
-            HTTPException: With status 429 and a Retry-After header.
+            HTTPException: With status 429, a Retry-After header and the
+                `RateLimit-*` headers set on `response`, which FastAPI would
+                otherwise drop from the error response.
         """
         from fastapi import HTTPException
 
+        headers = {"Retry-After": str(retry_after)}
+        response_headers = getattr(response, "headers", None)
+        if response_headers is not None:
+            for name in RATE_LIMIT_HEADERS:
+                value = response_headers.get(name)
+                if value is not None:
+                    headers[name] = value
         raise HTTPException(
             status_code=429,
             detail="Rate limit exceeded. Please try again later.",
-            headers={"Retry-After": str(retry_after)},
+            headers=headers,
         )
 
     @abstractmethod  # Make __call__ abstract
@@ -120,7 +925,97 @@ class BaseLimiter(ABC):
         """
         pass
 
+    def _ensure_backend(self) -> Backend:
+        if Cap.backend is None:
+            raise RuntimeError(
+                "Cap is not initialized. Call Cap.init_app(redis_url) or "
+                "Cap.init_backend(backend) before using any limiter."
+            )
+        if Cap.metrics is None:
+            return Cap.backend
+        return self._metered_backend(Cap.backend, Cap.metrics)
+
+    def _metered_backend(self, backend: Backend, metrics: Metrics) -> Backend:
+        """
+        Return a view of `backend` that reports this limiter's script call
+        durations to `metrics`, built once per backend and metrics object.
+        """
+        metered = getattr(self, "_metered", None)
+        if (
+            metered is None
+            or metered.backend is not backend
+            or metered.metrics is not metrics
+        ):
+            metered = self._metered = _MeteredBackend(
+                backend, metrics, self._instance_id
+            )
+        return metered
+
+    # Limiters written before storage backends were added called Redis
+    # directly: `redis = self._ensure_redis()`, `await self._ensure_lua_sha(
+    # script)`, `await self._safe_call(self.key_func, request)` and
+    # `redis.evalsha(self.lua_sha, ...)`. These helpers keep that pattern
+    # working. New limiters run their script with
+    # `self._ensure_backend().run(script, keys, args)`.
+
+    async def _ensure_lua_sha(self, lua_script: str) -> None:
+        """
+        Deprecated: ensure the Lua script is loaded into Redis and store its
+        SHA1 hash in `lua_sha`.
+
+        Args:
+            lua_script (str): The Lua script to load.
+
+        Raises:
+            RuntimeError: If `Cap.redis` is not initialized.
+        """
+        warnings.warn(
+            "_ensure_lua_sha is deprecated, run the script with "
+            "self._ensure_backend().run(script, keys, args) instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if self.lua_sha is None:
+            self.lua_sha = await self._redis().script_load(lua_script)
+
+    async def _safe_call(self, func: Callable, *args, **kwargs):
+        """
+        Deprecated: call a function, awaiting it if it is a coroutine
+        function.
+
+        Args:
+            func (Callable): The function to call.
+            *args: Positional arguments to pass to the function.
+            **kwargs: Keyword arguments to pass to the function.
+
+        Returns:
+            Any: The result of the function call.
+        """
+        warnings.warn(
+            "_safe_call is deprecated, call key_func and on_limit directly.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        if inspect.iscoroutinefunction(func):
+            return await func(*args, **kwargs)
+        return func(*args, **kwargs)
+
     def _ensure_redis(self) -> Redis:
+        """
+        Deprecated: return `Cap.redis`.
+
+        Raises:
+            RuntimeError: If `Cap.redis` is not initialized.
+        """
+        warnings.warn(
+            "_ensure_redis is deprecated, use self._ensure_backend() instead.",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self._redis()
+
+    @staticmethod
+    def _redis() -> Redis:
         if Cap.redis is None:
             raise RuntimeError(
                 "Cap.redis is not initialized. "
@@ -0,0 +1,123 @@
+import asyncio
+from typing import Any, List, Optional, Set, Tuple, Union
+
+from redis.asyncio import Redis, RedisCluster
+
+
+class ScriptBatcher:
+    """
+    Coalesces concurrent `EVALSHA` and `FCALL` calls into a single pipelined
+    round trip.
+
+    Every limiter check normally issues its own script call, which means one
+    network round trip per request. When batching is enabled, calls issued
+    during the same event-loop tick (or within `window_us` microseconds of
+    the first queued call) are buffered and sent to Redis as one
+    non-transactional pipeline. Each caller awaits a future that resolves
+    to its own script result, so limiters behave exactly as if they had
+    called `evalsha` directly.
+
+    Args:
+        redis (Union[Redis, RedisCluster]): The client used to execute the
+            pipeline. A cluster pipeline splits the batch per node.
+        window_us (int): How long, in microseconds, to keep collecting calls
+            after the first one is queued. `0` flushes at the end of the
+            current event-loop tick. Defaults to 0.
+        max_batch (int): The maximum number of calls sent in one pipeline.
+            A full batch is flushed immediately. Defaults to 512.
+
+    Raises:
+        ValueError: If `window_us` is negative or `max_batch` is not positive.
+    """
+
+    def __init__(
+        self,
+        redis: Union[Redis, RedisCluster],
+        window_us: int = 0,
+        max_batch: int = 512,
+    ) -> None:
+        if window_us < 0:
+            raise ValueError("Batch window must not be negative.")
+        if max_batch <= 0:
+            raise ValueError("Batch size must be a positive integer.")
+        self.redis = redis
+        self.window: float = window_us / 1_000_000
+        self.max_batch = max_batch
+        self._pending: List[Tuple[tuple, asyncio.Future]] = []
+        self._handle: Optional[asyncio.Handle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def evalsha(self, sha: str, numkeys: int, *keys_and_args: Any) -> asyncio.Future:
+        """
+        Queue an `EVALSHA` call and return a future for its result.
+
+        Args:
+            sha (str): The SHA1 hash of a script already loaded into Redis.
+            numkeys (int): The number of key arguments.
+            *keys_and_args: The keys followed by the script arguments.
+
+        Returns:
+            asyncio.Future: Resolves to the script result, or raises the
+                error Redis returned for this particular call.
+        """
+        return self._queue(("EVALSHA", sha, numkeys, *keys_and_args))
+
+    def fcall(self, function: str, numkeys: int, *keys_and_args: Any) -> asyncio.Future:
+        """
+        Queue an `FCALL` call and return a future for its result.
+
+        Args:
+            function (str): The name of a function loaded into Redis.
+            numkeys (int): The number of key arguments.
+            *keys_and_args: The keys followed by the function arguments.
+
+        Returns:
+            asyncio.Future: Resolves to the function result, or raises the
+                error Redis returned for this particular call.
+        """
+        return self._queue(("FCALL", function, numkeys, *keys_and_args))
+
+    def _queue(self, command: tuple) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((command, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._handle is None:
+            if self.window:
+                self._handle = loop.call_later(self.window, self._flush)
+            else:
+                self._handle = loop.call_soon(self._flush)
+        return future
+
+    def _flush(self) -> None:
+        if self._handle is not None:
+            self._handle.cancel()
+            self._handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.ensure_future(self._send(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[tuple, asyncio.Future]]) -> None:
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for command, _ in batch:
+                pipe.execute_command(*command)
+            results = await pipe.execute(raise_on_error=False)
+        except BaseException as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -1,26 +1,42 @@
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Union
 
 import redis.asyncio as aioredis
-from redis.asyncio import Redis
+from redis.asyncio import Redis, RedisCluster
+
+from .backends import Backend, CircuitBreakerBackend, MemoryBackend, RedisBackend
+from .metrics import Metrics
+from .pool import InstrumentedConnectionPool, parser_class, pool_stats
 
 
 class Cap:
     """
-    Singleton-style Redis connection manager for Cap.
+    Singleton-style storage manager for Cap.
 
-    This class provides a shared, async Redis connection for all rate limiter
-    instances. It is not meant to be instantiated; use the classmethod
-    `init_app` to initialize the connection.
+    This class provides a shared backend, by default an async Redis
+    connection, for all rate limiter instances. It is not meant to be
+    instantiated; use the classmethod `init_app` to initialize a Redis
+    connection, or `init_backend` to plug in any other `Backend`.
 
     Attributes:
-        redis: The shared aioredis Redis connection instance.
+        redis: The shared aioredis `Redis` (or `RedisCluster`) client, or
+            `None` when a non-Redis backend is used.
+        backend: The shared `Backend` every limiter runs its scripts on.
+        metrics: The `Metrics` limiters report to, or `None` when metrics
+            are disabled.
+        failure_mode: What limiters do when the backend is unavailable:
+            `"raise"` (the default), `"open"`, `"closed"` or `"local"`.
 
     Example:
         Cap.init_app("redis://localhost:6379/0")
         # Now Cap.redis can be used by all limiters.
     """
 
-    redis: Optional[Redis] = None
+    redis: Optional[Union[Redis, RedisCluster]] = None
+    backend: Optional[Backend] = None
+    metrics: Optional[Metrics] = None
+    failure_mode: str = "raise"
+    _failure_policy: Optional[Dict[str, Any]] = None
 
     def __init__(self) -> None:
         """
@@ -32,14 +48,314 @@ class Cap:
         raise RuntimeError("Use classmethods only; do not instantiate Cap.")
 
     @classmethod
-    def init_app(cls, redis_url: str) -> None:
+    def init_app(
+        cls,
+        redis_url: str,
+        batch: bool = False,
+        batch_window_us: int = 0,
+        cluster: bool = False,
+        server_time: bool = False,
+        functions: Optional[bool] = None,
+        max_connections: Optional[int] = None,
+        pool_timeout: Optional[float] = 20,
+        socket_timeout: Optional[float] = None,
+        socket_connect_timeout: Optional[float] = None,
+        socket_keepalive: Optional[bool] = None,
+        health_check_interval: float = 0,
+        hiredis: Optional[bool] = None,
+        replica_url: Optional[str] = None,
+    ) -> None:
         """
         Initialize the shared Redis connection for Cap.
 
         Args:
-            redis_url (str): The Redis connection URL.
+            redis_url (str): The Redis connection URL. With `cluster=True`,
+                the URL of any node of the cluster.
+            batch (bool): If `True`, limiter checks issued concurrently are
+                coalesced into one pipelined round trip to Redis instead of
+                one `EVALSHA` per request. Defaults to False.
+            batch_window_us (int): When batching, how long in microseconds
+                to keep collecting calls before flushing. `0` flushes at the
+                end of the current event-loop tick. Defaults to 0.
+            cluster (bool): If `True`, connect to a Redis Cluster with a
+                `RedisCluster` client. Limiter keys are hash-tagged, so every
+                script call touches a single slot. Defaults to False.
+            server_time (bool): If `True`, every script reads the current
+                time from the Redis server instead of receiving the worker's
+                clock, so workers on hosts with skewed clocks still agree.
+                Scripts are then replicated by their effects. Defaults to False.
+            functions (Optional[bool]): `True` to require Redis Functions
+                (Redis 7+), `False` to always use `EVALSHA`, `None` to use
+                functions when the server supports them. Defaults to None.
+            max_connections (Optional[int]): Bound the connection pool to this
+                many connections. When all are busy, commands wait for a free
+                one (up to `pool_timeout`) instead of opening new connections.
+                `None` keeps redis-py's unbounded pool. On a cluster this is
+                the limit per node. Defaults to None.
+            pool_timeout (Optional[float]): With `max_connections`, how long
+                in seconds to wait for a free connection before raising
+                `ConnectionError`. Defaults to 20.
+            socket_timeout (Optional[float]): Timeout in seconds for socket
+                reads and writes. Defaults to redis-py's default.
+            socket_connect_timeout (Optional[float]): Timeout in seconds for
+                establishing a connection. Defaults to redis-py's default.
+            socket_keepalive (Optional[bool]): Enable TCP keepalive on the
+                connections. Defaults to redis-py's default.
+            health_check_interval (float): Ping idle connections that have not
+                been used for this many seconds before reusing them.
+                `0` disables health checks. Defaults to 0.
+            hiredis (Optional[bool]): `True` to require the hiredis response
+                parser, `False` to force the pure-Python parser, `None` to use
+                hiredis when installed. Ignored for clusters. Defaults to None.
+            replica_url (Optional[str]): The URL of a replica to serve the
+                read-only `peek` calls from, with the same connection
+                options. Not supported with `cluster=True`. Defaults to None.
+
+        Raises:
+            RuntimeError: If `hiredis=True` but hiredis is not installed.
+            ValueError: If `replica_url` is given with `cluster=True`.
 
         Example:
             Cap.init_app("redis://localhost:6379/0")
+            Cap.init_app("redis://localhost:6379/0", batch=True, batch_window_us=200)
+            Cap.init_app("redis://node1:7000", cluster=True)
+            Cap.init_app("redis://localhost:6379/0", server_time=True)
+            Cap.init_app(
+                "redis://localhost:6379/0",
+                max_connections=64,
+                socket_timeout=0.5,
+                health_check_interval=30,
+            )
+        """
+        options: Dict[str, Any] = {"health_check_interval": health_check_interval}
+        for option, value in (
+            ("socket_timeout", socket_timeout),
+            ("socket_connect_timeout", socket_connect_timeout),
+            ("socket_keepalive", socket_keepalive),
+        ):
+            if value is not None:
+                options[option] = value
+        replica = None
+        if cluster:
+            if replica_url is not None:
+                raise ValueError("replica_url is not supported with cluster=True.")
+            if max_connections is not None:
+                options["max_connections"] = max_connections
+            cls.redis = RedisCluster.from_url(
+                redis_url, decode_responses=True, **options
+            )
+        else:
+            parser = parser_class(hiredis)
+            if parser is not None:
+                options["parser_class"] = parser
+
+            def connect(url: str) -> Redis:
+                if max_connections is None:
+                    return aioredis.from_url(url, decode_responses=True, **options)
+                pool = InstrumentedConnectionPool.from_url(
+                    url,
+                    max_connections=max_connections,
+                    timeout=pool_timeout,
+                    decode_responses=True,
+                    **options,
+                )
+                return Redis(connection_pool=pool)
+
+            cls.redis = connect(redis_url)
+            if replica_url is not None:
+                replica = connect(replica_url)
+        cls.backend = RedisBackend(
+            cls.redis,
+            batch=batch,
+            batch_window_us=batch_window_us,
+            server_time=server_time,
+            functions=functions,
+            replica=replica,
+        )
+        cls.backend.metrics = cls.metrics
+        cls.backend = cls._guard(cls.backend)
+
+    @classmethod
+    def init_backend(cls, backend: Backend) -> None:
+        """
+        Use a custom storage backend for all limiters.
+
+        Args:
+            backend (Backend): The backend to use, e.g. `MemoryBackend()` for
+                single-process deployments that do not need Redis.
+
+        Example:
+            from fastapicap.backends import MemoryBackend
+
+            Cap.init_backend(MemoryBackend())
+        """
+        inner = backend
+        if isinstance(inner, CircuitBreakerBackend):
+            inner = inner.backend
+        cls.redis = inner.redis if isinstance(inner, RedisBackend) else None
+        if cls.metrics is not None:
+            backend.metrics = cls.metrics
+        cls.backend = cls._guard(backend)
+
+    @classmethod
+    def init_failure_policy(
+        cls,
+        mode: Optional[str] = "open",
+        timeout_ms: Optional[float] = None,
+        failure_threshold: int = 5,
+        cooldown_seconds: float = 10.0,
+    ) -> None:
+        """
+        Decide what limiters do when the backend is slow or down.
+
+        The backend is wrapped in a `CircuitBreakerBackend`: each script call
+        gets `timeout_ms`, and after `failure_threshold` consecutive failures
+        the backend is not called for `cooldown_seconds`. Requests that the
+        backend cannot decide on are then handled by `mode`:
+
+        - `"open"`: allow them.
+        - `"closed"`: reject them through the limiter's `on_limit`.
+        - `"local"`: enforce the same limits in process with a
+          `MemoryBackend`, i.e. per worker instead of globally.
+        - `"raise"`: raise `BackendUnavailable`.
+
+        The policy also applies to backends set up later with `init_app` or
+        `init_backend`. `init_failure_policy(None)` removes it.
+
+        Args:
+            mode (Optional[str]): The failure mode, or `None` to remove the
+                policy. Defaults to "open".
+            timeout_ms (Optional[float]): The time budget of one backend
+                call in milliseconds, or `None` to rely on the client's own
+                timeouts. Defaults to None.
+            failure_threshold (int): Consecutive failures that open the
+                circuit. Defaults to 5.
+            cooldown_seconds (float): How long the backend is skipped once
+                the circuit is open. Defaults to 10.
+
+        Raises:
+            ValueError: If `mode` is unknown or an option is out of range.
+
+        Example:
+            Cap.init_app("redis://localhost:6379/0", socket_timeout=0.1)
+            Cap.init_failure_policy("open", timeout_ms=50, cooldown_seconds=5)
+        """
+        if mode is None:
+            cls.failure_mode = "raise"
+            cls._failure_policy = None
+            if isinstance(cls.backend, CircuitBreakerBackend):
+                cls.backend = cls.backend.backend
+            return
+        if mode not in ("open", "closed", "local", "raise"):
+            raise ValueError(
+                "Failure mode must be 'open', 'closed', 'local' or 'raise'."
+            )
+        policy = {
+            "timeout_ms": timeout_ms,
+            "failure_threshold": failure_threshold,
+            "cooldown_seconds": cooldown_seconds,
+        }
+        # Validate the options before changing any state.
+        CircuitBreakerBackend(MemoryBackend(), **policy)
+        cls.failure_mode = mode
+        cls._failure_policy = policy
+        if cls.backend is not None:
+            cls.backend = cls._guard(cls.backend)
+
+    @classmethod
+    def _guard(cls, backend: Backend) -> Backend:
+        """
+        Wrap `backend` in a circuit breaker if a failure policy is set.
+        """
+        policy = cls._failure_policy
+        if policy is None:
+            return backend
+        if isinstance(backend, CircuitBreakerBackend):
+            backend = backend.backend
+        fallback = MemoryBackend() if cls.failure_mode == "local" else None
+        return CircuitBreakerBackend(backend, fallback=fallback, **policy)
+
+    @classmethod
+    def init_metrics(cls, metrics: Optional[Metrics]) -> None:
+        """
+        Report limiter decisions and latencies to `metrics`.
+
+        Limiters record every decision, the time spent in their key function
+        and in backend calls, and the Redis backend records script reloads.
+        Pass `None` to disable metrics again; disabled metrics cost one
+        attribute check per limiter call.
+
+        Args:
+            metrics (Optional[Metrics]): The receiver, e.g.
+                `PrometheusMetrics()`, or `None`.
+
+        Example:
+            from fastapicap.metrics import PrometheusMetrics
+
+            Cap.init_metrics(PrometheusMetrics())
+        """
+        cls.metrics = metrics
+        if cls.backend is not None:
+            cls.backend.metrics = metrics
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        Close the shared backend and release its connections.
+
+        Call this on application shutdown, or before re-initializing Cap, so
+        that connections are not leaked across reloads.
+        """
+        backend, cls.backend, cls.redis = cls.backend, None, None
+        if backend is not None:
+            await backend.close()
+
+    @classmethod
+    def lifespan(cls, redis_url: str, **options: Any):
+        """
+        Build a FastAPI lifespan handler that manages the Redis connection.
+
+        On startup the connection is initialized with `init_app` and checked
+        with a `PING`, so a misconfigured Redis fails the deployment instead
+        of the first request. On shutdown it is closed with `close`.
+
+        Args:
+            redis_url (str): The Redis connection URL.
+            **options: Any other keyword arguments accepted by `init_app`.
+
+        Returns:
+            Callable: A lifespan function for `FastAPI(lifespan=...)`.
+
+        Example:
+            app = FastAPI(lifespan=Cap.lifespan("redis://localhost:6379/0"))
+        """
+
+        @asynccontextmanager
+        async def lifespan(app):
+            cls.init_app(redis_url, **options)
+            try:
+                await cls.redis.ping()
+                yield
+            finally:
+                await cls.close()
+
+        return lifespan
+
+    @classmethod
+    def pool_stats(cls) -> Optional[Dict[str, Any]]:
+        """
+        Report the utilization of the shared connection pool.
+
+        Returns:
+            Optional[Dict[str, Any]]: `max_connections`, `in_use` and `idle`
+                connection counts, plus `acquisitions`, `total_wait` and
+                `max_wait` (seconds spent acquiring connections) when the pool
+                is bounded with `max_connections`. `None` if Cap is not
+                connected to a standalone Redis.
+
+        Example:
+            stats = Cap.pool_stats()
+            average_wait = stats["total_wait"] / max(stats["acquisitions"], 1)
         """
-        cls.redis = aioredis.from_url(redis_url, decode_responses=True)
+        pool = getattr(cls.redis, "connection_pool", None)
+        return pool_stats(pool) if pool is not None else None
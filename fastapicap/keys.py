@@ -0,0 +1,313 @@
+import base64
+import binascii
+import functools
+import hashlib
+import inspect
+import ipaddress
+import json
+from typing import Any, Callable, Iterable, Optional
+
+from fastapi import Request
+
+# Upper bound on the number of parsed values (addresses, API keys, tokens)
+# each key function remembers.
+KEY_CACHE_SIZE = 4096
+
+KeyFunc = Callable[[Request], Any]
+
+# The key functions below are synchronous: the limiters call them directly,
+# without creating a coroutine per request. Everything derived from header
+# values is parsed once per distinct value and served from an LRU cache.
+
+
+def route(request: Request) -> str:
+    """
+    Key function returning the template of the matched route.
+
+    `/users/{user_id}` is returned for both `/users/1` and `/users/2`, so all
+    requests to a route share one key instead of one per path parameter.
+    Before routing, e.g. in `RateLimitMiddleware`, no route is known yet and
+    the request path is returned.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        str: The route's path template, or the request path.
+    """
+    matched = request.scope.get("route")
+    if matched is None:
+        return request.url.path
+    return getattr(matched, "path_format", None) or matched.path
+
+
+# The key depends on routing, so limiters must not reuse a key computed
+# before routing (e.g. by `RateLimitMiddleware`) after it.
+route._cap_no_memo = True
+
+
+def per_route(key_func: KeyFunc) -> KeyFunc:
+    """
+    Scope a key function to the matched route.
+
+    Args:
+        key_func (Callable): A synchronous or asynchronous key function.
+
+    Returns:
+        Callable: A key function of the same kind returning
+            `"<key>:<route template>"` (see `route`).
+
+    Example:
+        limiter = RateLimiter(limit=100, minutes=1, key_func=per_route(client_ip()))
+    """
+    if inspect.iscoroutinefunction(key_func):
+
+        async def scoped_async(request: Request) -> str:
+            return f"{await key_func(request)}:{route(request)}"
+
+        scoped_async._cap_no_memo = True
+        return scoped_async
+
+    def scoped(request: Request) -> str:
+        return f"{key_func(request)}:{route(request)}"
+
+    scoped._cap_no_memo = True
+    return scoped
+
+
+def _trust_check(trusted_proxies: Iterable[str]) -> Callable[[str], bool]:
+    networks = tuple(
+        ipaddress.ip_network(proxy, strict=False) for proxy in trusted_proxies
+    )
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+    def is_trusted(host: str) -> bool:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return any(address in network for network in networks)
+
+    return is_trusted
+
+
+def client_ip(
+    trusted_proxies: Iterable[str] = (), header: str = "X-Forwarded-For"
+) -> Callable[[Request], str]:
+    """
+    Build a key function returning the client's IP address.
+
+    Unlike the default key function, the forwarding header is only used for
+    requests from a trusted proxy, so clients cannot choose their own key by
+    sending it. The address is the first hop, from the right, that is not a
+    trusted proxy.
+
+    Args:
+        trusted_proxies (Iterable[str]): Addresses or networks (e.g.
+            `"10.0.0.0/8"`) of the proxies in front of the app. With none,
+            the header is ignored and the peer address is used.
+            Defaults to none.
+        header (str): The header proxies append client addresses to.
+            Defaults to `"X-Forwarded-For"`.
+
+    Returns:
+        Callable: A synchronous key function.
+
+    Raises:
+        ValueError: If a trusted proxy is not a valid address or network.
+
+    Example:
+        limiter = RateLimiter(
+            limit=100, minutes=1, key_func=client_ip(trusted_proxies=["10.0.0.0/8"])
+        )
+    """
+    trusted = tuple(trusted_proxies)
+    if not trusted:
+
+        def peer(request: Request) -> str:
+            return request.client.host if request.client else "unknown"
+
+        return peer
+
+    is_trusted = _trust_check(trusted)
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+    def resolve(host: str, forwarded: str) -> str:
+        # Each proxy appends the address it received the request from, so
+        # the first untrusted hop from the right is the client.
+        hops = [hop.strip() for hop in forwarded.split(",")]
+        for hop in reversed(hops):
+            if hop and not is_trusted(hop):
+                return hop
+        return hops[0] or host
+
+    def forwarded_host(request: Request) -> str:
+        if not request.client:
+            return "unknown"
+        host = request.client.host
+        if not is_trusted(host):
+            return host
+        forwarded = request.headers.get(header)
+        if not forwarded:
+            return host
+        return resolve(host, forwarded)
+
+    return forwarded_host
+
+
+def client_network(
+    ipv4_prefix: int = 24,
+    ipv6_prefix: int = 64,
+    trusted_proxies: Iterable[str] = (),
+    header: str = "X-Forwarded-For",
+) -> Callable[[Request], str]:
+    """
+    Build a key function returning the network of the client's IP address.
+
+    A client given a whole IPv6 /64, or a handful of neighbouring IPv4
+    addresses, would otherwise get one quota per address. Aggregating them
+    limits the network as one client and bounds the number of keys.
+
+    Args:
+        ipv4_prefix (int): The prefix length IPv4 addresses are reduced to.
+            Defaults to 24.
+        ipv6_prefix (int): The prefix length IPv6 addresses are reduced to.
+            Defaults to 64.
+        trusted_proxies (Iterable[str]): As for `client_ip`.
+        header (str): As for `client_ip`.
+
+    Returns:
+        Callable: A synchronous key function returning networks such as
+            `"203.0.113.0/24"`. Values that are not IP addresses are
+            returned as they are.
+
+    Raises:
+        ValueError: If a prefix length is out of range, or a trusted proxy is
+            not a valid address or network.
+    """
+    if not 0 <= ipv4_prefix <= 32:
+        raise ValueError("IPv4 prefix length must be between 0 and 32.")
+    if not 0 <= ipv6_prefix <= 128:
+        raise ValueError("IPv6 prefix length must be between 0 and 128.")
+    host_of = client_ip(trusted_proxies, header)
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+    def network(host: str) -> str:
+        try:
+            address = ipaddress.ip_address(host)
+        except ValueError:
+            return host
+        if isinstance(address, ipaddress.IPv6Address) and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        prefix = ipv4_prefix if address.version == 4 else ipv6_prefix
+        return str(ipaddress.ip_network((address, prefix), strict=False))
+
+    def client_network_key(request: Request) -> str:
+        return network(host_of(request))
+
+    return client_network_key
+
+
+def _sync_fallback(fallback: Optional[KeyFunc]) -> Callable[[Request], str]:
+    if fallback is None:
+        return client_ip()
+    if inspect.iscoroutinefunction(fallback):
+        raise ValueError("The fallback key function must be synchronous.")
+    return fallback
+
+
+def api_key(
+    header: str = "X-API-Key",
+    fallback: Optional[Callable[[Request], str]] = None,
+) -> Callable[[Request], str]:
+    """
+    Build a key function returning a hash of the request's API key.
+
+    The key is hashed (BLAKE2b, 128 bits) so the secret itself is never
+    written to Redis, and every key is stored under the same short length.
+
+    Args:
+        header (str): The header carrying the API key.
+            Defaults to `"X-API-Key"`.
+        fallback (Optional[Callable]): A synchronous key function for
+            requests without the header. Defaults to `client_ip()`.
+
+    Returns:
+        Callable: A synchronous key function returning `"key:<hash>"`.
+
+    Raises:
+        ValueError: If `fallback` is a coroutine function.
+    """
+    fallback = _sync_fallback(fallback)
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+    def digest(value: str) -> str:
+        return "key:" + hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+    def api_key_key(request: Request) -> str:
+        value = request.headers.get(header)
+        if not value:
+            return fallback(request)
+        return digest(value)
+
+    return api_key_key
+
+
+def jwt_subject(
+    claim: str = "sub",
+    header: str = "Authorization",
+    fallback: Optional[Callable[[Request], str]] = None,
+) -> Callable[[Request], str]:
+    """
+    Build a key function returning a claim of the request's bearer JWT.
+
+    The token's payload is decoded without verifying its signature, which is
+    much cheaper than verifying it. A client can therefore send a token with
+    any subject, so use it where tokens are verified before the limiter runs
+    (for example by a gateway), or where a forged subject only affects the
+    forger's own quota.
+
+    Args:
+        claim (str): The claim identifying the client. Defaults to `"sub"`.
+        header (str): The header carrying `Bearer <token>`.
+            Defaults to `"Authorization"`.
+        fallback (Optional[Callable]): A synchronous key function for
+            requests without a readable token or claim. Defaults to
+            `client_ip()`.
+
+    Returns:
+        Callable: A synchronous key function returning `"<claim>:<value>"`,
+            e.g. `"sub:user-42"`.
+
+    Raises:
+        ValueError: If `fallback` is a coroutine function.
+    """
+    fallback = _sync_fallback(fallback)
+
+    @functools.lru_cache(maxsize=KEY_CACHE_SIZE)
+    def subject(token: str) -> Optional[str]:
+        parts = token.split(".")
+        if len(parts) != 3:
+            return None
+        payload = parts[1]
+        try:
+            padded = payload + "=" * (-len(payload) % 4)
+            claims = json.loads(base64.urlsafe_b64decode(padded))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            return None
+        value = claims.get(claim) if isinstance(claims, dict) else None
+        if value is None or isinstance(value, (dict, list)):
+            return None
+        return f"{claim}:{value}"
+
+    def jwt_subject_key(request: Request) -> str:
+        authorization = request.headers.get(header)
+        if authorization:
+            scheme, _, token = authorization.partition(" ")
+            if scheme.lower() == "bearer":
+                key = subject(token.strip())
+                if key is not None:
+                    return key
+        return fallback(request)
+
+    return jwt_subject_key
@@ -1,31 +1,67 @@
+# Passed as a script's `now` argument to make it read the Redis server clock.
+#
+# A script reading `TIME` is not deterministic: replicas, and the AOF when it
+# is replayed, would read a different time than the primary did. So the
+# scripts call `redis.replicate_commands()` before `TIME`, which replicates
+# the commands a script ran instead of the script itself. That is the
+# default since Redis 5, where the call does nothing. It is guarded because
+# some Redis-compatible servers do not define it.
+SERVER_TIME = b""
+
+# Every limiter script replies {allowed, retry_after_ms, remaining, limit,
+# reset_ms}: whether the request is allowed, how long to wait if it is not,
+# and the quota left after this request, the quota size and the time until
+# the quota is restored, which limiters turn into RateLimit-* headers.
+
 FIXED_WINDOW = """
 local key = KEYS[1]
 local limit = tonumber(ARGV[1])
 local expire_time = tonumber(ARGV[2])
 local current = redis.call("INCR", key)
 
+local ttl = expire_time
 if current == 1 then
     redis.call("PEXPIRE", key, expire_time)
+else
+    ttl = redis.call("PTTL", key)
 end
 
+local remaining = math.max(0, limit - current)
 if current > limit then
-    return redis.call("PTTL", key)
+    return {0, ttl, remaining, limit, ttl}
 else
-    return 0
+    return {1, 0, remaining, limit, ttl}
 end
 """
 
-SLIDING_WINDOW = """-- KEYS[1]: The key for the current window
--- KEYS[2]: The key for the previous window
--- ARGV[1]: The current window timestamp (window start, in ms)
+SLIDING_WINDOW = """-- KEYS[1]: The key for the current window, or the client's base key when
+--          ARGV[1] is empty
+-- KEYS[2]: The key for the previous window (omitted when ARGV[1] is empty)
+-- ARGV[1]: The current window timestamp (window start, in ms), or empty to
+--          derive the window from the Redis server clock
 -- ARGV[2]: The window size in ms
 -- ARGV[3]: The max allowed requests
 
+local window_size = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+
+-- Server clock (see SERVER_TIME in lua.py).
+if redis.replicate_commands then
+    redis.replicate_commands()
+end
+local now = redis.call("TIME")
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+
 local curr_key = KEYS[1]
 local prev_key = KEYS[2]
 local curr_window = tonumber(ARGV[1])
-local window_size = tonumber(ARGV[2])
-local limit = tonumber(ARGV[3])
+if curr_window == nil then
+    -- The window keys share the base key's hash tag, so they live in the
+    -- same cluster slot
+    curr_window = now_ms - (now_ms % window_size)
+    curr_key = KEYS[1] .. ":" .. curr_window
+    prev_key = KEYS[1] .. ":" .. (curr_window - window_size)
+end
 
 -- Increment the current window counter
 local curr_count = redis.call("INCR", curr_key)
@@ -37,8 +73,6 @@ end
 local prev_count = tonumber(redis.call("GET", prev_key) or "0")
 
 -- Calculate how far we are into the window
-local now = redis.call("TIME")
-local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
 local elapsed = now_ms - curr_window
 local weight = elapsed / window_size
 if weight > 1 then weight = 1 end
@@ -46,25 +80,49 @@ if weight < 0 then weight = 0 end
 
 -- Weighted sum
 local total = curr_count + prev_count * (1 - weight)
+local remaining = math.max(0, math.floor(limit - total))
+-- Time to next window
+local reset = window_size - elapsed
 
 if total > limit then
-    -- Return time to next window
-    return window_size - elapsed
+    return {0, reset, remaining, limit, reset}
 else
-    return 0
+    return {1, 0, remaining, limit, reset}
 end
 """
 
 
 TOKEN_BUCKET = """
+-- KEYS[1]: The bucket key
+-- ARGV[1]: capacity
+-- ARGV[2]: refill rate (tokens per ms)
+-- ARGV[3]: now (ms), or empty to use the Redis server clock
+-- ARGV[4]: tokens consumed by the request (optional, defaults to 1)
 local key = KEYS[1]
 local capacity = tonumber(ARGV[1])
 local refill_rate = tonumber(ARGV[2])
 local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4]) or 1
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
 
-local bucket = redis.call("HMGET", key, "tokens", "last_refill")
-local tokens = tonumber(bucket[1])
-local last_refill = tonumber(bucket[2])
+local tokens, last_refill
+local bucket = redis.pcall("HMGET", key, "tokens", "last_refill")
+if bucket.err then
+    -- WRONGTYPE: the bucket was packed by the packed variant of this
+    -- script. Read it and store it as a hash again.
+    tokens, last_refill = struct.unpack("<dd", redis.call("GET", key))
+    redis.call("DEL", key)
+else
+    tokens = tonumber(bucket[1])
+    last_refill = tonumber(bucket[2])
+end
 
 if tokens == nil then
     tokens = capacity
@@ -82,12 +140,12 @@ last_refill = now
 local allowed = 0
 local retry_after = 0
 
-if tokens >= 1 then
-    tokens = tokens - 1
+if tokens >= cost then
+    tokens = tokens - cost
     allowed = 1
 else
     allowed = 0
-    retry_after = math.ceil((1 - tokens) / refill_rate)
+    retry_after = math.ceil((cost - tokens) / refill_rate)
 end
 
 -- Cap the expire time to Redis max
@@ -99,7 +157,83 @@ end
 redis.call("HMSET", key, "tokens", tokens, "last_refill", last_refill)
 redis.call("PEXPIRE", key, expire_time)
 
-return allowed == 1 and 0 or retry_after
+-- Time until the bucket is full again
+local reset = math.ceil((capacity - tokens) / refill_rate)
+return {allowed, retry_after, math.floor(tokens), capacity, reset}
+"""
+
+TOKEN_BUCKET_LEASE = """
+-- KEYS[1]: The token bucket key (same layout as TOKEN_BUCKET)
+-- ARGV[1]: capacity
+-- ARGV[2]: refill rate (tokens per ms)
+-- ARGV[3]: now (ms), or empty to use the Redis server clock
+-- ARGV[4]: number of tokens requested for the lease
+-- ARGV[5]: number of unused tokens handed back from a previous lease
+-- Returns {granted, retry_after_ms, remaining, capacity, reset_ms}, where
+-- remaining is what is left in the shared bucket
+
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+local requested = tonumber(ARGV[4])
+local returned = tonumber(ARGV[5])
+
+local tokens, last_refill
+local bucket = redis.pcall("HMGET", key, "tokens", "last_refill")
+if bucket.err then
+    -- WRONGTYPE: the bucket was packed by the packed variant of this
+    -- script. Read it and store it as a hash again.
+    tokens, last_refill = struct.unpack("<dd", redis.call("GET", key))
+    redis.call("DEL", key)
+else
+    tokens = tonumber(bucket[1])
+    last_refill = tonumber(bucket[2])
+end
+
+if tokens == nil then
+    tokens = capacity
+    last_refill = now
+end
+
+local delta = math.max(0, now - last_refill)
+local refill = 0
+if refill_rate > 0 then
+    refill = delta * refill_rate
+end
+tokens = math.min(capacity, tokens + refill + returned)
+last_refill = now
+
+local granted = math.min(requested, math.floor(tokens))
+local retry_after = 0
+
+if granted > 0 then
+    tokens = tokens - granted
+else
+    granted = 0
+    if requested > 0 then
+        retry_after = math.ceil((1 - tokens) / refill_rate)
+    end
+end
+
+local expire_time = math.ceil(capacity / refill_rate)
+if expire_time > 2147483647 then
+    expire_time = 2147483647
+end
+
+redis.call("HMSET", key, "tokens", tokens, "last_refill", last_refill)
+redis.call("PEXPIRE", key, expire_time)
+
+local reset = math.ceil((capacity - tokens) / refill_rate)
+return {granted, retry_after, math.floor(tokens), capacity, reset}
 """
 
 LEAKY_BUCKET = """
@@ -107,10 +241,26 @@ local key = KEYS[1]
 local capacity = tonumber(ARGV[1])
 local leak_rate = tonumber(ARGV[2])
 local now = tonumber(ARGV[3])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
 
-local bucket = redis.call("HMGET", key, "level", "last_leak")
-local level = tonumber(bucket[1]) or 0
-local last_leak =tonumber(bucket[2]) or now
+local level, last_leak
+local bucket = redis.pcall("HMGET", key, "level", "last_leak")
+if bucket.err then
+    -- WRONGTYPE: the bucket was packed by LEAKY_BUCKET_PACKED. Read it and
+    -- store it as a hash again.
+    level, last_leak = struct.unpack("<dd", redis.call("GET", key))
+    redis.call("DEL", key)
+else
+    level = tonumber(bucket[1]) or 0
+    last_leak = tonumber(bucket[2]) or now
+end
 
 if level == nil then
     level = 0
@@ -144,7 +294,209 @@ end
 redis.call("HMSET", key, "level", level, "last_leak", last_leak)
 redis.call("PEXPIRE", key, expire_time)
 
-return allowed == 1 and 0 or retry_after
+-- Time until the bucket has drained
+local reset = 0
+if level > 0 then
+    reset = math.min(math.ceil(level / leak_rate), 2147483647)
+end
+return {allowed, retry_after, math.floor(capacity - level), capacity, reset}
+"""
+
+# Packed bucket layout. The scripts above store a bucket as a hash of two
+# decimal strings. The *_PACKED variants store the same two numbers as one
+# 16 byte string value (two little-endian doubles, packed with Lua's
+# `struct`), which takes less memory per key, needs no number formatting,
+# and sets the expiry with the write (`SET ... PX`). Each layout reads
+# buckets written in the other one and converts them on write, so a
+# limiter can switch layouts without losing state.
+
+TOKEN_BUCKET_PACKED = """
+-- TOKEN_BUCKET with the bucket packed as struct("<dd", tokens, last_refill)
+-- KEYS and ARGV as TOKEN_BUCKET
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4]) or 1
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+
+local tokens, last_refill
+local packed = redis.pcall("GET", key)
+if type(packed) == "string" then
+    tokens, last_refill = struct.unpack("<dd", packed)
+elseif packed then
+    -- WRONGTYPE: a bucket still stored as a hash. SET below replaces it.
+    local bucket = redis.call("HMGET", key, "tokens", "last_refill")
+    tokens = tonumber(bucket[1])
+    last_refill = tonumber(bucket[2])
+end
+
+if tokens == nil then
+    tokens = capacity
+    last_refill = now
+end
+
+local delta = math.max(0, now - last_refill)
+local refill = 0
+if refill_rate > 0 then
+    refill = delta * refill_rate
+end
+tokens = math.min(capacity, tokens + refill)
+last_refill = now
+
+local allowed = 0
+local retry_after = 0
+
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry_after = math.ceil((cost - tokens) / refill_rate)
+end
+
+local expire_time = math.ceil(capacity / refill_rate)
+if expire_time > 2147483647 then
+    expire_time = 2147483647
+end
+
+redis.call("SET", key, struct.pack("<dd", tokens, last_refill), "PX", expire_time)
+
+local reset = math.ceil((capacity - tokens) / refill_rate)
+return {allowed, retry_after, math.floor(tokens), capacity, reset}
+"""
+
+TOKEN_BUCKET_LEASE_PACKED = """
+-- TOKEN_BUCKET_LEASE on a bucket packed like TOKEN_BUCKET_PACKED
+-- KEYS and ARGV as TOKEN_BUCKET_LEASE
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local refill_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+local requested = tonumber(ARGV[4])
+local returned = tonumber(ARGV[5])
+
+local tokens, last_refill
+local packed = redis.pcall("GET", key)
+if type(packed) == "string" then
+    tokens, last_refill = struct.unpack("<dd", packed)
+elseif packed then
+    -- WRONGTYPE: a bucket still stored as a hash. SET below replaces it.
+    local bucket = redis.call("HMGET", key, "tokens", "last_refill")
+    tokens = tonumber(bucket[1])
+    last_refill = tonumber(bucket[2])
+end
+
+if tokens == nil then
+    tokens = capacity
+    last_refill = now
+end
+
+local delta = math.max(0, now - last_refill)
+local refill = 0
+if refill_rate > 0 then
+    refill = delta * refill_rate
+end
+tokens = math.min(capacity, tokens + refill + returned)
+last_refill = now
+
+local granted = math.min(requested, math.floor(tokens))
+local retry_after = 0
+
+if granted > 0 then
+    tokens = tokens - granted
+else
+    granted = 0
+    if requested > 0 then
+        retry_after = math.ceil((1 - tokens) / refill_rate)
+    end
+end
+
+local expire_time = math.ceil(capacity / refill_rate)
+if expire_time > 2147483647 then
+    expire_time = 2147483647
+end
+
+redis.call("SET", key, struct.pack("<dd", tokens, last_refill), "PX", expire_time)
+
+local reset = math.ceil((capacity - tokens) / refill_rate)
+return {granted, retry_after, math.floor(tokens), capacity, reset}
+"""
+
+LEAKY_BUCKET_PACKED = """
+-- LEAKY_BUCKET with the bucket packed as struct("<dd", level, last_leak)
+-- KEYS and ARGV as LEAKY_BUCKET
+local key = KEYS[1]
+local capacity = tonumber(ARGV[1])
+local leak_rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+
+local level, last_leak
+local packed = redis.pcall("GET", key)
+if type(packed) == "string" then
+    level, last_leak = struct.unpack("<dd", packed)
+elseif packed then
+    -- WRONGTYPE: a bucket still stored as a hash. SET below replaces it.
+    local bucket = redis.call("HMGET", key, "level", "last_leak")
+    level = tonumber(bucket[1])
+    last_leak = tonumber(bucket[2])
+end
+level = level or 0
+last_leak = last_leak or now
+
+local delta = math.max(0, now - last_leak)
+local leaked = delta * leak_rate
+level = math.max(0, level - leaked)
+last_leak = now
+
+local allowed = 0
+local retry_after = 0
+
+if (level + 1) <= capacity then
+    allowed = 1
+    level = level + 1
+else
+    retry_after = math.ceil((level - capacity + 1) / leak_rate)
+    if retry_after < 1 then
+        retry_after = 1
+    end
+end
+
+local expire_time = math.ceil(capacity / leak_rate)
+if expire_time > 2147483647 then
+    expire_time = 2147483647
+end
+
+redis.call("SET", key, struct.pack("<dd", level, last_leak), "PX", expire_time)
+
+-- Time until the bucket has drained
+local reset = 0
+if level > 0 then
+    reset = math.min(math.ceil(level / leak_rate), 2147483647)
+end
+return {allowed, retry_after, math.floor(capacity - level), capacity, reset}
 """
 
 GCRA_LUA = """
@@ -153,13 +505,24 @@ GCRA_LUA = """
 -- ARGV[1] = burst (max tokens, integer)
 -- ARGV[2] = rate (tokens per millisecond, float)
 -- ARGV[3] = period (interval between tokens, in ms, float)
--- ARGV[4] = now (current time in ms, integer)
+-- ARGV[4] = now (current time in ms, integer), or empty to use the Redis
+--           server clock
+-- ARGV[5] = cost of the request in tokens (optional, defaults to 1)
 
 local key = KEYS[1]
 local burst = tonumber(ARGV[1])
 local rate = tonumber(ARGV[2])
 local period = tonumber(ARGV[3])
 local now = tonumber(ARGV[4])
+local cost = tonumber(ARGV[5]) or 1
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
 
 -- Theoretical Arrival Time (TAT)
 local tat = redis.call("GET", key)
@@ -169,33 +532,49 @@ else
     tat = now
 end
 
--- The minimum spacing between requests
-local increment = period
+-- The spacing this request takes up: one period per token
+local increment = period * cost
 
 -- The earliest time this request can be allowed
 local new_tat = math.max(tat, now) + increment
 
 -- Allow if the request would not exceed the burst
+local allowed = 0
+local retry_after = 0
 if new_tat - now <= burst * period then
     -- Allowed: update TAT and set expiry
     redis.call("SET", key, new_tat, "PX", math.ceil(burst * period))
-    return {1, 0}  -- allowed, no retry-after
+    allowed = 1
+    tat = new_tat
 else
     -- Not allowed: calculate retry-after
-    local retry_after = new_tat - (burst * period) - now
-    return {0, retry_after}
+    retry_after = new_tat - (burst * period) - now
+    tat = math.max(tat, now)
 end
+
+-- Tokens left before the burst is used up, and the time until it is
+-- fully restored
+local remaining = math.max(0, math.floor((burst * period - (tat - now)) / period + 1e-9))
+return {allowed, retry_after, remaining, burst, math.ceil(tat - now)}
 """
 
 
 SLIDING_LOG_LUA = """
 -- KEYS[1]: Redis key for the sorted set
--- ARGV[1]: now (ms)
+-- ARGV[1]: now (ms), or empty to use the Redis server clock
 -- ARGV[2]: window (ms)
 -- ARGV[3]: limit
 
 local key = KEYS[1]
 local now = tonumber(ARGV[1])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
 local window = tonumber(ARGV[2])
 local limit = tonumber(ARGV[3])
 local min_time = now - window
@@ -206,16 +585,521 @@ redis.call('ZREMRANGEBYSCORE', key, 0, min_time)
 -- Count current entries
 local count = redis.call('ZCARD', key)
 
+-- The earliest timestamp in the window
+local oldest = now
+if count > 0 then
+    oldest = tonumber(redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')[2])
+end
+-- Time until the oldest request leaves the window
+local reset = math.ceil(window - (now - oldest))
+
 if count < limit then
     -- Add this request
     redis.call('ZADD', key, now, now)
     -- Set expiry to window size
     redis.call('PEXPIRE', key, window)
-    return 1
+    return {1, 0, limit - count - 1, limit, reset}
+else
+    return {0, reset, 0, limit, reset}
+end
+"""
+
+MULTI_LUA = """
+-- Composite limiter: checks every rule first and only records the request
+-- if all of them allow it, so a denied request consumes nothing.
+-- ARGV[1]: now (ms), or empty to use the Redis server clock
+-- ARGV[2..]: three values per rule: kind, param1, param2
+--   fixed_window:   limit, window (ms)
+--   sliding_window: limit, window (ms)
+--   token_bucket:   capacity, refill rate (tokens per ms)
+--   leaky_bucket:   capacity, leak rate (requests per ms)
+--   gcra:           burst, period (ms)
+--   sliding_log:    limit, window (ms)
+-- KEYS: one key per rule, in order; sliding_window takes two keys (the
+--   current and the previous window), or only its base key when the
+--   server clock is used
+-- Returns {allowed, retry_after_ms, remaining, limit, reset_ms}: the longest
+--   wait among denying rules, and the quota of the rule with the least
+--   quota left
+
+
+local now = tonumber(ARGV[1])
+local server_clock = now == nil
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+local max_expire = 2147483647
+local rules = {}
+local denied = false
+local retry_after = 0
+local k = 1
+
+for a = 2, #ARGV, 3 do
+    local rule = {
+        kind = ARGV[a],
+        p1 = tonumber(ARGV[a + 1]),
+        p2 = tonumber(ARGV[a + 2]),
+        key = KEYS[k],
+    }
+    k = k + 1
+    local kind, p1, p2, key = rule.kind, rule.p1, rule.p2, rule.key
+    local blocked = false
+    local wait = 0
+    -- The quota left before this request, and the time until the quota is
+    -- restored if the request is not (reset0) or is (reset1) recorded
+    local left, reset0, reset1
+
+    if kind == "fixed_window" then
+        local current = tonumber(redis.call("GET", key) or "0")
+        local ttl = redis.call("PTTL", key)
+        left = p1 - current
+        if ttl < 0 then
+            reset0, reset1 = 0, p2
+        else
+            reset0, reset1 = ttl, ttl
+        end
+        if current + 1 > p1 then
+            blocked = true
+            wait = reset1
+        end
+    elseif kind == "sliding_window" then
+        if server_clock then
+            -- Derive the window keys from the base key (same hash tag)
+            local curr_window = now - (now % p2)
+            rule.prev = key .. ":" .. (curr_window - p2)
+            key = key .. ":" .. curr_window
+            rule.key = key
+        else
+            rule.prev = KEYS[k]
+            k = k + 1
+        end
+        local curr_count = tonumber(redis.call("GET", key) or "0")
+        local prev_count = tonumber(redis.call("GET", rule.prev) or "0")
+        local elapsed = now % p2
+        left = p1 - (curr_count + prev_count * (1 - elapsed / p2))
+        reset0, reset1 = p2 - elapsed, p2 - elapsed
+        if left < 1 then
+            blocked = true
+            wait = p2 - elapsed
+        end
+    elseif kind == "token_bucket" then
+        local bucket = redis.call("HMGET", key, "tokens", "last_refill")
+        local tokens = tonumber(bucket[1])
+        local last_refill = tonumber(bucket[2])
+        if tokens == nil then
+            tokens = p1
+            last_refill = now
+        end
+        tokens = math.min(p1, tokens + math.max(0, now - last_refill) * p2)
+        left = tokens
+        reset0 = math.ceil((p1 - tokens) / p2)
+        reset1 = math.ceil((p1 - tokens + 1) / p2)
+        if tokens < 1 then
+            blocked = true
+            wait = math.ceil((1 - tokens) / p2)
+        end
+        rule.value = tokens - 1
+    elseif kind == "leaky_bucket" then
+        local bucket = redis.call("HMGET", key, "level", "last_leak")
+        local level = tonumber(bucket[1]) or 0
+        local last_leak = tonumber(bucket[2]) or now
+        level = math.max(0, level - math.max(0, now - last_leak) * p2)
+        left = p1 - level
+        reset0, reset1 = 0, math.min(math.ceil((level + 1) / p2), max_expire)
+        if level > 0 then
+            reset0 = math.min(math.ceil(level / p2), max_expire)
+        end
+        if level + 1 > p1 then
+            blocked = true
+            wait = math.max(1, math.ceil((level - p1 + 1) / p2))
+        end
+        rule.value = level + 1
+    elseif kind == "gcra" then
+        local tat = tonumber(redis.call("GET", key) or now)
+        local new_tat = math.max(tat, now) + p2
+        left = (p1 * p2 - (math.max(tat, now) - now)) / p2 + 1e-9
+        reset0 = math.ceil(math.max(tat, now) - now)
+        reset1 = math.ceil(new_tat - now)
+        if new_tat - now > p1 * p2 then
+            blocked = true
+            wait = new_tat - p1 * p2 - now
+        end
+        rule.value = new_tat
+    elseif kind == "sliding_log" then
+        redis.call("ZREMRANGEBYSCORE", key, 0, now - p2)
+        local count = redis.call("ZCARD", key)
+        left = p1 - count
+        if count > 0 then
+            local oldest = redis.call("ZRANGE", key, 0, 0, "WITHSCORES")[2]
+            reset0 = math.ceil(p2 - (now - tonumber(oldest)))
+            reset1 = reset0
+        else
+            reset0, reset1 = 0, p2
+        end
+        if count >= p1 then
+            blocked = true
+            wait = reset0
+        end
+    else
+        return redis.error_reply("Unknown rule kind: " .. tostring(kind))
+    end
+
+    if blocked then
+        denied = true
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+    rule.left, rule.reset0, rule.reset1 = left, reset0, reset1
+    rules[#rules + 1] = rule
+end
+
+-- Report the rule closest to exhaustion (the later reset on ties)
+local remaining, limit, reset
+for _, rule in ipairs(rules) do
+    local left, rule_reset = rule.left, rule.reset0
+    if not denied then
+        left, rule_reset = left - 1, rule.reset1
+    end
+    left = math.max(0, math.floor(left))
+    if remaining == nil or left < remaining
+            or (left == remaining and rule_reset > reset) then
+        remaining, limit, reset = left, rule.p1, rule_reset
+    end
+end
+
+if denied then
+    return {0, math.ceil(retry_after), remaining, limit, reset}
+end
+
+for _, rule in ipairs(rules) do
+    local kind, p1, p2, key = rule.kind, rule.p1, rule.p2, rule.key
+    if kind == "fixed_window" then
+        if redis.call("INCR", key) == 1 then
+            redis.call("PEXPIRE", key, p2)
+        end
+    elseif kind == "sliding_window" then
+        if redis.call("INCR", key) == 1 then
+            redis.call("PEXPIRE", key, p2 * 2)
+        end
+    elseif kind == "token_bucket" then
+        redis.call("HMSET", key, "tokens", rule.value, "last_refill", now)
+        redis.call("PEXPIRE", key, math.min(math.ceil(p1 / p2), max_expire))
+    elseif kind == "leaky_bucket" then
+        redis.call("HMSET", key, "level", rule.value, "last_leak", now)
+        redis.call("PEXPIRE", key, math.min(math.ceil(p1 / p2), max_expire))
+    elseif kind == "gcra" then
+        redis.call("SET", key, rule.value, "PX", math.ceil(p1 * p2))
+    elseif kind == "sliding_log" then
+        redis.call("ZADD", key, now, now)
+        redis.call("PEXPIRE", key, p2)
+    end
+end
+
+return {1, 0, remaining, limit, reset}
+"""
+
+
+SLIDING_LOG_BUCKETED_LUA = """
+-- KEYS[1]: Redis key for the hash of per-bucket request counts
+-- ARGV[1]: now (ms), or empty to use the Redis server clock
+-- ARGV[2]: window (ms)
+-- ARGV[3]: limit
+-- ARGV[4]: bucket size (ms)
+-- Each field is the start of a bucket (ms) and holds the number of requests
+-- made during it. A bucket counts while any part of it is inside the window.
+
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+if now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+local bucket = tonumber(ARGV[4])
+local min_time = now - window
+
+-- Count the live buckets and remove the ones that left the window
+local fields = redis.call('HGETALL', key)
+local count = 0
+local oldest = nil
+for i = 1, #fields, 2 do
+    local start = tonumber(fields[i])
+    if start + bucket <= min_time then
+        redis.call('HDEL', key, fields[i])
+    else
+        count = count + tonumber(fields[i + 1])
+        if oldest == nil or start < oldest then
+            oldest = start
+        end
+    end
+end
+
+if count < limit then
+    -- Add this request to the current bucket
+    local current = now - (now % bucket)
+    redis.call('HINCRBY', key, current, 1)
+    redis.call('PEXPIRE', key, window + bucket)
+    local reset = math.ceil(math.min(oldest or current, current) + bucket + window - now)
+    return {1, 0, limit - count - 1, limit, reset}
 else
-    -- Get the earliest timestamp in the window
-    local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')[2]
-    local retry_after = window - (now - tonumber(oldest))
-    return math.ceil(retry_after)
+    -- Wait until the oldest bucket leaves the window
+    local reset = math.ceil(oldest + bucket + window - now)
+    return {0, reset, 0, limit, reset}
 end
-"""
\ No newline at end of file
+"""
+
+
+PEEK_LUA = """
+-- Read-only quota inspection: reports the state of one or more rules
+-- without recording a request, so it can run with EVALSHA_RO / FCALL_RO,
+-- including on replicas.
+-- ARGV[1]: now (ms), or empty to use the Redis server clock
+-- ARGV[2..]: four values per rule: kind, param1, param2, param3, with the
+--   kinds and parameters of MULTI_LUA, plus
+--   sliding_log_bucketed: limit, window (ms), bucket size (ms)
+--   (param3 is ignored by the other kinds)
+-- KEYS: one key per rule, in order; sliding_window takes two keys (the
+--   current and the previous window), or only its base key when the
+--   server clock is used
+-- Returns {allowed, retry_after_ms, remaining, limit, reset_ms}: whether a
+--   request would be allowed now and the longest wait among the rules that
+--   would deny it, and the quota left right now of the rule with the least
+--   quota left
+
+local now = tonumber(ARGV[1])
+local server_clock = now == nil
+if now == nil then
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+local max_expire = 2147483647
+local allowed = 1
+local retry_after = 0
+local remaining, limit, reset
+local k = 1
+
+-- The two numbers of a token or leaky bucket, stored as a hash or packed
+-- by the *_PACKED scripts.
+local function bucket_state(key, field1, field2)
+    local packed = redis.pcall("GET", key)
+    if type(packed) == "string" then
+        return struct.unpack("<dd", packed)
+    elseif not packed then
+        return nil, nil
+    end
+    local bucket = redis.call("HMGET", key, field1, field2)
+    return tonumber(bucket[1]), tonumber(bucket[2])
+end
+
+for a = 2, #ARGV, 4 do
+    local kind = ARGV[a]
+    local p1 = tonumber(ARGV[a + 1])
+    local p2 = tonumber(ARGV[a + 2])
+    local p3 = tonumber(ARGV[a + 3])
+    local key = KEYS[k]
+    k = k + 1
+    local blocked = false
+    local wait = 0
+    -- The quota left and the time until it is restored
+    local left, rule_reset
+
+    if kind == "fixed_window" then
+        local current = tonumber(redis.call("GET", key) or "0")
+        local ttl = redis.call("PTTL", key)
+        left = p1 - current
+        rule_reset = math.max(0, ttl)
+        if current + 1 > p1 then
+            blocked = true
+            wait = rule_reset
+        end
+    elseif kind == "sliding_window" then
+        local prev
+        if server_clock then
+            local curr_window = now - (now % p2)
+            prev = key .. ":" .. (curr_window - p2)
+            key = key .. ":" .. curr_window
+        else
+            prev = KEYS[k]
+            k = k + 1
+        end
+        local curr_count = tonumber(redis.call("GET", key) or "0")
+        local prev_count = tonumber(redis.call("GET", prev) or "0")
+        local elapsed = now % p2
+        left = p1 - (curr_count + prev_count * (1 - elapsed / p2))
+        rule_reset = p2 - elapsed
+        if left < 1 then
+            blocked = true
+            wait = rule_reset
+        end
+    elseif kind == "token_bucket" then
+        local tokens, last_refill = bucket_state(key, "tokens", "last_refill")
+        if tokens == nil then
+            tokens = p1
+            last_refill = now
+        end
+        tokens = math.min(p1, tokens + math.max(0, now - last_refill) * p2)
+        left = tokens
+        rule_reset = math.ceil((p1 - tokens) / p2)
+        if tokens < 1 then
+            blocked = true
+            wait = math.ceil((1 - tokens) / p2)
+        end
+    elseif kind == "leaky_bucket" then
+        local level, last_leak = bucket_state(key, "level", "last_leak")
+        level = level or 0
+        last_leak = last_leak or now
+        level = math.max(0, level - math.max(0, now - last_leak) * p2)
+        left = p1 - level
+        rule_reset = 0
+        if level > 0 then
+            rule_reset = math.min(math.ceil(level / p2), max_expire)
+        end
+        if level + 1 > p1 then
+            blocked = true
+            wait = math.max(1, math.ceil((level - p1 + 1) / p2))
+        end
+    elseif kind == "gcra" then
+        local tat = math.max(tonumber(redis.call("GET", key) or now), now)
+        left = (p1 * p2 - (tat - now)) / p2 + 1e-9
+        rule_reset = math.ceil(tat - now)
+        if tat + p2 - now > p1 * p2 then
+            blocked = true
+            wait = tat + p2 - p1 * p2 - now
+        end
+    elseif kind == "sliding_log" then
+        local min_time = "(" .. (now - p2)
+        local count = redis.call("ZCOUNT", key, min_time, "+inf")
+        left = p1 - count
+        rule_reset = 0
+        if count > 0 then
+            local oldest = redis.call(
+                "ZRANGEBYSCORE", key, min_time, "+inf", "WITHSCORES", "LIMIT", 0, 1
+            )[2]
+            rule_reset = math.ceil(p2 - (now - tonumber(oldest)))
+        end
+        if count >= p1 then
+            blocked = true
+            wait = rule_reset
+        end
+    elseif kind == "sliding_log_bucketed" then
+        local fields = redis.call("HGETALL", key)
+        local count = 0
+        local oldest = nil
+        for i = 1, #fields, 2 do
+            local start = tonumber(fields[i])
+            if start + p3 > now - p2 then
+                count = count + tonumber(fields[i + 1])
+                if oldest == nil or start < oldest then
+                    oldest = start
+                end
+            end
+        end
+        left = p1 - count
+        rule_reset = 0
+        if oldest ~= nil then
+            rule_reset = math.ceil(oldest + p3 + p2 - now)
+        end
+        if count >= p1 then
+            blocked = true
+            wait = rule_reset
+        end
+    else
+        return redis.error_reply("Unknown rule kind: " .. tostring(kind))
+    end
+
+    if blocked then
+        allowed = 0
+        if wait > retry_after then
+            retry_after = wait
+        end
+    end
+    -- Report the rule closest to exhaustion (the later reset on ties)
+    left = math.max(0, math.floor(left))
+    if remaining == nil or left < remaining
+            or (left == remaining and rule_reset > reset) then
+        remaining, limit, reset = left, p1, rule_reset
+    end
+end
+
+return {allowed, math.ceil(retry_after), remaining, limit, reset}
+"""
+
+ADAPTIVE_LUA = """
+-- Shared rate factor of an AdaptiveRateLimiter, adjusted by AIMD
+-- KEYS[1] = key of the shared state: a hash of the factor and the times it
+--           was last decreased and increased
+-- ARGV[1] = interval between two changes in the same direction (ms)
+-- ARGV[2] = additive increase
+-- ARGV[3] = multiplicative decrease
+-- ARGV[4] = minimum factor
+-- ARGV[5] = expiry of the state (ms)
+-- ARGV[6] = 1 if the reporting worker is overloaded, 0 if it is healthy, or
+--           empty to only read the factor
+-- ARGV[7] = now (current time in ms), or empty to use the Redis server clock
+-- Returns the factor as a string, since Redis truncates Lua numbers
+
+local key = KEYS[1]
+local interval = tonumber(ARGV[1])
+local increase = tonumber(ARGV[2])
+local decrease = tonumber(ARGV[3])
+local min_factor = tonumber(ARGV[4])
+local expire = tonumber(ARGV[5])
+local signal = tonumber(ARGV[6])
+local now = tonumber(ARGV[7])
+if signal ~= nil and now == nil then
+    -- Server clock mode (see SERVER_TIME in lua.py).
+    if redis.replicate_commands then
+        redis.replicate_commands()
+    end
+    local time = redis.call("TIME")
+    now = time[1] * 1000 + math.floor(time[2] / 1000)
+end
+
+local state = redis.call("HMGET", key, "factor", "decreased", "increased")
+local factor = tonumber(state[1]) or 1
+local decreased = tonumber(state[2]) or 0
+local increased = tonumber(state[3]) or 0
+
+-- Every worker reports once per interval. The first overloaded report of
+-- an interval decreases the factor; the others are absorbed, so the
+-- decrease does not grow with the number of workers. Increases wait for an
+-- interval without any decrease.
+local changed = false
+if signal == 1 then
+    if now - decreased >= interval then
+        factor = math.max(min_factor, factor * decrease)
+        decreased = now
+        changed = true
+    end
+elseif signal == 0 and factor < 1 then
+    if now - decreased >= interval and now - increased >= interval then
+        factor = math.min(1, factor + increase)
+        increased = now
+        changed = true
+    end
+end
+
+if changed then
+    if factor >= 1 then
+        -- The full rate needs no state.
+        redis.call("DEL", key)
+    else
+        redis.call("HMSET", key, "factor", factor, "decreased", decreased,
+            "increased", increased)
+        redis.call("PEXPIRE", key, expire)
+    end
+end
+
+return tostring(factor)
+"""
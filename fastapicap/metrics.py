@@ -0,0 +1,304 @@
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from .backends import Backend
+
+# Latency buckets (seconds) sized for limiter work: tens of microseconds for
+# local decisions up to a second for a struggling Redis.
+DEFAULT_BUCKETS = (
+    0.00005,
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    1.0,
+)
+
+
+class Metrics:
+    """
+    Receiver for limiter instrumentation.
+
+    Enable it with `Cap.init_metrics(metrics)`. Every method is a no-op, so
+    a subclass only overrides what it records. `PrometheusMetrics` and
+    `OpenTelemetryMetrics` are ready-made implementations; neither library
+    is a dependency of Cap, they are imported when instantiated.
+
+    `limiter` is the limiter identity used in its Redis keys (its `name`,
+    or the strategy kind plus a configuration hash), so the number of
+    distinct labels is the number of configured limiters. Durations are in
+    seconds.
+
+    Example:
+        class LogMetrics(Metrics):
+            def observe_decision(self, limiter, decision, seconds):
+                logger.info("%s %s in %.6fs", limiter, decision, seconds)
+
+        Cap.init_metrics(LogMetrics())
+    """
+
+    def observe_decision(self, limiter: str, decision: str, seconds: float) -> None:
+        """
+        Record one limiter call.
+
+        Args:
+            limiter (str): The limiter identity.
+            decision (str): `"allowed"`, `"denied"` (including denials
+                from the deny cache) or `"error"` if the call raised
+                without denying, e.g. because the backend was unreachable.
+            seconds (float): The time spent in the limiter, including the
+                key function, the backend call and `on_limit`.
+        """
+
+    def observe_key_func(self, limiter: str, seconds: float) -> None:
+        """
+        Record the time spent in a limiter's key function.
+        """
+
+    def observe_backend(self, limiter: str, seconds: float) -> None:
+        """
+        Record the duration of one backend script call (the Redis round
+        trip, including time spent waiting for a connection or a batch).
+        """
+
+    def observe_script_load(self, kind: str) -> None:
+        """
+        Record that the Redis backend had to (re)load code.
+
+        Args:
+            kind (str): `"script"` for `SCRIPT LOAD`, `"function"` for
+                `FUNCTION LOAD`, `"eval"` when a call fell back to `EVAL`
+                because the server had lost the script or function.
+        """
+
+
+class PrometheusMetrics(Metrics):
+    """
+    Records limiter metrics with `prometheus_client`.
+
+    Exposes:
+
+    - `<namespace>_decisions_total{limiter, decision}`
+    - `<namespace>_decision_seconds{limiter}`
+    - `<namespace>_key_func_seconds{limiter}`
+    - `<namespace>_backend_seconds{limiter}`
+    - `<namespace>_script_loads_total{kind}`
+
+    Args:
+        registry (Optional[Any]): The `CollectorRegistry` to register with.
+            Defaults to the global registry.
+        namespace (str): The metric name prefix. Defaults to "cap".
+        buckets (Sequence[float]): Histogram buckets in seconds.
+            Defaults to `DEFAULT_BUCKETS`.
+
+    Raises:
+        RuntimeError: If `prometheus_client` is not installed.
+    """
+
+    def __init__(
+        self,
+        registry: Optional[Any] = None,
+        namespace: str = "cap",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        try:
+            from prometheus_client import Counter, Histogram
+        except ImportError:
+            raise RuntimeError(
+                "prometheus_client is not installed. "
+                "Install it with `pip install fastapi-cap[prometheus]`."
+            ) from None
+        options: Dict[str, Any] = {"namespace": namespace}
+        if registry is not None:
+            options["registry"] = registry
+        self.decisions = Counter(
+            "decisions_total", "Rate limit decisions.", ["limiter", "decision"], **options
+        )
+        self.decision_seconds = Histogram(
+            "decision_seconds",
+            "Time spent in a limiter per request.",
+            ["limiter"],
+            buckets=buckets,
+            **options,
+        )
+        self.key_func_seconds = Histogram(
+            "key_func_seconds",
+            "Time spent in limiter key functions.",
+            ["limiter"],
+            buckets=buckets,
+            **options,
+        )
+        self.backend_seconds = Histogram(
+            "backend_seconds",
+            "Duration of limiter script calls.",
+            ["limiter"],
+            buckets=buckets,
+            **options,
+        )
+        self.script_loads = Counter(
+            "script_loads_total", "Scripts and functions (re)loaded.", ["kind"], **options
+        )
+        # Resolving label values takes a lock in prometheus_client; the
+        # children are cached so the hot path only does a dict lookup.
+        self._children: Dict[Tuple[Any, ...], Any] = {}
+
+    def _child(self, metric: Any, *labels: str) -> Any:
+        key = (id(metric), *labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = metric.labels(*labels)
+        return child
+
+    def observe_decision(self, limiter: str, decision: str, seconds: float) -> None:
+        self._child(self.decisions, limiter, decision).inc()
+        self._child(self.decision_seconds, limiter).observe(seconds)
+
+    def observe_key_func(self, limiter: str, seconds: float) -> None:
+        self._child(self.key_func_seconds, limiter).observe(seconds)
+
+    def observe_backend(self, limiter: str, seconds: float) -> None:
+        self._child(self.backend_seconds, limiter).observe(seconds)
+
+    def observe_script_load(self, kind: str) -> None:
+        self._child(self.script_loads, kind).inc()
+
+
+class OpenTelemetryMetrics(Metrics):
+    """
+    Records limiter metrics with the OpenTelemetry metrics API.
+
+    Creates the counters `<prefix>.decisions` and `<prefix>.script_loads`
+    and the histograms `<prefix>.decision.duration`,
+    `<prefix>.key_func.duration` and `<prefix>.backend.duration` (in
+    seconds), with `limiter`, `decision` and `kind` attributes.
+
+    Args:
+        meter (Optional[Any]): The `Meter` to create instruments with.
+            Defaults to `metrics.get_meter("fastapicap")`, which uses the
+            globally configured meter provider.
+        prefix (str): The instrument name prefix. Defaults to "cap".
+
+    Raises:
+        RuntimeError: If `opentelemetry-api` is not installed.
+    """
+
+    def __init__(self, meter: Optional[Any] = None, prefix: str = "cap") -> None:
+        try:
+            from opentelemetry import metrics
+        except ImportError:
+            raise RuntimeError(
+                "opentelemetry-api is not installed. "
+                "Install it with `pip install fastapi-cap[opentelemetry]`."
+            ) from None
+        if meter is None:
+            meter = metrics.get_meter("fastapicap")
+        self.decisions = meter.create_counter(
+            f"{prefix}.decisions", unit="{request}", description="Rate limit decisions."
+        )
+        self.decision_duration = meter.create_histogram(
+            f"{prefix}.decision.duration",
+            unit="s",
+            description="Time spent in a limiter per request.",
+        )
+        self.key_func_duration = meter.create_histogram(
+            f"{prefix}.key_func.duration",
+            unit="s",
+            description="Time spent in limiter key functions.",
+        )
+        self.backend_duration = meter.create_histogram(
+            f"{prefix}.backend.duration",
+            unit="s",
+            description="Duration of limiter script calls.",
+        )
+        self.script_loads = meter.create_counter(
+            f"{prefix}.script_loads", description="Scripts and functions (re)loaded."
+        )
+        self._attributes: Dict[Tuple[str, ...], Dict[str, str]] = {}
+
+    def _attrs(self, *pairs: str) -> Dict[str, str]:
+        attributes = self._attributes.get(pairs)
+        if attributes is None:
+            attributes = self._attributes[pairs] = dict(zip(pairs[::2], pairs[1::2]))
+        return attributes
+
+    def observe_decision(self, limiter: str, decision: str, seconds: float) -> None:
+        self.decisions.add(1, self._attrs("limiter", limiter, "decision", decision))
+        self.decision_duration.record(seconds, self._attrs("limiter", limiter))
+
+    def observe_key_func(self, limiter: str, seconds: float) -> None:
+        self.key_func_duration.record(seconds, self._attrs("limiter", limiter))
+
+    def observe_backend(self, limiter: str, seconds: float) -> None:
+        self.backend_duration.record(seconds, self._attrs("limiter", limiter))
+
+    def observe_script_load(self, kind: str) -> None:
+        self.script_loads.add(1, self._attrs("kind", kind))
+
+
+class _MeteredBackend(Backend):
+    """
+    A limiter's view of the shared backend that times its script calls.
+    """
+
+    def __init__(self, backend: Backend, metrics: Metrics, limiter: str) -> None:
+        self.backend = backend
+        self.metrics = metrics
+        self.limiter = limiter
+
+    @property
+    def server_time(self) -> bool:
+        return self.backend.server_time
+
+    async def run(self, script: str, keys: Sequence[str], args: Sequence[Any]) -> Any:
+        start = time.perf_counter()
+        try:
+            return await self.backend.run(script, keys, args)
+        finally:
+            self.metrics.observe_backend(self.limiter, time.perf_counter() - start)
+
+    async def run_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        start = time.perf_counter()
+        try:
+            return await self.backend.run_many(script, calls)
+        finally:
+            self.metrics.observe_backend(self.limiter, time.perf_counter() - start)
+
+    async def run_readonly(
+        self, script: str, keys: Sequence[str], args: Sequence[Any]
+    ) -> Any:
+        start = time.perf_counter()
+        try:
+            return await self.backend.run_readonly(script, keys, args)
+        finally:
+            self.metrics.observe_backend(self.limiter, time.perf_counter() - start)
+
+    async def run_readonly_many(
+        self, script: str, calls: Sequence[Tuple[Sequence[str], Sequence[Any]]]
+    ) -> List[Any]:
+        start = time.perf_counter()
+        try:
+            return await self.backend.run_readonly_many(script, calls)
+        finally:
+            self.metrics.observe_backend(self.limiter, time.perf_counter() - start)
+
+    @property
+    def supports_scan(self) -> bool:
+        return self.backend.supports_scan
+
+    def scan_keys(self, prefix: str, count: int = 1000) -> AsyncIterator[List[str]]:
+        return self.backend.scan_keys(prefix, count)
+
+    async def unlink(self, keys: Sequence[str]) -> int:
+        return await self.backend.unlink(keys)
+
+    async def close(self) -> None:
+        await self.backend.close()
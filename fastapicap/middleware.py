@@ -0,0 +1,189 @@
+import json
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+from fastapi import Response
+from starlette.exceptions import HTTPException
+from starlette.requests import Request
+from starlette.routing import compile_path
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .base_limiter import BaseLimiter
+
+
+class RateLimitRule:
+    """
+    A rate limit applied by `RateLimitMiddleware` to the requests it matches.
+
+    Paths and hosts use the same template syntax as FastAPI routes, e.g.
+    `/items/{item_id}` or `/files/{path:path}` (any path below `/files/`),
+    and `{tenant}.example.com` for hosts. Templates are compiled once when
+    the rule is created.
+
+    Args:
+        path (str): The path template to match. `/{path:path}` matches every
+            request.
+        limiter (BaseLimiter): The limiter applied to matching requests.
+        methods (Optional[Iterable[str]]): The HTTP methods to match, or
+            `None` for all methods. `GET` also matches `HEAD`, as it does for
+            FastAPI routes. Defaults to None.
+        host (Optional[str]): The host template to match, without the port,
+            or `None` for any host. Defaults to None.
+
+    Attributes:
+        path (str): The path template.
+        limiter (BaseLimiter): The limiter applied to matching requests.
+        methods (Optional[frozenset]): The matched methods, in upper case.
+        host (Optional[str]): The host template.
+    """
+
+    __slots__ = ("path", "limiter", "methods", "host", "_path_regex", "_host_regex")
+
+    def __init__(
+        self,
+        path: str,
+        limiter: BaseLimiter,
+        methods: Optional[Iterable[str]] = None,
+        host: Optional[str] = None,
+    ) -> None:
+        if not path.startswith("/"):
+            raise ValueError("Rule paths must start with '/'.")
+        self.path = path
+        self.limiter = limiter
+        self.methods: Optional[frozenset] = None
+        if methods is not None:
+            upper = {method.upper() for method in methods}
+            if "GET" in upper:
+                upper.add("HEAD")
+            self.methods = frozenset(upper)
+        self.host = host
+        # Static paths are looked up in a dict and need no regex.
+        self._path_regex: Optional[Pattern[str]] = (
+            compile_path(path)[0] if "{" in path else None
+        )
+        self._host_regex: Optional[Pattern[str]] = (
+            compile_path(host)[0] if host is not None else None
+        )
+
+    def _matches(self, method: str, host: str) -> bool:
+        if self.methods is not None and method not in self.methods:
+            return False
+        return self._host_regex is None or self._host_regex.match(host) is not None
+
+
+class RateLimitMiddleware:
+    """
+    Pure ASGI middleware that applies rate limits before routing.
+
+    Limiters used as dependencies run after FastAPI has routed the request,
+    parsed its body and resolved the other dependencies. This middleware
+    checks requests against a rule table first, so an over-limit request is
+    rejected before any of that work, and limits can cover the whole app
+    or groups of routes without decorating each one.
+
+    Every rule whose path, method and host match the request is applied, in
+    the order given; the first limiter that rejects the request ends it.
+    Rules on static paths are found with a dictionary lookup, and only
+    templated rules are matched with their compiled regex.
+
+    Limiters are called exactly as dependencies are, with a `Request` built
+    from the ASGI scope (its body is not read) and a placeholder
+    `Response`. The `RateLimit-*` headers the limiters set on it are added
+    to the app's response. An `HTTPException` raised by `on_limit`, such as
+    the default 429, is sent as a JSON response like FastAPI would send it.
+    Requests that are not HTTP (websockets, lifespan) are passed through.
+
+    Args:
+        app (ASGIApp): The application to wrap.
+        rules (Sequence[RateLimitRule]): The rate limits to apply.
+
+    Example:
+        app.add_middleware(
+            RateLimitMiddleware,
+            rules=[
+                RateLimitRule("/{path:path}", RateLimiter(limit=1000, minutes=1)),
+                RateLimitRule(
+                    "/reports/{report_id}",
+                    GCRARateLimiter(burst=5, tokens_per_minute=10),
+                    methods=["POST"],
+                ),
+            ],
+        )
+    """
+
+    def __init__(self, app: ASGIApp, rules: Sequence[RateLimitRule]) -> None:
+        self.app = app
+        self.rules: List[RateLimitRule] = list(rules)
+        self._static: Dict[str, List[Tuple[int, RateLimitRule]]] = {}
+        self._templated: List[Tuple[int, RateLimitRule]] = []
+        for index, rule in enumerate(self.rules):
+            if rule._path_regex is None:
+                self._static.setdefault(rule.path, []).append((index, rule))
+            else:
+                self._templated.append((index, rule))
+
+    def _match(self, scope: Scope) -> List[RateLimitRule]:
+        path: str = scope["path"]
+        method: str = scope["method"]
+        host = ""
+        for name, value in scope["headers"]:
+            if name == b"host":
+                host = value.decode("latin-1").split(":", 1)[0]
+                break
+        candidates = list(self._static.get(path, ()))
+        templated = [
+            (index, rule)
+            for index, rule in self._templated
+            if rule._path_regex.match(path) is not None
+        ]
+        if templated:
+            candidates.extend(templated)
+            if len(candidates) > len(templated):
+                candidates.sort(key=lambda item: item[0])
+        return [rule for _, rule in candidates if rule._matches(method, host)]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        rules = self._match(scope)
+        if rules:
+            request = Request(scope, receive)
+            response = Response()
+            try:
+                for rule in rules:
+                    await rule.limiter(request, response)
+            except HTTPException as exc:
+                await self._send_error(send, exc)
+                return
+            quota = [
+                (name, value)
+                for name, value in response.raw_headers
+                if name.startswith(b"ratelimit-")
+            ]
+            if quota:
+                send = self._with_headers(send, quota)
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def _with_headers(send: Send, headers: List[Tuple[bytes, bytes]]) -> Send:
+        # Add the limiters' RateLimit-* headers to the app's response.
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", ()), *headers]}
+            await send(message)
+
+        return send_with_headers
+
+    @staticmethod
+    async def _send_error(send: Send, exc: HTTPException) -> None:
+        body = json.dumps({"detail": exc.detail}).encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        for name, value in (exc.headers or {}).items():
+            headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+        await send(
+            {"type": "http.response.start", "status": exc.status_code, "headers": headers}
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,96 @@
+import time
+from typing import Any, Dict, Optional, Type
+
+from redis.asyncio import BlockingConnectionPool, ConnectionPool
+from redis.utils import HIREDIS_AVAILABLE
+
+try:
+    from redis._parsers import _AsyncHiredisParser as HiredisParser
+    from redis._parsers import _AsyncRESP2Parser as PythonParser
+except ImportError:  # redis-py < 5
+    from redis.asyncio.connection import HiredisParser, PythonParser
+
+
+class InstrumentedConnectionPool(BlockingConnectionPool):
+    """
+    A bounded connection pool that records how long callers wait for a connection.
+
+    When all `max_connections` connections are in use, further commands
+    wait up to `timeout` seconds for one to be released instead of opening
+    more connections. The time spent in `get_connection` (waiting plus
+    connecting, if a new connection is needed) is accumulated so that pool
+    pressure can be inspected with `Cap.pool_stats()`.
+
+    Attributes:
+        acquisitions (int): The number of connections handed out.
+        total_wait (float): The accumulated time spent acquiring connections,
+            in seconds.
+        max_wait (float): The longest single acquisition, in seconds.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.acquisitions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    async def get_connection(self, *args: Any, **kwargs: Any):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.acquisitions += 1
+            self.total_wait += elapsed
+            if elapsed > self.max_wait:
+                self.max_wait = elapsed
+
+
+def parser_class(hiredis: Optional[bool]) -> Optional[Type]:
+    """
+    Resolve the response parser for the `hiredis` option of `Cap.init_app`.
+
+    Args:
+        hiredis (Optional[bool]): `True` to require the hiredis parser,
+            `False` to force the pure-Python parser, `None` for redis-py's
+            default (hiredis when installed).
+
+    Returns:
+        Optional[Type]: The parser class, or `None` for the default.
+
+    Raises:
+        RuntimeError: If `hiredis=True` but the `hiredis` package is missing.
+    """
+    if hiredis is None:
+        return None
+    if not hiredis:
+        return PythonParser
+    if not HIREDIS_AVAILABLE:
+        raise RuntimeError(
+            "hiredis is not installed. Install it with `pip install fastapi-cap[hiredis]`."
+        )
+    return HiredisParser
+
+
+def pool_stats(pool: ConnectionPool) -> Dict[str, Any]:
+    """
+    Summarize the utilization of a connection pool.
+
+    Args:
+        pool (ConnectionPool): The pool to inspect.
+
+    Returns:
+        Dict[str, Any]: `max_connections`, the number of connections
+            `in_use` and `idle`, and, for an `InstrumentedConnectionPool`,
+            `acquisitions`, `total_wait` and `max_wait` (in seconds).
+    """
+    stats: Dict[str, Any] = {
+        "max_connections": pool.max_connections,
+        "in_use": len(getattr(pool, "_in_use_connections", ())),
+        "idle": len(getattr(pool, "_available_connections", ())),
+    }
+    if isinstance(pool, InstrumentedConnectionPool):
+        stats["acquisitions"] = pool.acquisitions
+        stats["total_wait"] = pool.total_wait
+        stats["max_wait"] = pool.max_wait
+    return stats
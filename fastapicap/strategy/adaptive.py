@@ -0,0 +1,255 @@
+import contextlib
+import time
+from typing import Iterator, List, Optional, Sequence
+
+from fastapi import Request, Response
+
+from ..backends import BackendUnavailable
+from ..backends.circuit_breaker import DEFAULT_ERRORS
+from ..base_limiter import BaseLimiter, Quota
+from ..lua import ADAPTIVE_LUA, SERVER_TIME
+
+
+class AdaptiveRateLimiter(BaseLimiter):
+    """
+    Scales the rate of another limiter down while the service is overloaded,
+    and back up as it recovers.
+
+    The application reports how its requests went with `record` (or
+    `track`): their latency and whether they failed. Every `interval_seconds`
+    each worker sums up its samples and reports to Redis whether it is
+    overloaded, that is whether its mean latency exceeded
+    `latency_target_ms` or its error rate exceeded `max_error_rate`. The
+    reports adjust one factor shared by all workers, by AIMD (additive
+    increase, multiplicative decrease):
+
+    - An overloaded report multiplies the factor by `decrease`, at most
+      once per interval however many workers report, down to `min_factor`.
+    - After an interval without a decrease, a healthy report adds
+      `increase`, up to 1.
+
+    Each worker then enforces the wrapped limiter's configured rate times
+    the shared factor, so all workers converge on the same limit within one
+    interval. The burst or capacity is not scaled.
+
+    Args:
+        limiter (BaseLimiter): The limiter to adapt. `GCRARateLimiter`,
+            `TokenBucketRateLimiter`, `LeasedTokenBucketRateLimiter` and
+            `LeakyBucketRateLimiter` are supported, as are custom limiters
+            defining `_scale_rate`. The window limiters have no rate to
+            scale. It should not be used on its own as well.
+        latency_target_ms (float): The mean request latency, in
+            milliseconds, above which a worker is overloaded.
+        max_error_rate (float): The fraction of failed requests above which
+            a worker is overloaded. Defaults to 0.05.
+        min_factor (float): The lowest fraction of the rate enforced.
+            Defaults to 0.1.
+        increase (float): The fraction of the rate restored per healthy
+            interval. Defaults to 0.05.
+        decrease (float): The factor applied per overloaded interval.
+            Defaults to 0.5.
+        interval_seconds (float): How often each worker reports and reads
+            the shared factor. Defaults to 1.0.
+
+    Attributes:
+        limiter (BaseLimiter): The adapted limiter.
+        factor (float): The fraction of the configured rate enforced.
+        latency_target_ms (float): The latency target.
+        max_error_rate (float): The error rate target.
+        min_factor (float): The lowest factor.
+        increase (float): The additive increase.
+        decrease (float): The multiplicative decrease.
+        interval_seconds (float): The reporting interval.
+        lua_script (str): The Lua script updating the shared factor.
+
+    Raises:
+        TypeError: If the limiter has no rate to scale.
+        ValueError: If a parameter is out of range.
+
+    Example:
+        api = AdaptiveRateLimiter(
+            GCRARateLimiter(burst=50, tokens_per_second=100, name="api"),
+            latency_target_ms=250,
+        )
+
+        @app.middleware("http")
+        async def report_latency(request, call_next):
+            start = time.perf_counter()
+            response = await call_next(request)
+            if response.status_code != 429:
+                api.record(
+                    time.perf_counter() - start, error=response.status_code >= 500
+                )
+            return response
+
+        @app.get("/search", dependencies=[Depends(api)])
+        async def search(): ...
+    """
+
+    def __init__(
+        self,
+        limiter: BaseLimiter,
+        latency_target_ms: float,
+        max_error_rate: float = 0.05,
+        min_factor: float = 0.1,
+        increase: float = 0.05,
+        decrease: float = 0.5,
+        interval_seconds: float = 1.0,
+    ):
+        if limiter._scale_rate is None:
+            raise TypeError(
+                f"{type(limiter).__name__} does not support adaptive rates."
+            )
+        if latency_target_ms <= 0:
+            raise ValueError("Latency target must be positive.")
+        if not 0 <= max_error_rate <= 1:
+            raise ValueError("Maximum error rate must be between 0 and 1.")
+        if not 0 < min_factor <= 1:
+            raise ValueError("Minimum factor must be in (0, 1].")
+        if increase <= 0:
+            raise ValueError("Increase must be positive.")
+        if not 0 < decrease < 1:
+            raise ValueError("Decrease must be between 0 and 1.")
+        if interval_seconds <= 0:
+            raise ValueError("Interval must be positive.")
+        super().__init__(prefix=limiter.prefix, name=limiter.name)
+        self.limiter = limiter
+        self.factor: float = 1.0
+        self.latency_target_ms = latency_target_ms
+        self.max_error_rate = max_error_rate
+        self.min_factor = min_factor
+        self.increase = increase
+        self.decrease = decrease
+        self.interval_seconds = interval_seconds
+        self.lua_script = ADAPTIVE_LUA
+        # Requests are counted under the adapted limiter's identity.
+        self._instance_id = limiter._instance_id
+        # Outside the adapted limiter's key namespace, so that its admin
+        # calls leave the controller alone.
+        self._state_key = f"{{{limiter.prefix}:adaptive:{limiter._instance_id}}}"
+        interval_ms = interval_seconds * 1000
+        # The state outlives many intervals without reports, then the rate
+        # starts over at full speed.
+        self._args = self._encode_args(
+            interval_ms, increase, decrease, min_factor, int(interval_ms * 100)
+        )
+        self._samples = 0
+        self._errors = 0
+        self._latency = 0.0
+        self._next_update = 0.0
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        """
+        Report how a request went.
+
+        Args:
+            seconds (float): How long the request took.
+            error (bool): Whether the request failed. Defaults to False.
+        """
+        self._samples += 1
+        self._latency += seconds
+        if error:
+            self._errors += 1
+
+    @contextlib.contextmanager
+    def track(self) -> Iterator[None]:
+        """
+        Record the duration of the enclosed block, as an error if it raises.
+
+        Example:
+            with limiter.track():
+                rows = await db.fetch(query)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.record(time.perf_counter() - start, error=True)
+            raise
+        self.record(time.perf_counter() - start)
+
+    async def update(self) -> float:
+        """
+        Report the samples recorded since the last update, and apply the
+        shared factor.
+
+        The limiter does this on its own once per interval. While the backend
+        is unavailable the last factor is kept.
+
+        Returns:
+            float: The factor now enforced.
+        """
+        self._next_update = time.monotonic() + self.interval_seconds
+        samples, errors, latency = self._samples, self._errors, self._latency
+        self._samples = self._errors = 0
+        self._latency = 0.0
+        if samples:
+            overloaded = (
+                latency * 1000 / samples > self.latency_target_ms
+                or errors / samples > self.max_error_rate
+            )
+            signal = b"1" if overloaded else b"0"
+        else:
+            signal = b""
+        backend = self._ensure_backend()
+        if backend.server_time:
+            now = SERVER_TIME
+        else:
+            now = int(time.time() * 1000)
+        try:
+            reply = await backend.run(
+                self.lua_script, (self._state_key,), (*self._args, signal, now)
+            )
+        except (BackendUnavailable, *DEFAULT_ERRORS):
+            return self.factor
+        factor = float(reply)
+        if factor != self.factor:
+            self.factor = factor
+            self.limiter._scale_rate(factor)
+        return factor
+
+    async def __call__(self, request: Request, response: Response):
+        """
+        Check the request against the adapted limiter, at its current rate.
+
+        Args:
+            request (Request): The incoming FastAPI request object.
+            response (Response): The FastAPI response object.
+
+        Raises:
+            HTTPException: As raised by the adapted limiter's `on_limit`.
+        """
+        if time.monotonic() >= self._next_update:
+            await self.update()
+        await self.limiter(request, response)
+
+    # The adapted limiter reports the decision to `Cap.metrics` and applies
+    # the failure policy.
+    __call__._cap_wrapped = True
+
+    # Quotas and keys are the adapted limiter's.
+
+    async def peek(self, key: str) -> Quota:
+        return await self.limiter.peek(key)
+
+    async def peek_many(self, keys: Sequence[str]) -> List[Quota]:
+        return await self.limiter.peek_many(keys)
+
+    async def check_many(
+        self, keys: Sequence[str], costs: Optional[Sequence[float]] = None
+    ) -> List[Quota]:
+        return await self.limiter.check_many(keys, costs)
+
+    async def reset(self, key: str) -> bool:
+        return await self.limiter.reset(key)
+
+    async def reset_all(
+        self, batch_size: int = 1000, pause_seconds: float = 0.0
+    ) -> int:
+        return await self.limiter.reset_all(batch_size, pause_seconds)
+
+    async def count_keys(self, batch_size: int = 1000) -> int:
+        return await self.limiter.count_keys(batch_size)
+
+    def _forget(self, full_key: Optional[str] = None) -> None:
+        self.limiter._forget(full_key)
@@ -1,7 +1,7 @@
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Union
 from fastapi import Request, Response
 
-from ..base_limiter import BaseLimiter
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
 from ..lua import FIXED_WINDOW
 
 
@@ -32,13 +32,18 @@ class RateLimiter(BaseLimiter):
             Defaults to raising HTTP 429.
         prefix (str): Redis key prefix for all limiter keys.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
 
     Attributes:
         limit (int): The maximum requests allowed per window.
         window_ms (int): The calculated window size in milliseconds.
         lua_script (str): The Lua script used for fixed window logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys.
 
     Raises:
         ValueError: If the `limit` is not positive or if the calculated
@@ -55,8 +60,16 @@ class RateLimiter(BaseLimiter):
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
     )-> None:
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         self.limit = limit
         self.window_ms = (
             (seconds * 1000)
@@ -65,7 +78,19 @@ class RateLimiter(BaseLimiter):
             + (days * 24 * 60 * 60 * 1000)
         )
         self.lua_script = FIXED_WINDOW
-        self._instance_id: str = f"fixed_window_limiter_{id(self)}"
+        self._instance_id: str = self._make_instance_id(
+            "fixed_window_limiter", self.limit, self.window_ms
+        )
+        self._args = self._encode_args(self.limit, self.window_ms)
+
+    def _peek_rules(self) -> List[PeekRule]:
+        return [("", "fixed_window", self.limit, self.window_ms, 0)]
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        # The script keys its window by expiry, so it needs no time.
+        return (full_key,), self._args
 
     async def __call__(self, request: Request, response: Response):
         """
@@ -84,14 +109,18 @@ class RateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        full_key = f"{self.prefix}:{self._instance_id}:{key}"
-        result = await redis.evalsha(
-            self.lua_sha, 1, full_key, str(self.limit), str(self.window_ms)
-        )
-        allowed = result == 0
-        retry_after = int(result / 1000) if not allowed else 0
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            result = await backend.run(self.lua_script, (full_key,), self._args)
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            self._cache_denial(full_key, retry_ms)
+        retry_after = int(retry_ms / 1000)
+        await self._reject(request, response, retry_after)
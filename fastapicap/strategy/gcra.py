@@ -1,9 +1,9 @@
 import time
-from typing import Optional, Callable
+from typing import Callable, List, Optional, Union
 from fastapi import Request, Response
 
-from ..base_limiter import BaseLimiter
-from ..lua import GCRA_LUA
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import GCRA_LUA, SERVER_TIME
 
 
 class GCRARateLimiter(BaseLimiter):
@@ -43,17 +43,30 @@ class GCRARateLimiter(BaseLimiter):
             (which raises an `HTTPException 429`) is used.
         prefix (str): A string prefix for all Redis keys used by this limiter.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
+        cost (Union[float, Callable[[Request], float]]): The number of
+            tokens each request takes, or an asynchronous or synchronous
+            function computing it from the request. A request of cost `n`
+            advances the theoretical arrival time by `n` periods. A computed
+            cost may be 0 but not negative, and a computed cost above
+            `burst`, which could never be allowed, raises `ValueError`.
+            Defaults to 1.
 
     Attributes:
         burst (int): The configured burst capacity.
         tokens_per_second (float): The total calculated steady rate in tokens per second.
         period (float): The calculated time period (in milliseconds) between allowed tokens.
         lua_script (str): The Lua script used for GCRA logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys.
 
     Raises:
-        ValueError: If the total calculated `tokens_per_second` is not positive.
+        ValueError: If the total calculated `tokens_per_second` is not positive,
+            or if a static `cost` is not positive or exceeds `burst`.
             This ensures that a meaningful rate limit is defined.
 
     Note:
@@ -73,9 +86,22 @@ class GCRARateLimiter(BaseLimiter):
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
+        cost: Union[float, Callable[[Request], float]] = 1,
     ):
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         self.burst = burst
+        self.cost = cost
+        self._max_cost = burst
+        if not callable(cost) and cost > burst:
+            raise ValueError("Cost must not exceed the burst.")
         total_tokens_per_second = (
             tokens_per_second
             + tokens_per_minute / 60
@@ -91,7 +117,31 @@ class GCRARateLimiter(BaseLimiter):
         self.tokens_per_second = total_tokens_per_second
         self.period = 1000.0 / self.tokens_per_second
         self.lua_script = GCRA_LUA
-        self._instance_id = f"gcra_{id(self)}"
+        self._instance_id = self._make_instance_id(
+            "gcra", self.burst, self.tokens_per_second
+        )
+        self._args = self._encode_args(
+            self.burst,
+            self.tokens_per_second / 1000,  # tokens/ms
+            self.period,
+        )
+
+    def _peek_rules(self) -> List[PeekRule]:
+        return [("", "gcra", self.burst, self.period / self._rate_factor, 0)]
+
+    def _scale_rate(self, factor: float) -> None:
+        self._rate_factor = factor
+        self._args = self._encode_args(
+            self.burst,
+            self.tokens_per_second * factor / 1000,
+            self.period / factor,
+        )
+        self._peek_args = None
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        return (full_key,), (*self._args, now, cost)
 
     async def __call__(self, request: Request, response: Response):
         """
@@ -113,21 +163,27 @@ class GCRARateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        full_key = f"{self.prefix}:{self._instance_id}:{key}"
-        now = int(time.time() * 1000)
-        result = await redis.evalsha(
-            self.lua_sha,
-            1,
-            full_key,
-            str(self.burst),
-            str(self.tokens_per_second / 1000),  # tokens/ms
-            str(self.period),
-            str(now),
-        )
-        allowed = result[0] == 1
-        retry_after = int(result[1]) if not allowed else 0
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            cost = await self._request_cost(request)
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now, cost)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            if self._cost_arg is not None:
+                # With a computed cost, a cheaper request may still pass.
+                self._cache_denial(full_key, retry_ms)
+        retry_after = int(retry_ms)
+        await self._reject(request, response, retry_after)
@@ -1,9 +1,9 @@
 import time
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Union
 from fastapi import Request, Response
 
-from ..base_limiter import BaseLimiter
-from ..lua import LEAKY_BUCKET
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import LEAKY_BUCKET, LEAKY_BUCKET_PACKED, SERVER_TIME
 
 
 class LeakyBucketRateLimiter(BaseLimiter):
@@ -41,18 +41,30 @@ class LeakyBucketRateLimiter(BaseLimiter):
             and should not return a value.
         prefix (str): Redis key prefix for all limiter keys.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
+        state_encoding (str): How buckets are stored in Redis: `"hash"`, a
+            hash of two decimal fields, or `"packed"`, one 16 byte string
+            that takes less memory and script time per key. Either layout
+            reads buckets written in the other one, so an existing limiter
+            can switch without losing state. Defaults to "hash".
 
     Attributes:
         capacity (int): The configured maximum bucket capacity.
         leak_rate (float): The total calculated leak rate in requests per millisecond.
         lua_script (str): The Lua script used for leaky bucket logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys for isolation.
+        state_encoding (str): The configured bucket layout.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys for isolation.
 
     Raises:
-        ValueError: If the `capacity` is not positive, or if the total
-            calculated `leak_rate` is not positive. This ensures a valid
-            configuration for the leaky bucket.
+        ValueError: If the `capacity` is not positive, if the total
+            calculated `leak_rate` is not positive, or if `state_encoding`
+            is unknown. This ensures a valid configuration for the leaky
+            bucket.
     """
     def __init__(
         self,
@@ -64,8 +76,17 @@ class LeakyBucketRateLimiter(BaseLimiter):
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
+        state_encoding: str = "hash",
     ):
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         self.capacity = capacity
         if capacity <= 0:
             raise ValueError("Capacity must be a positive integer.")
@@ -76,8 +97,30 @@ class LeakyBucketRateLimiter(BaseLimiter):
             + leaks_per_day / 86400
         )
         self.leak_rate = total_leaks / 1000
-        self.lua_script = LEAKY_BUCKET
-        self._instance_id = f"leaky_bucket_limiter_{id(self)}"
+        if state_encoding not in ("hash", "packed"):
+            raise ValueError('State encoding must be "hash" or "packed".')
+        self.state_encoding = state_encoding
+        self.lua_script = (
+            LEAKY_BUCKET_PACKED if state_encoding == "packed" else LEAKY_BUCKET
+        )
+        self._instance_id = self._make_instance_id(
+            "leaky_bucket_limiter", self.capacity, self.leak_rate
+        )
+        self._args = self._encode_args(self.capacity, self.leak_rate)
+
+    def _peek_rules(self) -> List[PeekRule]:
+        leak_rate = self.leak_rate * self._rate_factor
+        return [("", "leaky_bucket", self.capacity, leak_rate, 0)]
+
+    def _scale_rate(self, factor: float) -> None:
+        self._rate_factor = factor
+        self._args = self._encode_args(self.capacity, self.leak_rate * factor)
+        self._peek_args = None
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        return (full_key,), (*self._args, now)
 
     async def __call__(self, request: Request, response: Response):
         """
@@ -97,20 +140,24 @@ class LeakyBucketRateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        full_key = f"{self.prefix}:{self._instance_id}:{key}"
-        now = int(time.time() * 1000)
-        result = await redis.evalsha(
-            self.lua_sha,
-            1,
-            full_key,
-            str(self.capacity),
-            str(self.leak_rate),
-            str(now),
-        )
-        allowed = result == 0
-        retry_after = (int(result) + 999) // 1000 if not allowed else 0
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            self._cache_denial(full_key, retry_ms)
+        retry_after = (int(retry_ms) + 999) // 1000
+        await self._reject(request, response, retry_after)
@@ -0,0 +1,323 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+from fastapi import Request, Response
+
+from ..backends import Backend
+from ..lua import SERVER_TIME, TOKEN_BUCKET_LEASE, TOKEN_BUCKET_LEASE_PACKED
+from .token_bucket import TokenBucketRateLimiter
+
+
+class _Lease:
+    # `shared` and `reset_at` are the shared bucket's remaining tokens and
+    # the (monotonic) time it will be full, as of the last backend reply.
+    __slots__ = ("tokens", "expires", "shared", "reset_at")
+
+    def __init__(self, tokens: int, expires: float, shared: int, reset_at: float) -> None:
+        self.tokens = tokens
+        self.expires = expires
+        self.shared = shared
+        self.reset_at = reset_at
+
+
+class LeasedTokenBucketRateLimiter(TokenBucketRateLimiter):
+    """
+    A two-tier Token Bucket that leases blocks of tokens to each worker.
+
+    Instead of running a script for every request, each worker takes a
+    lease of up to `lease_size` tokens from the shared bucket in one call
+    and spends them locally. When a lease runs low it is renewed in the
+    background, so hot keys keep being served from memory; when it expires,
+    its unused tokens are handed back to the shared bucket. This cuts
+    backend traffic for hot keys by roughly a factor of `lease_size`.
+
+    The shared bucket is never overdrawn: every token spent locally was
+    taken from it first. The trade-off is precision. Tokens leased by one
+    worker cannot be used by another until they are returned, and a leased
+    token may be spent up to `lease_seconds` after it was taken. Each worker
+    takes one lease per key at a time: concurrent requests that find no
+    tokens wait for the same call, and a renewal tops up the lease without
+    extending it. A worker therefore holds at most `lease_size + renew_below`
+    tokens per key, which bounds the error; smaller leases are more precise,
+    larger leases save more calls.
+
+    Args:
+        capacity (int): The maximum number of tokens the bucket can hold.
+        tokens_per_second (float): The token refill rate in tokens per second.
+            Defaults to 0.
+        tokens_per_minute (float): The token refill rate in tokens per minute.
+            Defaults to 0.
+        tokens_per_hour (float): The token refill rate in tokens per hour.
+            Defaults to 0.
+        tokens_per_day (float): The token refill rate in tokens per day.
+            Defaults to 0.
+        lease_size (int): The maximum number of tokens taken per lease.
+            Must be positive and not larger than `capacity`. Defaults to 10.
+        lease_seconds (float): How long a lease may be spent before its
+            unused tokens are returned to the shared bucket. Defaults to 1.
+        renew_below (int): A background renewal starts once a lease has this
+            many tokens or fewer left. Defaults to `lease_size // 5`.
+        key_func (Optional[Callable[[Request], str]]): An asynchronous or
+            synchronous function to extract a unique key from the request.
+            Defaults to client IP and path.
+        on_limit (Optional[Callable[[Request, Response, int], None]]): An
+            asynchronous or synchronous function called when the rate limit
+            is exceeded. Defaults to raising HTTP 429.
+        prefix (str): Redis key prefix for all limiter keys.
+            Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Limiters given the same name, including a
+            `TokenBucketRateLimiter` of the same capacity and rate, share
+            their buckets. Defaults to a hash of the bucket configuration,
+            key function and definition site.
+        state_encoding (str): How the shared bucket is stored, `"hash"` or
+            `"packed"` (see `TokenBucketRateLimiter`). Defaults to "hash".
+
+    Attributes:
+        lease_size (int): The maximum number of tokens taken per lease.
+        lease_seconds (float): The lifetime of a lease in seconds.
+        renew_below (int): The remaining-token threshold for renewal.
+        lease_script (str): The Lua script used to take and return leases.
+
+    Raises:
+        ValueError: If the bucket configuration is invalid, if `lease_size`
+            is not between 1 and `capacity`, if `lease_seconds` is not
+            positive, or if `renew_below` is negative.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        tokens_per_second: float = 0,
+        tokens_per_minute: float = 0,
+        tokens_per_hour: float = 0,
+        tokens_per_day: float = 0,
+        lease_size: int = 10,
+        lease_seconds: float = 1.0,
+        renew_below: Optional[int] = None,
+        key_func: Optional[Callable[[Request], str]] = None,
+        on_limit: Optional[Callable[[Request, Response, int], None]] = None,
+        prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
+        state_encoding: str = "hash",
+    ):
+        super().__init__(
+            capacity,
+            tokens_per_second=tokens_per_second,
+            tokens_per_minute=tokens_per_minute,
+            tokens_per_hour=tokens_per_hour,
+            tokens_per_day=tokens_per_day,
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+            state_encoding=state_encoding,
+        )
+        if not 0 < lease_size <= capacity:
+            raise ValueError("Lease size must be between 1 and the capacity.")
+        if lease_seconds <= 0:
+            raise ValueError("Lease duration must be positive.")
+        self.lease_size = lease_size
+        self.lease_seconds = lease_seconds
+        self.renew_below = lease_size // 5 if renew_below is None else renew_below
+        if self.renew_below < 0:
+            raise ValueError("renew_below must not be negative.")
+        self.lease_script = (
+            TOKEN_BUCKET_LEASE_PACKED
+            if state_encoding == "packed"
+            else TOKEN_BUCKET_LEASE
+        )
+        self._leases: Dict[str, _Lease] = {}
+        # The lease being taken for each key, which requests that find no
+        # tokens wait for instead of taking their own.
+        self._pending: Dict[str, "asyncio.Task[List[int]]"] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._next_reap = 0.0
+
+    async def __call__(self, request: Request, response: Response):
+        """
+        Applies the leased Token Bucket logic to the incoming request.
+
+        The request is served from the worker's local lease when possible.
+        Only when no lease is available does it wait for the backend, taking
+        a new lease and returning any unused tokens from an expired one.
+        Concurrent requests for the key wait for the same lease.
+
+        Args:
+            request (Request): The incoming FastAPI request object.
+            response (Response): The FastAPI response object. This can be
+                modified by the `on_limit` handler if needed.
+
+        Raises:
+            HTTPException: By default, if the rate limit is exceeded,
+                `BaseLimiter._default_on_limit` will raise an `HTTPException`
+                with status code 429. Custom `on_limit` functions may raise
+                other exceptions or handle the response differently.
+        """
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        now = time.monotonic()
+        if now >= self._next_reap:
+            self._reap(backend, now)
+        reply: Optional[List[int]] = None
+        while True:
+            lease = self._leases.get(full_key)
+            if lease is not None and lease.expires > now and lease.tokens >= 1:
+                lease.tokens -= 1
+                if lease.tokens <= self.renew_below and full_key not in self._pending:
+                    self._lease(backend, full_key)
+                # The quota as far as this worker knows: its own lease plus
+                # what the shared bucket had at the last call.
+                remaining = lease.tokens + lease.shared
+                reset_ms = max(0, lease.reset_at - now) * 1000
+                self._set_headers(
+                    response, (1, 0, remaining, self.capacity, reset_ms)
+                )
+                return
+            if reply is not None and not reply[0]:
+                self._set_headers(response, reply)
+                retry_ms = reply[1]
+                self._cache_denial(full_key, retry_ms)
+                break
+            retry_ms = self._denied_for(full_key)
+            if retry_ms is not None:
+                break
+            pending = self._pending.get(full_key)
+            if pending is None:
+                returned = 0
+                if lease is not None and lease.expires <= now:
+                    returned = lease.tokens
+                    del self._leases[full_key]
+                pending = self._lease(backend, full_key, returned)
+            # The take goes on if this request is cancelled, since other
+            # requests may be waiting for it.
+            reply = await asyncio.shield(pending)
+            now = time.monotonic()
+        retry_after = int(retry_ms) // 1000
+        await self._reject(request, response, retry_after)
+
+    async def release(self) -> None:
+        """
+        Return the unused tokens of every local lease to the shared bucket.
+
+        Call this on shutdown so that tokens held by this worker become
+        available to the others immediately instead of being lost.
+        """
+        backend = self._ensure_backend()
+        leases, self._leases = self._leases, {}
+        await asyncio.gather(
+            *(
+                self._take(backend, full_key, 0, lease.tokens)
+                for full_key, lease in leases.items()
+                if lease.tokens >= 1
+            )
+        )
+
+    def _forget(self, full_key: Optional[str] = None) -> None:
+        # A lease taken before a reset would keep serving the old quota.
+        super()._forget(full_key)
+        if full_key is None:
+            self._leases.clear()
+            self._pending.clear()
+        else:
+            self._leases.pop(full_key, None)
+            self._pending.pop(full_key, None)
+
+    async def _take(
+        self, backend: Backend, full_key: str, requested: int, returned: int
+    ) -> List[int]:
+        if backend.server_time:
+            now = SERVER_TIME
+        else:
+            now = int(time.time() * 1000)
+        reply = await backend.run(
+            self.lease_script,
+            (full_key,),
+            (*self._args, now, requested, returned),
+        )
+        return [int(value) for value in reply]
+
+    def _lease(
+        self, backend: Backend, full_key: str, returned: int = 0
+    ) -> "asyncio.Task[List[int]]":
+        """
+        Start taking a lease for `full_key`, handing back `returned` tokens.
+
+        Returns:
+            asyncio.Task: The task taking the lease, which resolves to the
+                backend reply once the lease is stored.
+        """
+        task = self._spawn(self._take_lease(backend, full_key, returned))
+        self._pending[full_key] = task
+        return task
+
+    async def _take_lease(
+        self, backend: Backend, full_key: str, returned: int
+    ) -> List[int]:
+        task = asyncio.current_task()
+        try:
+            reply = await self._take(backend, full_key, self.lease_size, returned)
+        finally:
+            current = self._pending.get(full_key) is task
+            if current:
+                del self._pending[full_key]
+        if reply[0]:
+            if current:
+                self._store(backend, full_key, reply[0], reply)
+            else:
+                # The key was reset meanwhile; the lease belongs to the old
+                # quota.
+                self._spawn(self._take(backend, full_key, 0, reply[0]))
+        return reply
+
+    def _store(
+        self, backend: Backend, full_key: str, tokens: int, reply: List[int]
+    ) -> None:
+        now = time.monotonic()
+        reset_at = now + reply[4] / 1000
+        lease = self._leases.get(full_key)
+        if lease is not None and lease.expires > now and lease.tokens >= 1:
+            # A renewal. The lease keeps its expiry, so that no token is
+            # spent more than `lease_seconds` after it was taken.
+            lease.tokens += tokens
+        else:
+            if lease is not None and lease.tokens >= 1:
+                # The lease expired while the new one was being taken.
+                self._spawn(self._take(backend, full_key, 0, lease.tokens))
+            lease = self._leases[full_key] = _Lease(
+                tokens, now + self.lease_seconds, reply[2], reset_at
+            )
+        lease.shared = reply[2]
+        lease.reset_at = reset_at
+
+    def _reap(self, backend: Backend, now: float) -> None:
+        """
+        Drop expired leases and hand their unused tokens back in the background.
+        """
+        self._next_reap = now + self.lease_seconds
+        expired = [k for k, lease in self._leases.items() if lease.expires <= now]
+        for full_key in expired:
+            lease = self._leases.pop(full_key)
+            if lease.tokens >= 1:
+                self._spawn(self._take(backend, full_key, 0, lease.tokens))
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        # A failed renewal or return only costs the tokens involved; the
+        # next request takes a fresh lease synchronously.
+        if not task.cancelled():
+            task.exception()
@@ -0,0 +1,212 @@
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    Union,
+)
+
+from fastapi import Request, Response
+
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import MULTI_LUA, SERVER_TIME
+from .fixed_window import RateLimiter
+from .gcra import GCRARateLimiter
+from .leaky_bucket import LeakyBucketRateLimiter
+from .leased_token_bucket import LeasedTokenBucketRateLimiter
+from .sliding_window import SlidingWindowRateLimiter
+from .sliding_window_log import SlidingWindowLogRateLimiter
+from .token_bucket import TokenBucketRateLimiter
+
+Rule = Tuple[Type[BaseLimiter], Dict[str, Any]]
+
+
+def _rule_spec(limiter: BaseLimiter) -> Tuple[str, float, float]:
+    """
+    Translate a configured limiter into its `MULTI_LUA` kind and parameters.
+
+    Raises:
+        ValueError: If the strategy cannot be part of a composite limiter.
+    """
+    if isinstance(limiter, LeasedTokenBucketRateLimiter):
+        raise ValueError("Leased token buckets cannot be combined with other rules.")
+    if getattr(limiter, "cost", 1) != 1:
+        raise ValueError("Rules of a MultiRateLimiter cannot have a cost.")
+    if getattr(limiter, "state_encoding", "hash") != "hash":
+        raise ValueError("Rules of a MultiRateLimiter store buckets as hashes.")
+    if isinstance(limiter, RateLimiter):
+        return "fixed_window", limiter.limit, limiter.window_ms
+    if isinstance(limiter, SlidingWindowRateLimiter):
+        return "sliding_window", limiter.limit, limiter.window_ms
+    if isinstance(limiter, TokenBucketRateLimiter):
+        return "token_bucket", limiter.capacity, limiter.refill_rate
+    if isinstance(limiter, LeakyBucketRateLimiter):
+        return "leaky_bucket", limiter.capacity, limiter.leak_rate
+    if isinstance(limiter, GCRARateLimiter):
+        return "gcra", limiter.burst, limiter.period
+    if isinstance(limiter, SlidingWindowLogRateLimiter):
+        if limiter.bucket_ms is not None:
+            raise ValueError("Bucketed sliding logs cannot be combined with other rules.")
+        return "sliding_log", limiter.limit, limiter.window_seconds * 1000
+    raise ValueError(
+        f"{type(limiter).__name__} cannot be used as a MultiRateLimiter rule."
+    )
+
+
+class MultiRateLimiter(BaseLimiter):
+    """
+    Enforces several rate limits on the same key in one atomic call.
+
+    Stacking limits such as 10/second, 500/minute and 10k/day as separate
+    dependencies costs one key-function call and one round trip per limit,
+    and a request rejected by one limit still consumes quota from the limits
+    checked before it. This limiter evaluates all of its rules in a single
+    Lua script: every rule is checked first, and the request is recorded
+    against all of them only if every rule allows it. When the request is
+    rejected, `retry_after` is the longest wait among the rules that
+    rejected it, so a client retrying after it will not be rejected by a
+    longer limit.
+
+    Each rule is a `(strategy, params)` pair, where `strategy` is one of the
+    limiter classes (`RateLimiter`, `SlidingWindowRateLimiter`,
+    `TokenBucketRateLimiter`, `LeakyBucketRateLimiter`, `GCRARateLimiter` or
+    `SlidingWindowLogRateLimiter`) and `params` are its constructor
+    arguments. All rule keys share the limiter's hash tag, so the script
+    works on Redis Cluster.
+
+    Args:
+        rules (Sequence[Tuple[Type[BaseLimiter], Dict[str, Any]]]): The limits
+            to enforce, as `(strategy, params)` pairs.
+        key_func (Optional[Callable[[Request], str]]): An asynchronous or
+            synchronous function to extract a unique key from the request.
+            It is called once per request for all rules. Defaults to client
+            IP and path.
+        on_limit (Optional[Callable[[Request, Response, int], None]]): An
+            asynchronous or synchronous function called when any rule is
+            exceeded. Defaults to raising HTTP 429.
+        prefix (str): Redis key prefix for all limiter keys.
+            Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the rules.
+
+    Attributes:
+        rules (List[BaseLimiter]): The configured limiter of each rule.
+        lua_script (str): The Lua script used to evaluate the rules.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys.
+
+    Raises:
+        ValueError: If no rules are given, if a rule's parameters are
+            invalid, if a strategy cannot be combined, or if the same rule
+            is given twice.
+
+    Example:
+        limiter = MultiRateLimiter([
+            (RateLimiter, {"limit": 10, "seconds": 1}),
+            (RateLimiter, {"limit": 500, "minutes": 1}),
+            (RateLimiter, {"limit": 10_000, "days": 1}),
+        ])
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        key_func: Optional[Callable[[Request], str]] = None,
+        on_limit: Optional[Callable[[Request, Response, int], None]] = None,
+        prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
+    ):
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
+        if not rules:
+            raise ValueError("At least one rule is required.")
+        self.rules: List[BaseLimiter] = [
+            strategy(**params) for strategy, params in rules
+        ]
+        rule_ids = [rule._instance_id for rule in self.rules]
+        if len(set(rule_ids)) != len(rule_ids):
+            raise ValueError("Each rule must be unique.")
+        self._specs = [_rule_spec(rule) for rule in self.rules]
+        self._rule_args = self._encode_args(
+            *(value for spec in self._specs for value in spec)
+        )
+        self._rule_ids = rule_ids
+        self.lua_script = MULTI_LUA
+        self._instance_id = self._make_instance_id("multi", *rule_ids)
+
+    def _keys(self, full_key: str, now: Optional[int]) -> List[str]:
+        # With `now=None` (server clock), the script derives the sliding
+        # window keys from each rule's base key itself.
+        keys = []
+        for rule_id, (kind, _, window_ms) in zip(self._rule_ids, self._specs):
+            rule_key = f"{full_key}:{rule_id}"
+            if kind == "sliding_window" and now is not None:
+                curr_window_start = now - (now % window_ms)
+                keys.append(f"{rule_key}:{curr_window_start}")
+                keys.append(f"{rule_key}:{curr_window_start - window_ms}")
+            else:
+                keys.append(rule_key)
+        return keys
+
+    def _peek_rules(self) -> List[PeekRule]:
+        return [
+            (f":{rule_id}", *rule._peek_rules()[0][1:])
+            for rule_id, rule in zip(self._rule_ids, self.rules)
+        ]
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        keys = self._keys(full_key, None if now == SERVER_TIME else now)
+        return keys, (now, *self._rule_args)
+
+    async def __call__(self, request: Request, response: Response):
+        """
+        Checks every rule for the incoming request in one script call.
+
+        Args:
+            request (Request): The incoming FastAPI request object.
+            response (Response): The FastAPI response object. This can be
+                modified by the `on_limit` handler if needed.
+
+        Raises:
+            HTTPException: By default, if any rule is exceeded,
+                `BaseLimiter._default_on_limit` will raise an `HTTPException`
+                with status code 429 and the longest `retry_after` in whole
+                seconds, rounded up. Custom `on_limit` functions may raise
+                other exceptions or handle the response differently.
+        """
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            self._cache_denial(full_key, retry_ms)
+        retry_after = (int(retry_ms) + 999) // 1000
+        await self._reject(request, response, retry_after)
@@ -1,8 +1,8 @@
 import time
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Union
 from fastapi import Request, Response
-from ..base_limiter import BaseLimiter
-from ..lua import SLIDING_WINDOW
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import SERVER_TIME, SLIDING_WINDOW
 
 
 class SlidingWindowRateLimiter(BaseLimiter):
@@ -41,6 +41,11 @@ class SlidingWindowRateLimiter(BaseLimiter):
             and should not return a value.
         prefix (str): Redis key prefix for all limiter keys.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
 
     Attributes:
         limit (int): The maximum requests allowed within the sliding window.
@@ -49,8 +54,8 @@ class SlidingWindowRateLimiter(BaseLimiter):
             The sliding window itself covers a period equivalent to `window_ms`.
         lua_script (str): The Lua script used for the approximated sliding
             window logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys for isolation.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys for isolation.
 
     Raises:
         ValueError: If the `limit` is not positive or if the calculated
@@ -72,8 +77,16 @@ class SlidingWindowRateLimiter(BaseLimiter):
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
     ):
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         self.limit = limit
         if limit <= 0:
             raise ValueError("Limit must be a positive integer.")
@@ -84,7 +97,25 @@ class SlidingWindowRateLimiter(BaseLimiter):
             + (days * 24 * 60 * 60 * 1000)
         )
         self.lua_script = SLIDING_WINDOW
-        self._instance_id = f"sliding_window_limiter_{id(self)}"
+        self._instance_id = self._make_instance_id(
+            "sliding_window_limiter", self.limit, self.window_ms
+        )
+        self._args = self._encode_args(self.window_ms, self.limit)
+
+    def _peek_rules(self) -> List[PeekRule]:
+        return [("", "sliding_window", self.limit, self.window_ms, 0)]
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        if now == SERVER_TIME:
+            # The script derives both window keys from the server clock.
+            return (full_key,), (SERVER_TIME, *self._args)
+        curr_window_start = now - (now % self.window_ms)
+        prev_window_start = curr_window_start - self.window_ms
+        curr_key = f"{full_key}:{curr_window_start}"
+        prev_key = f"{full_key}:{prev_window_start}"
+        return (curr_key, prev_key), (curr_window_start, *self._args)
 
     async def __call__(self, request: Request, response: Response):
         """
@@ -105,24 +136,24 @@ class SlidingWindowRateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        now_ms = int(time.time() * 1000)
-        curr_window_start = now_ms - (now_ms % self.window_ms)
-        prev_window_start = curr_window_start - self.window_ms
-        curr_key = f"{self.prefix}:{self._instance_id}:{key}:{curr_window_start}"
-        prev_key = f"{self.prefix}:{self._instance_id}:{key}:{prev_window_start}"
-        result = await redis.evalsha(
-            self.lua_sha,
-            2,
-            curr_key,
-            prev_key,
-            str(curr_window_start),
-            str(self.window_ms),
-            str(self.limit),
-        )
-        allowed = result == 0
-        retry_after = int(result / 1000) if not allowed else 0
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            self._cache_denial(full_key, retry_ms)
+        retry_after = int(retry_ms / 1000)
+        await self._reject(request, response, retry_after)
@@ -1,9 +1,9 @@
 import time
-from typing import Optional, Callable
+from typing import Optional, Callable, List, Union
 from fastapi import Request, Response
 
-from ..base_limiter import BaseLimiter
-from ..lua import SLIDING_LOG_LUA
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import SERVER_TIME, SLIDING_LOG_BUCKETED_LUA, SLIDING_LOG_LUA
 
 
 class SlidingWindowLogRateLimiter(BaseLimiter):
@@ -18,6 +18,14 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
     is allowed, and its timestamp is added to the set. This method ensures
     precise rate limiting as the window truly "slides" over time.
 
+    Storing every request costs memory proportional to `limit` per client.
+    With `bucket_seconds`, requests are instead counted per sub-bucket of
+    the window in a Redis hash, so each client needs at most
+    `window / bucket` counters regardless of the limit. A bucket counts
+    while any part of it is inside the window, so the limiter may reject
+    slightly early (by up to one bucket), but it never allows more than
+    `limit` requests in any window.
+
     Args:
         limit (int): The maximum number of requests allowed within the defined
             sliding window. Must be a positive integer.
@@ -30,6 +38,10 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
             Defaults to 0.
         window_days (int): The number of days defining the window size.
             Defaults to 0.
+        bucket_seconds (Optional[float]): If set, aggregate request
+            timestamps into buckets of this many seconds (at least one
+            millisecond, at most the window) instead of storing each one.
+            Defaults to None.
         key_func (Optional[Callable[[Request], str]]): An asynchronous or
             synchronous function to extract a unique key from the request.
             Defaults to client IP and path. The function should accept
@@ -41,23 +53,33 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
             and should not return a value.
         prefix (str): Redis key prefix for all limiter keys.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
 
     Attributes:
         limit (int): The maximum requests allowed within the sliding window.
         window_seconds (int): The total calculated window size in seconds.
+        bucket_ms (Optional[int]): The bucket size in milliseconds, or `None`
+            when every request is stored.
         lua_script (str): The Lua script used for the log-based sliding window
             logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys for isolation.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys for isolation.
 
     Raises:
         ValueError: If the `limit` is not positive or if the calculated
-            `window_seconds` is not positive (i.e., all time units are zero).
+            `window_seconds` is not positive (i.e., all time units are zero),
+            or if `bucket_seconds` is shorter than a millisecond or longer
+            than the window.
 
     Note:
         This implementation uses Redis sorted sets (`ZADD`, `ZREMRANGEBYSCORE`, `ZCARD`)
         to store and manage request timestamps, ensuring atomic operations
-        for accurate rate limiting.
+        for accurate rate limiting. The bucketed variant uses a hash of
+        counts (`HINCRBY`, `HDEL`) instead.
     """
     def __init__(
         self,
@@ -66,11 +88,20 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
         window_minutes: int = 0,
         window_hours: int = 0,
         window_days: int = 0,
+        bucket_seconds: Optional[float] = None,
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
     ):
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         self.limit = limit
         if limit <= 0:
             raise ValueError("Limit must be a positive integer.")
@@ -84,8 +115,38 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
             raise ValueError(
                 "Window must be positive (set seconds, minutes, hours, or days)"
             )
-        self.lua_script = SLIDING_LOG_LUA
-        self._instance_id = f"sliding_log_{id(self)}"
+        window_ms = self.window_seconds * 1000
+        if bucket_seconds is None:
+            self.bucket_ms: Optional[int] = None
+            self.lua_script = SLIDING_LOG_LUA
+            self._instance_id = self._make_instance_id(
+                "sliding_log", self.limit, self.window_seconds
+            )
+            self._args = self._encode_args(window_ms, self.limit)
+        else:
+            self.bucket_ms = int(bucket_seconds * 1000)
+            if not 1 <= self.bucket_ms <= window_ms:
+                raise ValueError(
+                    "Bucket size must be between one millisecond and the window."
+                )
+            # A different key layout (hash instead of sorted set), so a
+            # different identity.
+            self.lua_script = SLIDING_LOG_BUCKETED_LUA
+            self._instance_id = self._make_instance_id(
+                "sliding_log_bucketed", self.limit, self.window_seconds, self.bucket_ms
+            )
+            self._args = self._encode_args(window_ms, self.limit, self.bucket_ms)
+
+    def _peek_rules(self) -> List[PeekRule]:
+        window_ms = self.window_seconds * 1000
+        if self.bucket_ms is None:
+            return [("", "sliding_log", self.limit, window_ms, 0)]
+        return [("", "sliding_log_bucketed", self.limit, window_ms, self.bucket_ms)]
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        return (full_key,), (now, *self._args)
 
     async def __call__(self, request: Request, response: Response):
         """
@@ -106,21 +167,24 @@ class SlidingWindowLogRateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        full_key = f"{self.prefix}:{self._instance_id}:{key}"
-        now = int(time.time() * 1000)
-        window_ms = self.window_seconds * 1000
-        result = await redis.evalsha(
-            self.lua_sha,
-            1,
-            full_key,
-            str(now),
-            str(window_ms),
-            str(self.limit),
-        )
-        allowed = result == 1
-        retry_after = 0 if allowed else int(result)
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            self._cache_denial(full_key, retry_ms)
+        retry_after = int(retry_ms)
+        await self._reject(request, response, retry_after)
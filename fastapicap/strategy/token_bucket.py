@@ -1,9 +1,9 @@
 import time
-from typing import Optional, Callable
+from typing import Callable, List, Optional, Union
 from fastapi import Request, Response
 
-from ..base_limiter import BaseLimiter
-from ..lua import TOKEN_BUCKET
+from ..base_limiter import BaseLimiter, PeekRule, ScriptCall
+from ..lua import SERVER_TIME, TOKEN_BUCKET, TOKEN_BUCKET_PACKED
 
 
 class TokenBucketRateLimiter(BaseLimiter):
@@ -11,7 +11,8 @@ class TokenBucketRateLimiter(BaseLimiter):
     Implements the Token Bucket rate limiting algorithm.
 
     The Token Bucket algorithm works like a bucket that tokens are continuously
-    added to at a fixed `refill_rate`. Each request consumes one token.
+    added to at a fixed `refill_rate`. Each request consumes one token, or
+    its `cost` in tokens.
     If a request arrives and there are tokens available in the bucket,
     the request is processed, and a token is removed. If the bucket is empty,
     the request is denied (or queued). The `capacity` defines the maximum
@@ -44,19 +45,48 @@ class TokenBucketRateLimiter(BaseLimiter):
             and should not return a value.
         prefix (str): Redis key prefix for all limiter keys.
             Defaults to "cap".
+        deny_cache (bool): If `True`, denied keys are rejected locally until
+            their retry time without contacting the backend. Defaults to False.
+        name (Optional[str]): A stable name used as the limiter's Redis key
+            namespace. Defaults to a hash of the limit configuration, so
+            every worker process shares the same keys.
+        cost (Union[float, Callable[[Request], float]]): The number of
+            tokens each request consumes, or an asynchronous or synchronous
+            function computing it from the request. A computed cost may be
+            0 (free) but not negative, and a computed cost above `capacity`
+            raises `ValueError`, since no bucket could ever allow it. The
+            cost does not change the limiter
+            identity, so endpoints with different costs configured with the
+            same bucket share one budget. Defaults to 1.
+        state_encoding (str): How buckets are stored in Redis: `"hash"`, a
+            hash of two decimal fields, or `"packed"`, one 16 byte string
+            that takes less memory and script time per key. Either layout
+            reads buckets written in the other one, so an existing limiter
+            can switch without losing state. Defaults to "hash".
 
     Attributes:
         capacity (int): The configured maximum bucket capacity.
         refill_rate (float): The total calculated token refill rate in
             tokens per millisecond.
         lua_script (str): The Lua script used for token bucket logic in Redis.
-        _instance_id (str): A unique identifier for this limiter instance, used
-            to create distinct Redis keys for isolation.
+        state_encoding (str): The configured bucket layout.
+        _instance_id (str): The stable identity of this limiter, used
+            to namespace its Redis keys for isolation.
 
     Raises:
-        ValueError: If the `capacity` is not positive, or if the total
-            calculated `refill_rate` is not positive. This ensures a valid
-            configuration for the token bucket.
+        ValueError: If the `capacity` is not positive, if the total
+            calculated `refill_rate` is not positive, or if a static `cost`
+            is not positive or exceeds `capacity`, or if `state_encoding`
+            is unknown. This ensures a valid configuration for the token
+            bucket.
+
+    Example:
+        async def completion_tokens(request: Request) -> int:
+            return int(request.headers.get("x-max-tokens", "1000"))
+
+        limiter = TokenBucketRateLimiter(
+            capacity=100_000, tokens_per_minute=100_000, cost=completion_tokens
+        )
     """
     def __init__(
         self,
@@ -68,12 +98,26 @@ class TokenBucketRateLimiter(BaseLimiter):
         key_func: Optional[Callable[[Request], str]] = None,
         on_limit: Optional[Callable[[Request, Response, int], None]] = None,
         prefix: str = "cap",
+        deny_cache: bool = False,
+        name: Optional[str] = None,
+        cost: Union[float, Callable[[Request], float]] = 1,
+        state_encoding: str = "hash",
     ):
-        super().__init__(key_func=key_func, on_limit=on_limit, prefix=prefix)
+        super().__init__(
+            key_func=key_func,
+            on_limit=on_limit,
+            prefix=prefix,
+            deny_cache=deny_cache,
+            name=name,
+        )
         if capacity <= 0:
             raise ValueError("Capacity must be a positive integer.")
 
         self.capacity = capacity
+        self.cost = cost
+        self._max_cost = capacity
+        if not callable(cost) and cost > capacity:
+            raise ValueError("Cost must not exceed the capacity.")
         total_tokens = (
             tokens_per_second
             + tokens_per_minute / 60
@@ -81,8 +125,18 @@ class TokenBucketRateLimiter(BaseLimiter):
             + tokens_per_day / 86400
         )
         self.refill_rate = total_tokens / 1000
-        self.lua_script = TOKEN_BUCKET
-        self._instance_id = f"token_bucket_limiter_{id(self)}"
+        if state_encoding not in ("hash", "packed"):
+            raise ValueError('State encoding must be "hash" or "packed".')
+        # The layout does not change the identity: both read each other's
+        # buckets, so switching keeps the state.
+        self.state_encoding = state_encoding
+        self.lua_script = (
+            TOKEN_BUCKET_PACKED if state_encoding == "packed" else TOKEN_BUCKET
+        )
+        self._instance_id = self._make_instance_id(
+            "token_bucket_limiter", self.capacity, self.refill_rate
+        )
+        self._args = self._encode_args(self.capacity, self.refill_rate)
 
         if self.refill_rate <= 0:
             raise ValueError(
@@ -90,6 +144,20 @@ class TokenBucketRateLimiter(BaseLimiter):
                 "Check your tokens_per_second/minute/hour/day arguments."
             )
 
+    def _peek_rules(self) -> List[PeekRule]:
+        refill_rate = self.refill_rate * self._rate_factor
+        return [("", "token_bucket", self.capacity, refill_rate, 0)]
+
+    def _scale_rate(self, factor: float) -> None:
+        self._rate_factor = factor
+        self._args = self._encode_args(self.capacity, self.refill_rate * factor)
+        self._peek_args = None
+
+    def _script_call(
+        self, full_key: str, now: Union[int, bytes], cost: bytes = b"1"
+    ) -> ScriptCall:
+        return (full_key,), (*self._args, now, cost)
+
     async def __call__(self, request: Request, response: Response):
         """
         Applies the Token Bucket rate limiting logic to the incoming request.
@@ -108,20 +176,27 @@ class TokenBucketRateLimiter(BaseLimiter):
                 with status code 429. Custom `on_limit` functions may raise
                 other exceptions or handle the response differently.
         """
-        redis = self._ensure_redis()
-        await self._ensure_lua_sha(self.lua_script)
-        key: str = await self._safe_call(self.key_func, request)
-        full_key = f"{self.prefix}:{self._instance_id}:{key}"
-        now = int(time.time() * 1000)
-        result = await redis.evalsha(
-            self.lua_sha,
-            1,
-            full_key,
-            str(self.capacity),
-            str(self.refill_rate),
-            str(now),
-        )
-        allowed = result == 0
-        retry_after = int(result) // 1000 if not allowed else 0
-        if not allowed:
-            await self._safe_call(self.on_limit, request, response, retry_after)
+        backend = self._ensure_backend()
+        key: str = self.key_func(request)
+        if self._key_func_is_async:
+            key = await key
+        full_key = self._full_key(key)
+        retry_ms = self._denied_for(full_key)
+        if retry_ms is None:
+            cost = await self._request_cost(request)
+            if backend.server_time:
+                now = SERVER_TIME
+            else:
+                now = int(time.time() * 1000)
+            result = await backend.run(
+                self.lua_script, *self._script_call(full_key, now, cost)
+            )
+            self._set_headers(response, result)
+            if result[0] == 1:
+                return
+            retry_ms = result[1]
+            if self._cost_arg is not None:
+                # With a computed cost, a cheaper request may still pass.
+                self._cache_denial(full_key, retry_ms)
+        retry_after = int(retry_ms) // 1000
+        await self._reject(request, response, retry_after)
@@ -0,0 +1,189 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI, Request
+from httpx import ASGITransport
+
+from fastapicap import (
+    GCRARateLimiter,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    keys,
+)
+
+
+def client_key(request: Request) -> str:
+    return request.headers.get("x-client", "anonymous")
+
+
+def make_client(app):
+    return httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def app(calls):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        calls.append(item_id)
+        return {"item_id": item_id}
+
+    @app.post("/items/{item_id}")
+    async def update_item(item_id: int, body: dict):
+        calls.append(item_id)
+        return body
+
+    @app.get("/health")
+    async def health():
+        return {"ok": True}
+
+    return app
+
+
+@pytest.mark.asyncio
+async def test_rejects_before_routing(app, calls):
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(
+                "/items/{item_id}", RateLimiter(limit=2, seconds=5, key_func=client_key)
+            )
+        ],
+    )
+    async with make_client(app) as client:
+        assert (await client.get("/items/1")).status_code == 200
+        assert (await client.get("/items/2")).status_code == 200
+        r = await client.get("/items/3")
+        assert r.status_code == 429
+        assert r.json() == {"detail": "Rate limit exceeded. Please try again later."}
+        assert "retry-after" in r.headers
+        # Unmatched paths are not limited.
+        assert (await client.get("/health")).status_code == 200
+    assert calls == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_rejected_body_is_not_read(app, calls):
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(
+                "/items/{item_id}",
+                RateLimiter(limit=1, seconds=5, key_func=client_key),
+                methods=["post"],
+            )
+        ],
+    )
+    async with make_client(app) as client:
+        assert (await client.post("/items/1", json={"a": 1})).status_code == 200
+        # Invalid JSON would be a 422 if the request reached FastAPI.
+        r = await client.post("/items/1", content=b"{not json")
+        assert r.status_code == 429
+        # Other methods are not limited by the rule.
+        assert (await client.get("/items/1")).status_code == 200
+    assert calls == [1, 1]
+
+
+@pytest.mark.asyncio
+async def test_all_matching_rules_apply(app):
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(
+                "/{path:path}", RateLimiter(limit=3, seconds=5, key_func=client_key)
+            ),
+            RateLimitRule(
+                "/health",
+                GCRARateLimiter(burst=1, tokens_per_minute=1, key_func=client_key),
+            ),
+        ],
+    )
+    async with make_client(app) as client:
+        assert (await client.get("/health")).status_code == 200
+        assert (await client.get("/health")).status_code == 429
+        assert (await client.get("/items/1")).status_code == 200
+        # The app-wide limit counted all three requests.
+        assert (await client.get("/items/1")).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_host_rules(app):
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(
+                "/health",
+                RateLimiter(limit=1, seconds=5, key_func=client_key),
+                host="{tenant}.example.com",
+            )
+        ],
+    )
+    async with make_client(app) as client:
+        headers = {"host": "acme.example.com:8000"}
+        assert (await client.get("/health", headers=headers)).status_code == 200
+        assert (await client.get("/health", headers=headers)).status_code == 429
+        assert (await client.get("/health")).status_code == 200
+        assert (await client.get("/health")).status_code == 200
+
+
+def test_rule_paths_must_be_absolute():
+    with pytest.raises(ValueError):
+        RateLimitRule("items", RateLimiter(limit=1, seconds=1))
+
+
+@pytest.mark.asyncio
+async def test_key_func_is_shared_with_dependencies():
+    resolved = []
+
+    async def user_key(request: Request) -> str:
+        resolved.append(request.url.path)
+        return request.headers.get("x-client", "anonymous")
+
+    per_minute = RateLimiter(limit=10, minutes=1, key_func=user_key)
+    burst = GCRARateLimiter(burst=5, tokens_per_minute=10, key_func=user_key)
+    app = FastAPI()
+
+    @app.get("/items", dependencies=[Depends(per_minute), Depends(burst)])
+    async def items():
+        return []
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule("/items", RateLimiter(limit=10, seconds=5, key_func=user_key))
+        ],
+    )
+    async with make_client(app) as client:
+        assert (await client.get("/items")).status_code == 200
+        assert (await client.get("/items")).status_code == 200
+    assert resolved == ["/items", "/items"]
+
+
+@pytest.mark.asyncio
+async def test_route_keys_are_not_shared_with_dependencies():
+    # The middleware runs before routing, so its key is the path; the
+    # dependency's key must still be the route template.
+    per_route = RateLimiter(limit=1, minutes=1, key_func=keys.route)
+    app = FastAPI()
+
+    @app.get("/users/{uid}", dependencies=[Depends(per_route)])
+    async def get_user(uid: int):
+        return {"uid": uid}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[
+            RateLimitRule(
+                "/users/{uid}", RateLimiter(limit=10, seconds=5, key_func=keys.route)
+            )
+        ],
+    )
+    async with make_client(app) as client:
+        assert (await client.get("/users/1")).status_code == 200
+        assert (await client.get("/users/2")).status_code == 429
@@ -0,0 +1,101 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport
+
+from fastapicap import (
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    RateLimiter,
+    RateLimitMiddleware,
+    RateLimitRule,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+
+
+def make_client(app):
+    return httpx.AsyncClient(transport=ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "limiter",
+    [
+        RateLimiter(limit=2, seconds=30),
+        SlidingWindowRateLimiter(limit=2, seconds=30),
+        TokenBucketRateLimiter(capacity=2, tokens_per_minute=2),
+        LeakyBucketRateLimiter(capacity=2, leaks_per_minute=2),
+        GCRARateLimiter(burst=2, tokens_per_minute=2),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=30),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=30, bucket_seconds=1),
+        MultiRateLimiter(
+            [
+                (RateLimiter, {"limit": 5, "seconds": 30}),
+                (TokenBucketRateLimiter, {"capacity": 2, "tokens_per_minute": 2}),
+            ]
+        ),
+    ],
+)
+async def test_headers_report_quota(limiter):
+    app = FastAPI()
+
+    @app.get("/ping", dependencies=[Depends(limiter)])
+    async def ping():
+        return {"message": "pong"}
+
+    async with make_client(app) as client:
+        r1 = await client.get("/ping")
+        r2 = await client.get("/ping")
+        r3 = await client.get("/ping")
+
+    assert r1.headers["ratelimit-limit"] == "2"
+    assert r1.headers["ratelimit-remaining"] == "1"
+    assert 0 < int(r1.headers["ratelimit-reset"]) <= 60
+    assert r2.headers["ratelimit-remaining"] == "0"
+    # The default 429 carries the quota headers next to Retry-After.
+    assert r3.status_code == 429
+    assert r3.headers["ratelimit-limit"] == "2"
+    assert r3.headers["ratelimit-remaining"] == "0"
+    assert "retry-after" in r3.headers
+
+
+@pytest.mark.asyncio
+async def test_leased_bucket_headers_count_the_shared_bucket():
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, lease_size=4
+    )
+    app = FastAPI()
+
+    @app.get("/ping", dependencies=[Depends(limiter)])
+    async def ping():
+        return {"message": "pong"}
+
+    async with make_client(app) as client:
+        r1 = await client.get("/ping")  # Takes a lease of 4
+        r2 = await client.get("/ping")  # Served from the lease
+    assert r1.headers["ratelimit-limit"] == "10"
+    assert r1.headers["ratelimit-remaining"] == "9"
+    assert r2.headers["ratelimit-remaining"] == "8"
+
+
+@pytest.mark.asyncio
+async def test_middleware_adds_headers():
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"message": "pong"}
+
+    app.add_middleware(
+        RateLimitMiddleware,
+        rules=[RateLimitRule("/ping", RateLimiter(limit=3, seconds=30))],
+    )
+    async with make_client(app) as client:
+        r = await client.get("/ping")
+    assert r.status_code == 200
+    assert r.headers["ratelimit-limit"] == "3"
+    assert r.headers["ratelimit-remaining"] == "2"
@@ -0,0 +1,178 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException, Response
+
+from fastapicap import (
+    AdaptiveRateLimiter,
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap.backends import Backend, MemoryBackend, RedisBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class FailingBackend(Backend):
+    async def run(self, script, keys, args):
+        raise ConnectionError("backend down")
+
+
+@pytest.fixture(params=["redis", "memory", "server_time"])
+def backend(request, redis_ready):
+    if request.param == "memory":
+        Cap.init_backend(MemoryBackend())
+    elif request.param == "server_time":
+        Cap.init_backend(RedisBackend(Cap.redis, server_time=True))
+    return request.param
+
+
+async def adaptive(limiter=None, **kwargs):
+    if limiter is None:
+        limiter = GCRARateLimiter(burst=2, tokens_per_second=10, name="api")
+    kwargs.setdefault("latency_target_ms", 100)
+    kwargs.setdefault("interval_seconds", 0.05)
+    limiter = AdaptiveRateLimiter(limiter, **kwargs)
+    # Load the scripts, so that loading them does not take up an interval.
+    await limiter.update()
+    return limiter
+
+
+@pytest.mark.asyncio
+async def test_decreases_when_overloaded_and_recovers(backend):
+    limiter = await adaptive(increase=0.25)
+    limiter.record(0.5)
+    assert await limiter.update() == 0.5
+    assert limiter.limiter._args == (b"2", b"0.005", b"200.0")
+    # The second overloaded report of the interval is absorbed.
+    limiter.record(0.5)
+    assert await limiter.update() == 0.5
+
+    await asyncio.sleep(0.06)
+    limiter.record(0.01)
+    assert await limiter.update() == 0.75
+    limiter.record(0.01)
+    assert await limiter.update() == 0.75
+    await asyncio.sleep(0.06)
+    assert await limiter.update() == 0.75  # No samples, no change.
+    limiter.record(0.01)
+    assert await limiter.update() == 1
+    assert limiter.limiter._args == (b"2", b"0.01", b"100.0")
+
+
+@pytest.mark.asyncio
+async def test_errors_count_as_overload(backend):
+    limiter = await adaptive(max_error_rate=0.1)
+    for _ in range(9):
+        limiter.record(0.01)
+    limiter.record(0.01, error=True)
+    assert await limiter.update() == 1
+    await asyncio.sleep(0.06)
+    with pytest.raises(RuntimeError):
+        with limiter.track():
+            raise RuntimeError("query failed")
+    assert await limiter.update() == 0.5
+
+
+@pytest.mark.asyncio
+async def test_workers_share_the_factor(backend):
+    worker = await adaptive(min_factor=0.2)
+    other = await adaptive(min_factor=0.2)
+    worker.record(1)
+    other.record(1)
+    assert await worker.update() == 0.5
+    assert await other.update() == 0.5
+    for _ in range(3):
+        await asyncio.sleep(0.06)
+        worker.record(1)
+        await worker.update()
+    assert await other.update() == 0.2
+
+
+@pytest.mark.asyncio
+async def test_scaled_rate_is_enforced(backend):
+    gcra = GCRARateLimiter(burst=1, tokens_per_second=10, name="api")
+    limiter = await adaptive(gcra)
+    await limiter(DummyRequest(), Response())
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(), Response())
+    await asyncio.sleep(0.11)
+    await limiter(DummyRequest(), Response())
+
+    limiter.record(1)
+    await asyncio.sleep(0.06)
+    await limiter(DummyRequest(ip="5.6.7.8"), Response())
+    assert limiter.factor == 0.5
+    await asyncio.sleep(0.11)
+    # At half the rate, a token takes 200 ms.
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(ip="5.6.7.8"), Response())
+    quota = await limiter.peek("5.6.7.8:/test")
+    assert 0 < quota.retry_after_ms <= 100
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "limiter",
+    [
+        TokenBucketRateLimiter(capacity=2, tokens_per_second=10),
+        LeakyBucketRateLimiter(capacity=2, leaks_per_second=10),
+    ],
+)
+async def test_bucket_rates_are_scaled(backend, limiter):
+    limiter._scale_rate(1)
+    base = limiter._args
+    limiter = await adaptive(limiter)
+    limiter.record(1)
+    await limiter.update()
+    assert limiter.limiter._args == (base[0], b"0.005")
+    assert (await limiter.peek("client")).remaining == 2
+
+
+@pytest.mark.asyncio
+async def test_admin_calls_use_the_adapted_limiter(backend):
+    limiter = await adaptive()
+    await limiter(DummyRequest(), Response())
+    assert await limiter.count_keys() == 1
+    assert (await limiter.peek("1.2.3.4:/test")).remaining == 1
+    assert [q.allowed for q in await limiter.check_many(["a", "a", "a"])] == [
+        True,
+        True,
+        False,
+    ]
+    assert await limiter.reset("a")
+    assert await limiter.reset_all() == 1
+
+
+@pytest.mark.asyncio
+async def test_keeps_the_factor_while_the_backend_is_down(redis_ready):
+    limiter = await adaptive()
+    limiter.record(1)
+    assert await limiter.update() == 0.5
+    Cap.init_backend(FailingBackend())
+    limiter.record(0.01)
+    assert await limiter.update() == 0.5
+
+
+@pytest.mark.asyncio
+async def test_invalid_arguments(redis_ready):
+    with pytest.raises(TypeError):
+        AdaptiveRateLimiter(RateLimiter(limit=1, seconds=1), latency_target_ms=100)
+    for kwargs in (
+        {"latency_target_ms": 0},
+        {"max_error_rate": 1.5},
+        {"min_factor": 0},
+        {"increase": 0},
+        {"decrease": 1},
+        {"interval_seconds": 0},
+    ):
+        with pytest.raises(ValueError):
+            await adaptive(**kwargs)
@@ -0,0 +1,188 @@
+import pytest
+from fastapi import HTTPException, Response
+
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap.backends import Backend, CircuitBreakerBackend, MemoryBackend
+from fastapicap.base_limiter import BaseLimiter
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+LIMITERS = [
+    RateLimiter(limit=1, seconds=30),
+    SlidingWindowRateLimiter(limit=1, seconds=30),
+    TokenBucketRateLimiter(capacity=1, tokens_per_minute=1),
+    LeakyBucketRateLimiter(capacity=1, leaks_per_minute=1),
+    GCRARateLimiter(burst=1, tokens_per_minute=1),
+    SlidingWindowLogRateLimiter(limit=1, window_seconds=30),
+    SlidingWindowLogRateLimiter(limit=1, window_seconds=30, bucket_seconds=1),
+    MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 5, "seconds": 30}),
+            (SlidingWindowRateLimiter, {"limit": 1, "seconds": 30}),
+        ]
+    ),
+]
+
+
+@pytest.fixture(params=["redis", "memory"])
+def backend(request, redis_ready):
+    if request.param == "memory":
+        Cap.init_backend(MemoryBackend())
+    return request.param
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limiter", LIMITERS)
+async def test_reset(backend, limiter):
+    limiter.deny_cache = True
+    # The limiters are shared by the backend parameters.
+    limiter._forget()
+    await limiter(DummyRequest(), Response())
+    await limiter(DummyRequest(ip="5.6.7.8"), Response())
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(), Response())
+
+    assert await limiter.reset("1.2.3.4:/test")
+    assert not await limiter.reset("1.2.3.4:/test")
+    await limiter(DummyRequest(), Response())
+    # Other clients keep their state.
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(ip="5.6.7.8"), Response())
+
+
+@pytest.mark.asyncio
+async def test_reset_all_and_count_keys(backend):
+    limiter = RateLimiter(limit=1, seconds=30)
+    other = RateLimiter(limit=1, seconds=30, name="other")
+    for n in range(25):
+        await limiter(DummyRequest(ip=f"10.0.0.{n}"), Response())
+    await other(DummyRequest(), Response())
+    assert await limiter.count_keys(batch_size=7) == 25
+
+    assert await limiter.reset_all(batch_size=7) == 25
+    assert await limiter.count_keys() == 0
+    assert await limiter.reset_all() == 0
+    await limiter(DummyRequest(ip="10.0.0.1"), Response())
+    with pytest.raises(HTTPException):
+        await other(DummyRequest(), Response())
+
+
+@pytest.mark.asyncio
+async def test_count_keys_counts_storage_keys(backend):
+    limiter = MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 5, "seconds": 30}),
+            (GCRARateLimiter, {"burst": 5, "tokens_per_minute": 5}),
+        ]
+    )
+    await limiter(DummyRequest(), Response())
+    assert await limiter.count_keys() == 2
+
+
+@pytest.mark.asyncio
+async def test_glob_characters_are_matched_literally(backend):
+    star = RateLimiter(limit=1, seconds=30, name="a*")
+    plain = RateLimiter(limit=1, seconds=30, name="ab")
+    await plain(DummyRequest(), Response())
+    assert await star.reset_all() == 0
+    assert await plain.count_keys() == 1
+
+
+@pytest.mark.asyncio
+async def test_names_sharing_a_prefix_are_separate(backend):
+    api = RateLimiter(limit=1, seconds=30, name="api")
+    api_v2 = RateLimiter(limit=1, seconds=30, name="api-v2")
+    await api_v2(DummyRequest(), Response())
+    assert await api.count_keys() == 0
+    assert await api.reset_all() == 0
+    assert await api_v2.count_keys() == 1
+
+
+@pytest.mark.parametrize("name", ["api:v2", "{api}", "api}"])
+def test_names_with_key_delimiters_are_rejected(name):
+    with pytest.raises(ValueError):
+        RateLimiter(limit=1, seconds=30, name=name)
+
+
+@pytest.mark.asyncio
+async def test_reset_scans_for_limiters_without_rules(backend):
+    class Custom(BaseLimiter):
+        def __init__(self):
+            super().__init__()
+            self._instance_id = "custom"
+
+        async def __call__(self, request, response):
+            pass
+
+    limiter = Custom()
+    full_key = limiter._full_key("client")
+    script = RateLimiter(limit=1, seconds=30).lua_script
+    await Cap.backend.run(script, (full_key + ":extra",), (1, 30000))
+    assert await limiter.reset("client")
+    assert await limiter.count_keys() == 0
+
+
+@pytest.mark.asyncio
+async def test_reset_drops_local_leases(backend):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=4, tokens_per_minute=1, lease_size=2
+    )
+    await limiter(DummyRequest(), Response())
+    assert limiter._leases
+    await limiter.reset("1.2.3.4:/test")
+    assert not limiter._leases
+    assert (await limiter.peek("1.2.3.4:/test")).remaining == 4
+
+
+@pytest.mark.asyncio
+async def test_admin_calls_bypass_the_breaker(backend):
+    Cap.init_backend(CircuitBreakerBackend(Cap.backend, failure_threshold=1))
+    limiter = RateLimiter(limit=1, seconds=30)
+    await limiter(DummyRequest(), Response())
+    assert await limiter.count_keys() == 1
+    assert await limiter.reset_all() == 1
+
+
+@pytest.mark.asyncio
+async def test_backends_without_key_scans_are_rejected(redis_ready):
+    class ScriptsOnly(Backend):
+        async def run(self, script, keys, args):
+            return [1, 0, 0, 1, 30000]
+
+    assert MemoryBackend().supports_scan
+    for backend in (ScriptsOnly(), CircuitBreakerBackend(ScriptsOnly())):
+        assert not backend.supports_scan
+        Cap.init_backend(backend)
+        limiter = RateLimiter(limit=1, seconds=30)
+        await limiter(DummyRequest(), Response())
+        with pytest.raises(TypeError, match="does not support reset:"):
+            await limiter.reset("1.2.3.4:/test")
+        with pytest.raises(TypeError, match="does not support reset_all"):
+            await limiter.reset_all()
+        with pytest.raises(TypeError, match="does not support count_keys"):
+            await limiter.count_keys()
+
+
+@pytest.mark.asyncio
+async def test_invalid_arguments(backend):
+    limiter = RateLimiter(limit=1, seconds=30)
+    with pytest.raises(ValueError):
+        await limiter.reset_all(batch_size=0)
+    with pytest.raises(ValueError):
+        await limiter.reset_all(pause_seconds=-1)
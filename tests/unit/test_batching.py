@@ -0,0 +1,82 @@
+import asyncio
+
+import pytest
+from redis.exceptions import NoScriptError
+
+from fastapicap import Cap, GCRARateLimiter, RateLimiter, TokenBucketRateLimiter
+from fastapicap.batching import ScriptBatcher
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+async def _outcome(limiter, request):
+    try:
+        await limiter(request, DummyResponse())
+        return True
+    except Exception:
+        return False
+
+
+@pytest.mark.asyncio
+async def test_batching_coalesces_concurrent_calls(redis_container):
+    Cap.init_app(redis_container, batch=True)
+    sent = []
+    original_send = Cap.backend.batcher._send
+
+    async def spy_send(batch):
+        sent.append(len(batch))
+        await original_send(batch)
+
+    Cap.backend.batcher._send = spy_send
+    limiter = RateLimiter(limit=5, seconds=10)
+    request = DummyRequest()
+    await limiter(request, DummyResponse())  # Loads the script
+    sent.clear()
+    results = await asyncio.gather(*[_outcome(limiter, request) for _ in range(10)])
+    assert results.count(True) == 4
+    assert sent == [10]
+
+
+@pytest.mark.asyncio
+async def test_batching_with_window(redis_container):
+    Cap.init_app(redis_container, batch=True, batch_window_us=2000)
+    limiter = TokenBucketRateLimiter(capacity=3, tokens_per_second=1)
+    request = DummyRequest()
+    results = await asyncio.gather(*[_outcome(limiter, request) for _ in range(5)])
+    assert results.count(True) == 3
+
+
+@pytest.mark.asyncio
+async def test_batching_keeps_results_per_caller(redis_container):
+    Cap.init_app(redis_container, batch=True)
+    limiter = GCRARateLimiter(burst=1, tokens_per_second=1)
+    await limiter(DummyRequest(ip="9.9.9.9"), DummyResponse())  # Loads the script
+    results = await asyncio.gather(
+        _outcome(limiter, DummyRequest(ip="1.1.1.1")),
+        _outcome(limiter, DummyRequest(ip="2.2.2.2")),
+        _outcome(limiter, DummyRequest(ip="1.1.1.1")),
+    )
+    assert results == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_batching_propagates_errors(redis_container):
+    Cap.init_app(redis_container, batch=True)
+    with pytest.raises(NoScriptError):
+        await Cap.backend.batcher.evalsha("0" * 40, 0)
+
+
+def test_batcher_rejects_invalid_config():
+    with pytest.raises(ValueError):
+        ScriptBatcher(None, window_us=-1)
+    with pytest.raises(ValueError):
+        ScriptBatcher(None, max_batch=0)
@@ -0,0 +1,157 @@
+import pytest
+from fastapi import HTTPException, Response
+from redis.exceptions import NoScriptError
+
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    MultiRateLimiter,
+    Quota,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap.backends import MemoryBackend, RedisBackend
+from fastapicap.base_limiter import BaseLimiter
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+LIMITERS = [
+    RateLimiter(limit=2, seconds=30),
+    SlidingWindowRateLimiter(limit=2, seconds=30),
+    TokenBucketRateLimiter(capacity=2, tokens_per_minute=1),
+    LeakyBucketRateLimiter(capacity=2, leaks_per_minute=1),
+    GCRARateLimiter(burst=2, tokens_per_minute=1),
+    # The plain log keeps one entry per millisecond, so repeated keys in one
+    # batch collapse.
+    SlidingWindowLogRateLimiter(limit=2, window_seconds=30, bucket_seconds=1),
+    MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 5, "seconds": 30}),
+            (SlidingWindowRateLimiter, {"limit": 2, "seconds": 30}),
+        ]
+    ),
+]
+
+
+@pytest.fixture(params=["redis", "memory", "server_time"])
+def backend(request, redis_ready):
+    if request.param == "memory":
+        Cap.init_backend(MemoryBackend())
+    elif request.param == "server_time":
+        Cap.init_backend(RedisBackend(Cap.redis, server_time=True))
+    return request.param
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limiter", LIMITERS)
+async def test_check_many(backend, limiter):
+    quotas = await limiter.check_many(["a", "b", "a", "a"])
+    assert all(isinstance(quota, Quota) for quota in quotas)
+    assert [quota.allowed for quota in quotas] == [True, True, True, False]
+    assert [quota.remaining for quota in quotas] == [1, 1, 0, 0]
+    assert quotas[3].retry_after_ms > 0
+    assert await limiter.check_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_check_many_shares_state_with_requests(backend):
+    limiter = RateLimiter(limit=2, seconds=30)
+    await limiter(DummyRequest(), Response())
+    quotas = await limiter.check_many(["1.2.3.4:/test", "5.6.7.8:/test"])
+    assert [quota.remaining for quota in quotas] == [0, 1]
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(), Response())
+
+
+@pytest.mark.asyncio
+async def test_costs(backend):
+    limiter = TokenBucketRateLimiter(capacity=10, tokens_per_minute=1)
+    quotas = await limiter.check_many(["a", "a", "b"], costs=[4, 7, 10])
+    assert [quota.allowed for quota in quotas] == [True, False, True]
+    assert [quota.remaining for quota in quotas] == [6, 6, 0]
+
+    weighted = GCRARateLimiter(burst=10, tokens_per_minute=1, cost=5)
+    quotas = await weighted.check_many(["a", "a", "a"])
+    assert [quota.allowed for quota in quotas] == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_invalid_costs(backend):
+    limiter = TokenBucketRateLimiter(capacity=10, tokens_per_minute=1)
+    with pytest.raises(ValueError):
+        await limiter.check_many(["a", "b"], costs=[1])
+    with pytest.raises(ValueError):
+        await limiter.check_many(["a"], costs=[-1])
+    with pytest.raises(ValueError):
+        await RateLimiter(limit=1, seconds=1).check_many(["a"], costs=[1])
+
+
+@pytest.mark.asyncio
+async def test_limiters_without_script_calls_are_rejected(backend):
+    class Custom(BaseLimiter):
+        async def __call__(self, request, response):
+            pass
+
+    with pytest.raises(TypeError, match="Custom does not support check_many"):
+        await Custom().check_many(["a"])
+
+
+@pytest.mark.asyncio
+async def test_check_many_is_one_round_trip(redis_ready):
+    calls = []
+    pipeline = Cap.redis.pipeline
+
+    def recording_pipeline(*args, **kwargs):
+        calls.append(kwargs)
+        return pipeline(*args, **kwargs)
+
+    Cap.init_backend(RedisBackend(Cap.redis, functions=False))
+    Cap.redis.pipeline = recording_pipeline
+    try:
+        limiter = GCRARateLimiter(burst=100, tokens_per_minute=1)
+        quotas = await limiter.check_many([f"device-{n}" for n in range(500)])
+    finally:
+        del Cap.redis.pipeline
+    assert all(quota.allowed for quota in quotas)
+    assert calls == [{"transaction": False}]
+
+
+class FlushedPipeline:
+    """A pipeline on a server that lost its scripts, as after a failover."""
+
+    def __init__(self):
+        self.commands = 0
+
+    def execute_command(self, *args):
+        self.commands += 1
+
+    async def execute(self, raise_on_error=True):
+        return [NoScriptError("No matching script.")] * self.commands
+
+
+class FlushedRedis:
+    def __init__(self, redis):
+        self.redis = redis
+
+    def pipeline(self, transaction=True):
+        return FlushedPipeline()
+
+    def __getattr__(self, name):
+        return getattr(self.redis, name)
+
+
+@pytest.mark.asyncio
+async def test_check_many_recovers_lost_scripts(redis_ready):
+    Cap.init_backend(RedisBackend(FlushedRedis(Cap.redis), functions=False))
+    limiter = RateLimiter(limit=2, seconds=30)
+    quotas = await limiter.check_many(["a", "a", "a"])
+    assert [quota.allowed for quota in quotas] == [True, True, False]
@@ -0,0 +1,157 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from redis.exceptions import ConnectionError, ResponseError
+
+from fastapicap import Cap, GCRARateLimiter, RateLimiter
+from fastapicap.backends import (
+    Backend,
+    BackendUnavailable,
+    CircuitBreakerBackend,
+    MemoryBackend,
+)
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+class FlakyBackend(Backend):
+    """A memory backend that can be taken down or slowed down."""
+
+    def __init__(self):
+        self.backend = MemoryBackend()
+        self.calls = 0
+        self.down = False
+        self.delay = 0.0
+        self.error = None
+
+    async def run(self, script, keys, args):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        if self.down:
+            raise ConnectionError("Connection refused")
+        return await self.backend.run(script, keys, args)
+
+
+@pytest.fixture
+def flaky():
+    yield FlakyBackend()
+    Cap.init_failure_policy(None)
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_and_recovers(flaky):
+    breaker = CircuitBreakerBackend(flaky, failure_threshold=2, cooldown_seconds=0.05)
+    limiter = RateLimiter(limit=10, seconds=5)
+    Cap.init_backend(breaker)
+    await limiter(DummyRequest(), DummyResponse())
+
+    flaky.down = True
+    for _ in range(2):
+        with pytest.raises(BackendUnavailable):
+            await limiter(DummyRequest(), DummyResponse())
+    assert breaker.state == "open"
+    # While open, the backend is not called.
+    with pytest.raises(BackendUnavailable) as info:
+        await limiter(DummyRequest(), DummyResponse())
+    assert info.value.retry_after == 1
+    assert flaky.calls == 3
+
+    # A failed probe opens the circuit again.
+    await asyncio.sleep(0.06)
+    assert breaker.state == "half-open"
+    with pytest.raises(BackendUnavailable):
+        await limiter(DummyRequest(), DummyResponse())
+    assert (breaker.state, flaky.calls) == ("open", 4)
+
+    flaky.down = False
+    await asyncio.sleep(0.06)
+    await limiter(DummyRequest(), DummyResponse())
+    assert (breaker.state, breaker.failures) == ("closed", 0)
+
+
+@pytest.mark.asyncio
+async def test_timeout_counts_as_failure(flaky):
+    flaky.delay = 0.5
+    breaker = CircuitBreakerBackend(flaky, timeout_ms=10, failure_threshold=1)
+    Cap.init_backend(breaker)
+    with pytest.raises(BackendUnavailable):
+        await RateLimiter(limit=1, seconds=5)(DummyRequest(), DummyResponse())
+    assert breaker.state == "open"
+
+
+@pytest.mark.asyncio
+async def test_script_errors_are_not_failures(flaky):
+    flaky.error = ResponseError("ERR Error running script")
+    breaker = CircuitBreakerBackend(flaky, failure_threshold=1)
+    Cap.init_backend(breaker)
+    with pytest.raises(ResponseError):
+        await RateLimiter(limit=1, seconds=5)(DummyRequest(), DummyResponse())
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_fail_open(flaky):
+    Cap.init_backend(flaky)
+    Cap.init_failure_policy("open", failure_threshold=1)
+    assert isinstance(Cap.backend, CircuitBreakerBackend)
+    flaky.down = True
+    limiter = RateLimiter(limit=1, seconds=5)
+    for _ in range(3):
+        await limiter(DummyRequest(), DummyResponse())
+    assert flaky.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_fail_closed(flaky):
+    Cap.init_failure_policy("closed", failure_threshold=1, cooldown_seconds=30)
+    Cap.init_backend(flaky)
+    flaky.down = True
+    limiter = GCRARateLimiter(burst=5, tokens_per_minute=5)
+    with pytest.raises(HTTPException) as info:
+        await limiter(DummyRequest(), DummyResponse())
+    assert info.value.status_code == 429
+    assert info.value.headers["Retry-After"] == "30"
+
+
+@pytest.mark.asyncio
+async def test_local_fallback(flaky):
+    Cap.init_failure_policy("local", failure_threshold=1)
+    Cap.init_backend(flaky)
+    flaky.down = True
+    limiter = RateLimiter(limit=2, seconds=5)
+    await limiter(DummyRequest(), DummyResponse())
+    await limiter(DummyRequest(), DummyResponse())
+    with pytest.raises(HTTPException):
+        await limiter(DummyRequest(), DummyResponse())
+
+
+def test_policy_is_applied_to_new_backends(flaky, redis_container):
+    Cap.init_failure_policy("open", timeout_ms=50)
+    Cap.init_app(redis_container)
+    assert isinstance(Cap.backend, CircuitBreakerBackend)
+    assert Cap.redis is Cap.backend.backend.redis
+    assert Cap.backend.timeout == 0.05
+    Cap.init_failure_policy(None)
+    assert not isinstance(Cap.backend, CircuitBreakerBackend)
+    assert Cap.failure_mode == "raise"
+
+
+def test_invalid_policy():
+    with pytest.raises(ValueError):
+        Cap.init_failure_policy("sometimes")
+    with pytest.raises(ValueError):
+        Cap.init_failure_policy("open", timeout_ms=0)
+    assert Cap.failure_mode == "raise"
@@ -0,0 +1,74 @@
+import pytest
+from redis.asyncio import RedisCluster
+from redis.crc import key_slot
+
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def record_backend_keys():
+    keys = []
+    original_run = Cap.backend.run
+
+    async def spy_run(script, script_keys, args):
+        keys.append(script_keys)
+        return await original_run(script, script_keys, args)
+
+    Cap.backend.run = spy_run
+    return keys
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "limiter",
+    [
+        RateLimiter(limit=5, seconds=5),
+        SlidingWindowRateLimiter(limit=5, seconds=5),
+        TokenBucketRateLimiter(capacity=5, tokens_per_second=1),
+        LeakyBucketRateLimiter(capacity=5, leaks_per_second=1),
+        GCRARateLimiter(burst=5, tokens_per_second=1),
+        SlidingWindowLogRateLimiter(limit=5, window_seconds=5),
+    ],
+)
+async def test_keys_are_hash_tagged(redis_ready, limiter):
+    keys = record_backend_keys()
+    await limiter(DummyRequest(), DummyResponse())
+    (script_keys,) = keys
+    tag = f"{{{limiter.prefix}:{limiter._instance_id}:1.2.3.4:/test}}"
+    for key in script_keys:
+        assert key.startswith(tag)
+    assert len({key_slot(key.encode()) for key in script_keys}) == 1
+
+
+@pytest.mark.asyncio
+async def test_sliding_window_keys_share_a_slot(redis_ready):
+    limiter = SlidingWindowRateLimiter(limit=5, seconds=1)
+    keys = record_backend_keys()
+    for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3"):
+        await limiter(DummyRequest(ip=ip), DummyResponse())
+    for curr_key, prev_key in keys:
+        assert key_slot(curr_key.encode()) == key_slot(prev_key.encode())
+
+
+def test_init_app_cluster_client():
+    Cap.init_app("redis://localhost:7000", cluster=True)
+    assert isinstance(Cap.redis, RedisCluster)
+    assert Cap.backend.redis is Cap.redis
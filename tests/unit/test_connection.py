@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+
+from fastapicap import Cap, RateLimiter
+from fastapicap.pool import InstrumentedConnectionPool, PythonParser, HIREDIS_AVAILABLE
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+@pytest.mark.asyncio
+async def test_bounded_pool_reports_stats(redis_container):
+    Cap.init_app(redis_container, max_connections=2, pool_timeout=5)
+    assert isinstance(Cap.redis.connection_pool, InstrumentedConnectionPool)
+    limiter = RateLimiter(limit=100, seconds=5)
+    await asyncio.gather(
+        *[limiter(DummyRequest(ip=f"10.0.0.{i}"), DummyResponse()) for i in range(10)]
+    )
+    stats = Cap.pool_stats()
+    assert stats["max_connections"] == 2
+    assert stats["in_use"] + stats["idle"] <= 2
+    assert stats["acquisitions"] >= 10
+    assert stats["max_wait"] >= 0
+    await Cap.close()
+
+
+@pytest.mark.asyncio
+async def test_unbounded_pool_stats(redis_ready):
+    await Cap.redis.ping()
+    stats = Cap.pool_stats()
+    assert stats["in_use"] == 0
+    assert "acquisitions" not in stats
+
+
+@pytest.mark.asyncio
+async def test_connection_options_are_applied(redis_container):
+    Cap.init_app(
+        redis_container,
+        socket_timeout=1.5,
+        socket_keepalive=True,
+        health_check_interval=30,
+        hiredis=False,
+    )
+    kwargs = Cap.redis.connection_pool.connection_kwargs
+    assert kwargs["socket_timeout"] == 1.5
+    assert kwargs["socket_keepalive"] is True
+    assert kwargs["health_check_interval"] == 30
+    assert kwargs["parser_class"] is PythonParser
+    await Cap.close()
+
+
+@pytest.mark.skipif(HIREDIS_AVAILABLE, reason="hiredis is installed")
+def test_hiredis_required_but_missing(redis_container):
+    with pytest.raises(RuntimeError):
+        Cap.init_app(redis_container, hiredis=True)
+
+
+@pytest.mark.asyncio
+async def test_close_releases_backend(redis_container):
+    Cap.init_app(redis_container)
+    await Cap.close()
+    assert Cap.redis is None
+    assert Cap.backend is None
+    with pytest.raises(RuntimeError):
+        await RateLimiter(limit=1, seconds=1)(DummyRequest(), DummyResponse())
+
+
+@pytest.mark.asyncio
+async def test_lifespan_manages_connection(redis_container):
+    app = FastAPI(lifespan=Cap.lifespan(redis_container, max_connections=4))
+    async with app.router.lifespan_context(app):
+        assert Cap.pool_stats()["max_connections"] == 4
+        await RateLimiter(limit=1, seconds=1)(DummyRequest(), DummyResponse())
+    assert Cap.redis is None
@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap import base_limiter
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def count_backend_calls():
+    calls = []
+    original_run = Cap.backend.run
+
+    async def spy_run(script, keys, args):
+        calls.append(keys)
+        return await original_run(script, keys, args)
+
+    Cap.backend.run = spy_run
+    return calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "make_limiter",
+    [
+        lambda: RateLimiter(limit=1, seconds=5, deny_cache=True),
+        lambda: SlidingWindowRateLimiter(limit=1, seconds=5, deny_cache=True),
+        lambda: TokenBucketRateLimiter(
+            capacity=1, tokens_per_minute=1, deny_cache=True
+        ),
+        lambda: LeakyBucketRateLimiter(
+            capacity=1, leaks_per_minute=1, deny_cache=True
+        ),
+        lambda: GCRARateLimiter(burst=1, tokens_per_minute=1, deny_cache=True),
+        lambda: SlidingWindowLogRateLimiter(
+            limit=1, window_seconds=5, deny_cache=True
+        ),
+    ],
+)
+async def test_deny_cache_skips_backend_for_denied_keys(redis_ready, make_limiter):
+    limiter = make_limiter()
+    calls = count_backend_calls()
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    for _ in range(3):
+        with pytest.raises(Exception) as excinfo:
+            await limiter(request, response)
+        assert "Rate limit exceeded" in str(excinfo.value)
+    assert len(calls) == 2
+    await limiter(DummyRequest(ip="5.6.7.8"), response)  # Other keys unaffected
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_deny_cache_disabled_by_default(redis_ready):
+    limiter = RateLimiter(limit=1, seconds=5)
+    calls = count_backend_calls()
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    for _ in range(2):
+        with pytest.raises(Exception):
+            await limiter(request, response)
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_deny_cache_expires_at_retry_time(redis_ready):
+    limiter = GCRARateLimiter(burst=1, tokens_per_second=10, deny_cache=True)
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    with pytest.raises(Exception):
+        await limiter(request, response)
+    await asyncio.sleep(0.15)
+    await limiter(request, response)  # Allowed again
+
+
+@pytest.mark.asyncio
+async def test_deny_cache_is_bounded(redis_ready, monkeypatch):
+    monkeypatch.setattr(base_limiter, "DENY_CACHE_MAX_KEYS", 2)
+    limiter = RateLimiter(limit=1, seconds=5, deny_cache=True)
+    for i in range(4):
+        limiter._cache_denial(f"key{i}", 5000)
+    assert list(limiter._denied) == ["key2", "key3"]
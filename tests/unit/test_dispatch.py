@@ -0,0 +1,96 @@
+import pytest
+from starlette.requests import Request
+
+from fastapicap import GCRARateLimiter, RateLimiter, TokenBucketRateLimiter
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def sync_key(request):
+    return "sync-key"
+
+
+async def async_key(request):
+    return "async-key"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("key_func", [sync_key, async_key])
+async def test_sync_and_async_key_funcs(key_func):
+    calls = []
+
+    def on_limit(request, response, retry_after):
+        calls.append(retry_after)
+
+    limiter = RateLimiter(limit=1, seconds=5, key_func=key_func, on_limit=on_limit)
+    assert limiter._on_limit_is_async is False
+    await limiter(DummyRequest(ip="1.1.1.1"), DummyResponse())
+    await limiter(DummyRequest(ip="2.2.2.2"), DummyResponse())  # Same key
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_reassigned_key_func_is_redispatched():
+    limiter = RateLimiter(limit=1, seconds=5, key_func=sync_key)
+    assert limiter._key_func_is_async is False
+    limiter.key_func = async_key
+    assert limiter._key_func_is_async is True
+    await limiter(DummyRequest(), DummyResponse())
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(ip="5.6.7.8"), DummyResponse())
+
+
+def make_request(ip="1.2.3.4"):
+    return Request(
+        {"type": "http", "path": "/test", "headers": [], "client": (ip, 1234)}
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("is_async", [False, True])
+async def test_key_func_runs_once_per_request(is_async):
+    calls = []
+
+    def resolve(request):
+        calls.append(request)
+        return request.client.host
+
+    async def resolve_async(request):
+        return resolve(request)
+
+    key_func = resolve_async if is_async else resolve
+    limiters = [
+        RateLimiter(limit=5, seconds=5, key_func=key_func),
+        GCRARateLimiter(burst=5, tokens_per_minute=1, key_func=key_func),
+        TokenBucketRateLimiter(capacity=5, tokens_per_minute=1, key_func=key_func),
+    ]
+    first, second = make_request(), make_request("5.6.7.8")
+    for request in (first, second):
+        for limiter in limiters:
+            await limiter(request, DummyResponse())
+    assert calls == [first, second]
+
+
+@pytest.mark.asyncio
+async def test_different_key_funcs_are_memoized_separately():
+    limiter = RateLimiter(limit=1, seconds=5, key_func=sync_key)
+    other = RateLimiter(limit=1, seconds=5, key_func=async_key)
+    request = make_request()
+    assert limiter.key_func(request) == "sync-key"
+    assert await other.key_func(request) == "async-key"
+
+
+def test_key_prefix_and_args_are_precomputed():
+    limiter = TokenBucketRateLimiter(capacity=5, tokens_per_second=2, name="api")
+    assert limiter._key_prefix == "{cap:api:"
+    assert limiter._full_key("client") == "{cap:api:client}"
+    assert limiter._args == (b"5", b"0.002")
@@ -1,7 +1,11 @@
 import asyncio
 
 import pytest
-from fastapicap import RateLimiter
+from fastapi import HTTPException
+
+from fastapicap import Cap, RateLimiter
+from fastapicap.base_limiter import BaseLimiter
+from fastapicap.lua import FIXED_WINDOW
 
 
 class DummyRequest:
@@ -141,3 +145,27 @@ async def test_multiple_fixed_window_limiters(redis_ready):
     with pytest.raises(Exception) as excinfo2:
         await limiter2(request, response)
     assert "Rate limit exceeded" in str(excinfo2.value)
+
+
+@pytest.mark.asyncio
+async def test_limiters_calling_redis_directly_keep_working(redis_ready):
+    # A custom limiter written against the Redis-only API.
+    class Legacy(BaseLimiter):
+        lua_script = FIXED_WINDOW
+
+        async def __call__(self, request, response):
+            redis = self._ensure_redis()
+            await self._ensure_lua_sha(self.lua_script)
+            key = await self._safe_call(self.key_func, request)
+            result = await redis.evalsha(
+                self.lua_sha, 1, f"{self.prefix}:legacy:{key}", "1", "30000"
+            )
+            if result[0] == 0:
+                await self._safe_call(self.on_limit, request, response, 30)
+
+    limiter = Legacy()
+    with pytest.warns(DeprecationWarning):
+        await limiter(DummyRequest(), DummyResponse())
+    assert limiter.lua_sha == await Cap.redis.script_load(FIXED_WINDOW)
+    with pytest.warns(DeprecationWarning), pytest.raises(HTTPException):
+        await limiter(DummyRequest(), DummyResponse())
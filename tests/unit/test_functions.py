@@ -0,0 +1,146 @@
+import pytest
+from redis.exceptions import NoScriptError, ResponseError
+
+from fastapicap import Cap, RateLimiter, TokenBucketRateLimiter
+from fastapicap import lua
+from fastapicap.backends import RedisBackend
+from fastapicap.backends.redis_backend import build_library
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+class FunctionsRedis:
+    """Emulates Redis Functions and a script cache that can be flushed."""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.loads = 0
+        self.fcalls = 0
+        self.lost = False
+        self.flushed = False
+        self.scripts = {}
+        self.evalshas = 0
+        self.evals = 0
+
+    async def function_load(self, code, replace=False):
+        self.loads += 1
+        self.lost = False
+        _, functions = build_library()
+        self.scripts = {name: script for script, name in functions.items()}
+
+    async def fcall(self, function, numkeys, *keys_and_args):
+        if self.lost:
+            raise ResponseError("ERR Function not found")
+        self.fcalls += 1
+        return await self.redis.eval(self.scripts[function], numkeys, *keys_and_args)
+
+    async def script_load(self, script):
+        return await self.redis.script_load(script)
+
+    async def evalsha(self, sha, numkeys, *keys_and_args):
+        if self.flushed:
+            raise NoScriptError("No matching script. Please use EVAL.")
+        self.evalshas += 1
+        return await self.redis.evalsha(sha, numkeys, *keys_and_args)
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        # EVAL caches the script again.
+        self.flushed = False
+        self.evals += 1
+        return await self.redis.eval(script, numkeys, *keys_and_args)
+
+
+@pytest.mark.asyncio
+async def test_falls_back_to_evalsha_without_functions(redis_ready):
+    limiter = RateLimiter(limit=1, seconds=5)
+    await limiter(DummyRequest(), DummyResponse())
+    assert Cap.backend._functions == {}
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), DummyResponse())
+
+
+@pytest.mark.asyncio
+async def test_required_functions_raise_on_old_servers(redis_container):
+    Cap.init_app(redis_container, functions=True)
+    with pytest.raises(ResponseError):
+        await RateLimiter(limit=1, seconds=5)(DummyRequest(), DummyResponse())
+
+
+@pytest.mark.asyncio
+async def test_recovers_from_noscript(redis_ready):
+    redis = FunctionsRedis(Cap.redis)
+    Cap.init_backend(RedisBackend(redis, functions=False))
+    limiter = RateLimiter(limit=2, seconds=5)
+    await limiter(DummyRequest(), DummyResponse())
+    assert redis.evalshas == 1
+
+    redis.flushed = True  # e.g. after SCRIPT FLUSH or a failover
+    await limiter(DummyRequest(), DummyResponse())  # Served with EVAL
+    assert (redis.evalshas, redis.evals) == (1, 1)
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), DummyResponse())
+    assert (redis.evalshas, redis.evals) == (2, 1)
+
+
+@pytest.mark.asyncio
+async def test_fcall_and_library_reload(redis_ready):
+    redis = FunctionsRedis(Cap.redis)
+    Cap.init_backend(RedisBackend(redis))
+    limiter = TokenBucketRateLimiter(capacity=3, tokens_per_minute=1)
+    await limiter(DummyRequest(), DummyResponse())
+    assert (redis.loads, redis.fcalls) == (1, 1)
+
+    redis.lost = True  # e.g. failover to a server without the library
+    await limiter(DummyRequest(), DummyResponse())  # Served with EVAL
+    assert Cap.backend._functions is None
+
+    await limiter(DummyRequest(), DummyResponse())
+    assert (redis.loads, redis.fcalls) == (2, 2)
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), DummyResponse())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "script, keys, args",
+    [
+        (lua.LEAKY_BUCKET, ("k",), ("3", "0.001", "1000")),
+        (lua.TOKEN_BUCKET, ("k",), ("3", "0.001", "1000")),
+        (lua.GCRA_LUA, ("k",), ("3", "0.001", "1000.0", "1000")),
+        (lua.SLIDING_LOG_BUCKETED_LUA, ("k",), ("1000", "5000", "3", "1000")),
+        (lua.PEEK_LUA, ("k",), ("1000", "token_bucket", "3", "0.001", "0")),
+    ],
+)
+async def test_library_functions_match_scripts(redis_ready, script, keys, args):
+    # Run the library with a stand-in for `redis.register_function`, so the
+    # generated code is checked by a Lua interpreter.
+    code, functions = build_library()
+    code = code.split("\n", 1)[1].replace("redis.register_function", "register")
+    runner = (
+        "local registry = {}\n"
+        "local function register(name, callback)\n"
+        "    if type(name) == 'table' then\n"
+        "        name, callback = name.function_name, name.callback\n"
+        "    end\n"
+        "    registry[name] = callback\n"
+        "end\n"
+        + code
+        + "\nlocal argv = {}\n"
+        "for i = 2, #ARGV do argv[i - 1] = ARGV[i] end\n"
+        "return registry[ARGV[1]](KEYS, argv)\n"
+    )
+    for _ in range(4):
+        expected = await Cap.redis.eval(script, len(keys), *keys, *args)
+        actual = await Cap.redis.eval(
+            runner, len(keys), *(f"{key}:fn" for key in keys), functions[script], *args
+        )
+        assert actual == expected
@@ -133,3 +133,44 @@ async def test_gcra_multiple_limiters(redis_ready):
         await limiter1(request, response)  # Blocked for limiter1
     with pytest.raises(Exception):
         await limiter2(request, response)  # Blocked for limiter2
+
+
+@pytest.mark.asyncio
+async def test_gcra_static_cost(redis_ready):
+    limiter = GCRARateLimiter(burst=10, tokens_per_minute=1, cost=5)
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    await limiter(request, response)
+    with pytest.raises(Exception):
+        await limiter(request, response)
+
+
+@pytest.mark.asyncio
+async def test_gcra_computed_cost(redis_ready):
+    def cost(request):
+        return 1 if request.url.path == "/cheap" else 8
+
+    limiter = GCRARateLimiter(
+        burst=10, tokens_per_minute=1, cost=cost, key_func=lambda request: "user"
+    )
+    response = DummyResponse()
+    await limiter(DummyRequest(path="/export"), response)
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(path="/export"), response)
+    await limiter(DummyRequest(path="/cheap"), response)
+    await limiter(DummyRequest(path="/cheap"), response)
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(path="/cheap"), response)
+
+
+@pytest.mark.asyncio
+async def test_gcra_rejects_computed_cost_above_burst(redis_ready):
+    limiter = GCRARateLimiter(burst=10, tokens_per_minute=1, cost=lambda request: 11)
+    with pytest.raises(ValueError):
+        await limiter(DummyRequest(), DummyResponse())
+
+
+def test_gcra_invalid_cost():
+    with pytest.raises(ValueError):
+        GCRARateLimiter(burst=2, tokens_per_second=1, cost=3)
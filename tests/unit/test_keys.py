@@ -0,0 +1,138 @@
+import base64
+import json
+
+import pytest
+from starlette.requests import Request
+from starlette.routing import Route
+
+from fastapicap.keys import (
+    api_key,
+    client_ip,
+    client_network,
+    jwt_subject,
+    per_route,
+    route,
+)
+
+
+def make_request(ip="1.2.3.4", path="/users/42", headers=None, matched=None):
+    scope = {
+        "type": "http",
+        "path": path,
+        "headers": [
+            (name.lower().encode(), value.encode())
+            for name, value in (headers or {}).items()
+        ],
+        "client": (ip, 1234),
+    }
+    if matched is not None:
+        scope["route"] = matched
+    return Request(scope)
+
+
+def make_token(claims):
+    payload = base64.urlsafe_b64encode(json.dumps(claims).encode()).rstrip(b"=")
+    return f"eyJhbGciOiJIUzI1NiJ9.{payload.decode()}.signature"
+
+
+async def endpoint(request):
+    pass
+
+
+def test_route_uses_the_template():
+    users = Route("/users/{user_id:int}", endpoint)
+    assert route(make_request(matched=users)) == "/users/{user_id}"
+    assert route(make_request(path="/users/7", matched=users)) == "/users/{user_id}"
+    # Before routing, as in the middleware.
+    assert route(make_request()) == "/users/42"
+
+
+@pytest.mark.asyncio
+async def test_per_route():
+    users = Route("/users/{user_id}", endpoint)
+    request = make_request(matched=users)
+    assert per_route(client_ip())(request) == "1.2.3.4:/users/{user_id}"
+
+    async def tenant(request):
+        return "acme"
+
+    assert await per_route(tenant)(request) == "acme:/users/{user_id}"
+
+
+def test_client_ip_ignores_untrusted_forwarding():
+    forwarded = {"X-Forwarded-For": "6.6.6.6"}
+    assert client_ip()(make_request(headers=forwarded)) == "1.2.3.4"
+    trusting = client_ip(trusted_proxies=["10.0.0.0/8"])
+    # The peer is not a trusted proxy, so the header was set by the client.
+    assert trusting(make_request(headers=forwarded)) == "1.2.3.4"
+
+
+def test_client_ip_behind_trusted_proxies():
+    key_func = client_ip(trusted_proxies=["10.0.0.0/8", "192.168.1.1"])
+    chain = {"X-Forwarded-For": "6.6.6.6, 203.0.113.9, 192.168.1.1"}
+    assert key_func(make_request("10.0.0.5", headers=chain)) == "203.0.113.9"
+    assert key_func(make_request("10.0.0.5")) == "10.0.0.5"
+    only_proxies = {"X-Forwarded-For": "10.1.1.1, 192.168.1.1"}
+    assert key_func(make_request("10.0.0.5", headers=only_proxies)) == "10.1.1.1"
+
+
+def test_client_network():
+    key_func = client_network()
+    assert key_func(make_request("203.0.113.77")) == "203.0.113.0/24"
+    assert key_func(make_request("2001:db8:1:2:aaaa::1")) == "2001:db8:1:2::/64"
+    assert key_func(make_request("::ffff:203.0.113.77")) == "203.0.113.0/24"
+    assert client_network(ipv4_prefix=16)(make_request("203.0.113.77")) == (
+        "203.0.0.0/16"
+    )
+    with pytest.raises(ValueError):
+        client_network(ipv4_prefix=33)
+    with pytest.raises(ValueError):
+        client_network(ipv6_prefix=-1)
+
+
+def test_api_key_is_hashed():
+    key_func = api_key()
+    key = key_func(make_request(headers={"X-API-Key": "secret-1"}))
+    assert key.startswith("key:") and "secret" not in key
+    assert len(key) == 36
+    same_key = make_request("5.6.7.8", headers={"X-API-Key": "secret-1"})
+    assert key_func(same_key) == key
+    assert key != key_func(make_request(headers={"X-API-Key": "secret-2"}))
+    assert key_func(make_request()) == "1.2.3.4"
+
+
+def test_jwt_subject():
+    key_func = jwt_subject()
+    token = make_token({"sub": "user-42", "exp": 0})
+    headers = {"Authorization": f"Bearer {token}"}
+    assert key_func(make_request(headers=headers)) == "sub:user-42"
+    tenant = jwt_subject(claim="tid")
+    headers = {"Authorization": f"Bearer {make_token({'tid': 7})}"}
+    assert tenant(make_request(headers=headers)) == "tid:7"
+
+
+@pytest.mark.parametrize(
+    "authorization",
+    [
+        None,
+        "Basic dXNlcjpwYXNz",
+        "Bearer not-a-jwt",
+        "Bearer a.!!!.c",
+        "Bearer " + make_token({"name": "no subject"}),
+        "Bearer " + make_token(["sub"]),
+    ],
+)
+def test_jwt_subject_falls_back(authorization):
+    headers = {"Authorization": authorization} if authorization else {}
+    key_func = jwt_subject(fallback=lambda request: "anonymous")
+    assert key_func(make_request(headers=headers)) == "anonymous"
+
+
+def test_fallback_must_be_synchronous():
+    async def fallback(request):
+        return "key"
+
+    with pytest.raises(ValueError):
+        api_key(fallback=fallback)
+    with pytest.raises(ValueError):
+        jwt_subject(fallback=fallback)
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+from fastapicap import Cap, LeasedTokenBucketRateLimiter
+from fastapicap.backends import MemoryBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def count_backend_calls():
+    calls = []
+    original_run = Cap.backend.run
+
+    async def spy_run(script, keys, args):
+        calls.append(script)
+        return await original_run(script, keys, args)
+
+    Cap.backend.run = spy_run
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_serves_from_lease(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=100, tokens_per_second=1, lease_size=20, renew_below=0
+    )
+    calls = count_backend_calls()
+    request = DummyRequest()
+    response = DummyResponse()
+    for _ in range(20):
+        await limiter(request, response)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_blocks_when_empty(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=2, tokens_per_minute=1, lease_size=2
+    )
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    await limiter(request, response)
+    with pytest.raises(Exception) as excinfo:
+        await limiter(request, response)
+    assert "Rate limit exceeded" in str(excinfo.value)
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_shares_bucket_between_workers(redis_ready):
+    worker1, worker2 = (
+        LeasedTokenBucketRateLimiter(
+            capacity=4, tokens_per_minute=1, lease_size=2, renew_below=0
+        )
+        for _ in range(2)
+    )
+    request = DummyRequest()
+    response = DummyResponse()
+    for _ in range(2):
+        await worker1(request, response)
+        await worker2(request, response)
+    with pytest.raises(Exception):
+        await worker1(request, response)
+    with pytest.raises(Exception):
+        await worker2(request, response)
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_renews_in_background(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, lease_size=3, renew_below=1
+    )
+    calls = count_backend_calls()
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)  # Takes a lease of 3
+    await limiter(request, response)  # 1 token left, renewal starts
+    await asyncio.sleep(0.05)
+    await limiter(request, response)
+    await limiter(request, response)
+    assert len(calls) == 2
+
+
+class SlowBackend(MemoryBackend):
+    async def run(self, script, keys, args):
+        await asyncio.sleep(0.001)
+        return await super().run(script, keys, args)
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_concurrent_misses_share_one_lease(redis_ready):
+    Cap.init_backend(SlowBackend())
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=100, tokens_per_minute=1, lease_size=10
+    )
+    await asyncio.gather(
+        *(limiter(DummyRequest(), DummyResponse()) for _ in range(8))
+    )
+    await asyncio.sleep(0.05)  # Let the renewal finish.
+    lease = limiter._leases[limiter._full_key("1.2.3.4:/test")]
+    assert lease.tokens <= limiter.lease_size + limiter.renew_below
+    shared = (await limiter.peek("1.2.3.4:/test")).remaining
+    assert shared + lease.tokens == 92
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_renewal_keeps_the_expiry(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, lease_size=3, renew_below=1
+    )
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    lease = limiter._leases[limiter._full_key("1.2.3.4:/test")]
+    expires = lease.expires
+    await limiter(request, response)  # 1 token left, renewal starts
+    await asyncio.sleep(0.05)
+    assert lease.tokens == 4
+    assert lease.expires == expires
+
+
+@pytest.mark.asyncio
+async def test_leased_token_bucket_returns_unused_tokens(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=5, tokens_per_minute=1, lease_size=5, lease_seconds=0.05,
+        name="shared",
+    )
+    other = LeasedTokenBucketRateLimiter(
+        capacity=5, tokens_per_minute=1, lease_size=5, name="shared"
+    )
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)  # Leases all 5 tokens
+    with pytest.raises(Exception):
+        await other(request, response)
+    await limiter.release()
+    for _ in range(4):
+        await other(request, response)
+
+
+def test_leased_token_bucket_invalid_config():
+    with pytest.raises(ValueError):
+        LeasedTokenBucketRateLimiter(capacity=5, tokens_per_second=1, lease_size=0)
+    with pytest.raises(ValueError):
+        LeasedTokenBucketRateLimiter(capacity=5, tokens_per_second=1, lease_size=6)
+    with pytest.raises(ValueError):
+        LeasedTokenBucketRateLimiter(
+            capacity=5, tokens_per_second=1, lease_seconds=0
+        )
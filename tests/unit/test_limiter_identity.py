@@ -0,0 +1,102 @@
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+
+from fastapicap import (
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+@pytest.mark.parametrize(
+    "make_limiter",
+    [
+        lambda **kw: RateLimiter(limit=5, seconds=5, **kw),
+        lambda **kw: SlidingWindowRateLimiter(limit=5, seconds=5, **kw),
+        lambda **kw: TokenBucketRateLimiter(capacity=5, tokens_per_second=1, **kw),
+        lambda **kw: LeakyBucketRateLimiter(capacity=5, leaks_per_second=1, **kw),
+        lambda **kw: GCRARateLimiter(burst=5, tokens_per_second=1, **kw),
+        lambda **kw: SlidingWindowLogRateLimiter(limit=5, window_seconds=5, **kw),
+    ],
+)
+def test_identity_is_deterministic(make_limiter):
+    first, second = make_limiter(), make_limiter()
+    assert first._instance_id == second._instance_id
+    assert str(id(first)) not in first._instance_id
+    assert make_limiter(name="search")._instance_id == "search"
+
+
+def identity(strategy=RateLimiter, **params):
+    # One definition site, as for the same limiter in several workers.
+    return strategy(**params)._instance_id
+
+
+def user_key(request):
+    return "user-1"
+
+
+def test_identity_depends_on_configuration():
+    assert identity(limit=5, seconds=5) != identity(limit=6, seconds=5)
+    assert identity(limit=5, seconds=60) == identity(limit=5, minutes=1)
+    assert identity(limit=5, seconds=5) != identity(
+        SlidingWindowRateLimiter, limit=5, seconds=5
+    )
+    assert identity(limit=5, seconds=5) != identity(
+        limit=5, seconds=5, key_func=user_key
+    )
+
+
+def test_identity_depends_on_definition_site():
+    first = RateLimiter(limit=5, seconds=5)
+    second = RateLimiter(limit=5, seconds=5)
+    assert first._instance_id != second._instance_id
+    named = [RateLimiter(limit=5, seconds=5, name="api") for _ in range(2)]
+    assert named[0]._instance_id == named[1]._instance_id == "api"
+
+
+@pytest.mark.asyncio
+async def test_same_config_on_different_routes_stays_independent(redis_ready):
+    app = FastAPI()
+    reports = RateLimiter(limit=1, seconds=5, key_func=user_key)
+    exports = RateLimiter(limit=1, seconds=5, key_func=user_key)
+
+    @app.get("/reports", dependencies=[Depends(reports)])
+    async def get_reports():
+        return []
+
+    @app.get("/exports", dependencies=[Depends(exports)])
+    async def get_exports():
+        return []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        assert (await client.get("/reports")).status_code == 200
+        assert (await client.get("/exports")).status_code == 200
+        assert (await client.get("/reports")).status_code == 429
+
+
+@pytest.mark.asyncio
+async def test_names_keep_limiters_apart(redis_ready):
+    limiter1 = RateLimiter(limit=1, seconds=5, name="login")
+    limiter2 = RateLimiter(limit=1, seconds=5, name="signup")
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter1(request, response)
+    await limiter2(request, response)  # Allowed (different name)
+    with pytest.raises(Exception):
+        await limiter1(request, response)
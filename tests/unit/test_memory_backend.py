@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap import lua
+from fastapicap.backends import MemoryBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def assert_replies_match(actual, expected):
+    """Compare script replies, allowing for clock differences in the times."""
+    allowed, retry_ms, remaining, limit, reset_ms = expected
+    assert (actual[0], actual[2], actual[3]) == (allowed, remaining, limit)
+    assert abs(actual[1] - retry_ms) < 100
+    assert abs(actual[4] - reset_ms) < 100
+
+
+@pytest.fixture
+def memory_backend():
+    backend = MemoryBackend()
+    Cap.init_backend(backend)
+    yield backend
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "limiter",
+    [
+        RateLimiter(limit=2, seconds=5),
+        SlidingWindowRateLimiter(limit=2, seconds=5),
+        TokenBucketRateLimiter(capacity=2, tokens_per_minute=1),
+        TokenBucketRateLimiter(capacity=7, tokens_per_minute=1, cost=3),
+        LeakyBucketRateLimiter(capacity=2, leaks_per_minute=1),
+        GCRARateLimiter(burst=2, tokens_per_minute=1),
+        GCRARateLimiter(burst=5, tokens_per_minute=1, cost=2),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=5),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=5, bucket_seconds=1),
+    ],
+)
+async def test_memory_backend_limits_without_redis(memory_backend, limiter):
+    assert Cap.redis is None
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    await asyncio.sleep(0.002)
+    await limiter(request, response)
+    with pytest.raises(Exception) as excinfo:
+        await limiter(request, response)
+    assert "Rate limit exceeded" in str(excinfo.value)
+    await limiter(DummyRequest(ip="5.6.7.8"), response)  # Different key
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "script, args",
+    [
+        (lua.FIXED_WINDOW, lambda now: ("3", "5000")),
+        (lua.TOKEN_BUCKET, lambda now: ("3", "0.001", str(now))),
+        (lua.LEAKY_BUCKET, lambda now: ("3", "0.001", str(now))),
+        (lua.GCRA_LUA, lambda now: ("3", "0.001", "1000.0", str(now))),
+        (lua.SLIDING_LOG_LUA, lambda now: (str(now), "5000", "3")),
+        (lua.SLIDING_LOG_BUCKETED_LUA, lambda now: (str(now), "5000", "3", "10")),
+    ],
+)
+async def test_memory_backend_matches_redis(redis_ready, script, args):
+    memory = MemoryBackend()
+    now = int(time.time() * 1000)
+    for step in range(5):
+        call_args = args(now + step * 7)
+        expected = await Cap.backend.run(script, ("k",), call_args)
+        actual = await memory.run(script, ("k",), call_args)
+        if script == lua.FIXED_WINDOW:
+            # PTTL depends on the wall clock of each store
+            assert_replies_match(actual, expected)
+        else:
+            assert actual == expected
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "script, args, rule",
+    [
+        (lua.TOKEN_BUCKET, lambda now: ("3", "0.001", str(now)), ("token_bucket", "3", "0.001")),
+        (lua.LEAKY_BUCKET, lambda now: ("3", "0.001", str(now)), ("leaky_bucket", "3", "0.001")),
+        (lua.GCRA_LUA, lambda now: ("3", "0.001", "1000.0", str(now)), ("gcra", "3", "1000.0")),
+        (lua.SLIDING_LOG_LUA, lambda now: (str(now), "5000", "3"), ("sliding_log", "3", "5000")),
+        (
+            lua.SLIDING_LOG_BUCKETED_LUA,
+            lambda now: (str(now), "5000", "3", "10"),
+            ("sliding_log_bucketed", "3", "5000"),
+        ),
+    ],
+)
+async def test_memory_backend_peek_matches_redis(redis_ready, script, args, rule):
+    memory = MemoryBackend()
+    now = int(time.time() * 1000)
+    for step in range(4):
+        await Cap.backend.run(script, ("k",), args(now + step * 7))
+        await memory.run(script, ("k",), args(now + step * 7))
+        peek_args = (str(now + step * 7 + 3), *rule, "10")
+        expected = await Cap.backend.run_readonly(lua.PEEK_LUA, ("k",), peek_args)
+        actual = await memory.run_readonly(lua.PEEK_LUA, ("k",), peek_args)
+        assert actual == expected
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_sliding_window_matches_redis(redis_ready):
+    memory = MemoryBackend()
+    now = int(time.time() * 1000)
+    curr_window = now - now % 60000
+    args = (str(curr_window), "60000", "3")
+    keys = ("curr", "prev")
+    await Cap.redis.set("prev", 2)
+    await memory.run(lua.FIXED_WINDOW, ("prev",), ("1", "60000"))
+    await memory.run(lua.FIXED_WINDOW, ("prev",), ("1", "60000"))
+    for _ in range(3):
+        expected = await Cap.backend.run(lua.SLIDING_WINDOW, keys, args)
+        actual = await memory.run(lua.SLIDING_WINDOW, keys, args)
+        assert_replies_match(actual, expected)
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_expires_keys():
+    memory = MemoryBackend(sweep_batch=4)
+    for i in range(10):
+        await memory.run(lua.FIXED_WINDOW, (f"k{i}",), ("5", "100"))
+    assert len(memory) == 10
+    await asyncio.sleep(0.15)
+    for _ in range(3):
+        await memory.run(lua.FIXED_WINDOW, ("other",), ("5", "60000"))
+    assert len(memory) == 1
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_max_keys():
+    memory = MemoryBackend(max_keys=3)
+    for i in range(10):
+        await memory.run(lua.FIXED_WINDOW, (f"k{i}",), ("5", "60000"))
+    assert len(memory) == 3
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_rejects_unknown_script():
+    with pytest.raises(NotImplementedError):
+        await MemoryBackend().run("return 1", (), ())
+
+
+def test_memory_backend_invalid_config():
+    with pytest.raises(ValueError):
+        MemoryBackend(max_keys=0)
+    with pytest.raises(ValueError):
+        MemoryBackend(sweep_batch=-1)
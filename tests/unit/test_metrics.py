@@ -0,0 +1,158 @@
+import pytest
+
+from fastapicap import Cap, GCRARateLimiter, RateLimiter
+from fastapicap.backends import Backend, MemoryBackend, RedisBackend
+from fastapicap.base_limiter import BaseLimiter
+from fastapicap.metrics import Metrics, PrometheusMetrics
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+class RecordingMetrics(Metrics):
+    def __init__(self):
+        self.decisions = []
+        self.key_funcs = []
+        self.backend_calls = []
+        self.script_loads = []
+
+    def observe_decision(self, limiter, decision, seconds):
+        assert seconds >= 0
+        self.decisions.append((limiter, decision))
+
+    def observe_key_func(self, limiter, seconds):
+        self.key_funcs.append(limiter)
+
+    def observe_backend(self, limiter, seconds):
+        self.backend_calls.append(limiter)
+
+    def observe_script_load(self, kind):
+        self.script_loads.append(kind)
+
+
+class FailingBackend(Backend):
+    async def run(self, script, keys, args):
+        raise ConnectionError("backend down")
+
+
+@pytest.fixture
+def metrics():
+    metrics = RecordingMetrics()
+    Cap.init_metrics(metrics)
+    yield metrics
+    Cap.init_metrics(None)
+
+
+@pytest.mark.asyncio
+async def test_records_decisions_and_latencies(metrics):
+    limiter = GCRARateLimiter(burst=1, tokens_per_minute=1, name="login")
+    await limiter(DummyRequest(), DummyResponse())
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), DummyResponse())
+    assert metrics.decisions == [("login", "allowed"), ("login", "denied")]
+    assert metrics.key_funcs == ["login", "login"]
+    assert metrics.backend_calls == ["login", "login"]
+
+
+@pytest.mark.asyncio
+async def test_sync_key_func_and_deny_cache(metrics):
+    limiter = RateLimiter(
+        limit=1, seconds=5, key_func=lambda request: "client", deny_cache=True
+    )
+    for _ in range(3):
+        try:
+            await limiter(DummyRequest(), DummyResponse())
+        except Exception:
+            pass
+    identity = limiter._instance_id
+    assert [decision for _, decision in metrics.decisions] == [
+        "allowed",
+        "denied",
+        "denied",
+    ]
+    assert metrics.key_funcs == [identity] * 3
+    # The third request was denied from the cache.
+    assert metrics.backend_calls == [identity] * 2
+
+
+@pytest.mark.asyncio
+async def test_backend_errors(metrics):
+    Cap.init_backend(FailingBackend())
+    limiter = RateLimiter(limit=1, seconds=5)
+    with pytest.raises(ConnectionError):
+        await limiter(DummyRequest(), DummyResponse())
+    assert metrics.decisions == [(limiter._instance_id, "error")]
+
+
+@pytest.mark.asyncio
+async def test_script_loads(metrics, redis_container):
+    Cap.init_app(redis_container, functions=False)
+    assert Cap.backend.metrics is metrics
+    limiter = RateLimiter(limit=5, seconds=5)
+    await limiter(DummyRequest(), DummyResponse())
+    await limiter(DummyRequest(), DummyResponse())
+    assert metrics.script_loads == ["script"]
+
+
+@pytest.mark.asyncio
+async def test_custom_limiters_are_measured(metrics):
+    class AlwaysDeny(BaseLimiter):
+        def __init__(self):
+            super().__init__()
+            self._instance_id = "deny"
+
+        async def __call__(self, request, response):
+            await self._reject(request, response, 1)
+
+    with pytest.raises(Exception):
+        await AlwaysDeny()(DummyRequest(), DummyResponse())
+    assert metrics.decisions == [("deny", "denied")]
+
+
+@pytest.mark.asyncio
+async def test_disabled_metrics_are_not_called(metrics):
+    Cap.init_metrics(None)
+    Cap.init_backend(MemoryBackend())
+    limiter = RateLimiter(limit=1, seconds=5)
+    await limiter(DummyRequest(), DummyResponse())
+    assert Cap.backend.metrics is None
+    assert limiter._ensure_backend() is Cap.backend
+    assert metrics.decisions == metrics.key_funcs == metrics.backend_calls == []
+
+
+def test_init_metrics_reaches_the_backend():
+    backend = RedisBackend(Cap.redis)
+    Cap.init_backend(backend)
+    metrics = Metrics()
+    Cap.init_metrics(metrics)
+    try:
+        assert backend.metrics is metrics
+    finally:
+        Cap.init_metrics(None)
+    assert backend.metrics is None
+
+
+@pytest.mark.asyncio
+async def test_prometheus_metrics():
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    Cap.init_metrics(PrometheusMetrics(registry=registry))
+    try:
+        limiter = RateLimiter(limit=1, seconds=5, name="api")
+        await limiter(DummyRequest(), DummyResponse())
+        with pytest.raises(Exception):
+            await limiter(DummyRequest(), DummyResponse())
+    finally:
+        Cap.init_metrics(None)
+    sample = registry.get_sample_value
+    assert sample("cap_decisions_total", {"limiter": "api", "decision": "allowed"}) == 1
+    assert sample("cap_decisions_total", {"limiter": "api", "decision": "denied"}) == 1
+    assert sample("cap_backend_seconds_count", {"limiter": "api"}) == 2
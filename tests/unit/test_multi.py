@@ -0,0 +1,157 @@
+import time
+
+import pytest
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap import lua
+from fastapicap.backends import MemoryBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+def _recording_limiter(rules):
+    calls = []
+
+    async def on_limit(request, response, retry_after):
+        calls.append(retry_after)
+
+    return MultiRateLimiter(rules, on_limit=on_limit), calls
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "rule",
+    [
+        (RateLimiter, {"limit": 2, "seconds": 5}),
+        (SlidingWindowRateLimiter, {"limit": 2, "minutes": 1}),
+        (TokenBucketRateLimiter, {"capacity": 2, "tokens_per_minute": 1}),
+        (LeakyBucketRateLimiter, {"capacity": 2, "leaks_per_minute": 1}),
+        (GCRARateLimiter, {"burst": 2, "tokens_per_minute": 1}),
+        (SlidingWindowLogRateLimiter, {"limit": 2, "window_seconds": 5}),
+    ],
+)
+async def test_multi_supports_every_strategy(rule):
+    limiter, calls = _recording_limiter([rule])
+    request = DummyRequest()
+    for _ in range(3):
+        await limiter(request, DummyResponse())
+    assert len(calls) == 1
+    assert calls[0] >= 1
+    await limiter(DummyRequest(ip="5.6.7.8"), DummyResponse())
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_multi_denied_request_consumes_nothing():
+    limiter, calls = _recording_limiter(
+        [
+            (RateLimiter, {"limit": 1, "minutes": 1}),
+            (TokenBucketRateLimiter, {"capacity": 5, "tokens_per_minute": 1}),
+        ]
+    )
+    request = DummyRequest()
+    for _ in range(3):
+        await limiter(request, DummyResponse())
+    assert len(calls) == 2
+    full_key = limiter._full_key(await limiter.key_func(request))
+    bucket_key = f"{full_key}:{limiter.rules[1]._instance_id}"
+    tokens = float(await Cap.redis.hget(bucket_key, "tokens"))
+    assert 3.9 < tokens < 4.1
+
+
+@pytest.mark.asyncio
+async def test_multi_returns_longest_retry_after():
+    limiter, calls = _recording_limiter(
+        [
+            (RateLimiter, {"limit": 1, "seconds": 10}),
+            (RateLimiter, {"limit": 1, "minutes": 1}),
+            (GCRARateLimiter, {"burst": 5, "tokens_per_second": 1}),
+        ]
+    )
+    request = DummyRequest()
+    await limiter(request, DummyResponse())
+    await limiter(request, DummyResponse())
+    assert calls == [60]
+
+
+@pytest.mark.asyncio
+async def test_multi_keys_share_hash_tag():
+    limiter = MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 10, "seconds": 1}),
+            (SlidingWindowRateLimiter, {"limit": 500, "minutes": 1}),
+        ]
+    )
+    full_key = limiter._full_key("client")
+    keys = limiter._keys(full_key, int(time.time() * 1000))
+    assert len(keys) == 3
+    assert all(key.startswith(full_key) for key in keys)
+
+
+def test_multi_identity_depends_on_rules():
+    rules = [(RateLimiter, {"limit": 10, "seconds": 1})]
+    assert MultiRateLimiter(rules)._instance_id == MultiRateLimiter(rules)._instance_id
+    other = MultiRateLimiter([(RateLimiter, {"limit": 11, "seconds": 1})])
+    assert other._instance_id != MultiRateLimiter(rules)._instance_id
+
+
+def test_multi_rejects_invalid_rules():
+    with pytest.raises(ValueError):
+        MultiRateLimiter([])
+    with pytest.raises(ValueError):
+        MultiRateLimiter(
+            [
+                (RateLimiter, {"limit": 1, "seconds": 1}),
+                (RateLimiter, {"limit": 1, "seconds": 1}),
+            ]
+        )
+    with pytest.raises(ValueError):
+        MultiRateLimiter(
+            [(LeasedTokenBucketRateLimiter, {"capacity": 5, "tokens_per_second": 1})]
+        )
+    with pytest.raises(ValueError):
+        MultiRateLimiter([(TokenBucketRateLimiter, {"capacity": 5})])
+
+
+@pytest.mark.asyncio
+async def test_multi_memory_backend_matches_redis():
+    limiter = MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 4, "minutes": 1}),
+            (SlidingWindowRateLimiter, {"limit": 5, "minutes": 1}),
+            (TokenBucketRateLimiter, {"capacity": 3, "tokens_per_second": 1}),
+            (LeakyBucketRateLimiter, {"capacity": 4, "leaks_per_second": 1}),
+            (GCRARateLimiter, {"burst": 3, "tokens_per_second": 1}),
+            (SlidingWindowLogRateLimiter, {"limit": 4, "window_seconds": 5}),
+        ]
+    )
+    memory = MemoryBackend()
+    full_key = limiter._full_key("client")
+    now = int(time.time() * 1000)
+    for step in range(6):
+        call_now = now + step * 300
+        keys = limiter._keys(full_key, call_now)
+        args = (call_now, *limiter._rule_args)
+        expected = await Cap.backend.run(lua.MULTI_LUA, keys, args)
+        actual = await memory.run(lua.MULTI_LUA, keys, args)
+        assert (actual[0], actual[2], actual[3]) == (expected[0], expected[2], expected[3])
+        assert abs(actual[1] - expected[1]) < 100
+        assert abs(actual[4] - expected[4]) < 100
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from fastapi import Response
+
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    Quota,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap.backends import MemoryBackend, RedisBackend
+from fastapicap.base_limiter import BaseLimiter
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+LIMITERS = [
+    RateLimiter(limit=2, seconds=30),
+    SlidingWindowRateLimiter(limit=2, seconds=30),
+    TokenBucketRateLimiter(capacity=2, tokens_per_minute=1),
+    LeakyBucketRateLimiter(capacity=2, leaks_per_minute=1),
+    GCRARateLimiter(burst=2, tokens_per_minute=1),
+    SlidingWindowLogRateLimiter(limit=2, window_seconds=30),
+    SlidingWindowLogRateLimiter(limit=2, window_seconds=30, bucket_seconds=1),
+    MultiRateLimiter(
+        [
+            (RateLimiter, {"limit": 5, "seconds": 30}),
+            (GCRARateLimiter, {"burst": 2, "tokens_per_minute": 1}),
+        ]
+    ),
+]
+
+
+@pytest.fixture(params=["redis", "memory", "server_time"])
+def backend(request, redis_ready):
+    if request.param == "memory":
+        Cap.init_backend(MemoryBackend())
+    elif request.param == "server_time":
+        Cap.init_backend(RedisBackend(Cap.redis, server_time=True))
+    return request.param
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("limiter", LIMITERS)
+async def test_peek_does_not_consume(backend, limiter):
+    key = "1.2.3.4:/test"
+    fresh = await limiter.peek(key)
+    assert isinstance(fresh, Quota)
+    assert (fresh.allowed, fresh.remaining, fresh.limit) == (True, 2, 2)
+    assert fresh.retry_after_ms == 0
+
+    response = Response()
+    await limiter(DummyRequest(), response)
+    quota = await limiter.peek(key)
+    assert quota.allowed
+    assert quota.remaining == int(response.headers["RateLimit-Remaining"]) == 1
+    assert quota.limit == 2
+    assert (await limiter.peek(key)).remaining == 1
+
+    # Sliding logs record one entry per millisecond.
+    await asyncio.sleep(0.002)
+    await limiter(DummyRequest(), Response())
+    quota = await limiter.peek(key)
+    assert (quota.allowed, quota.remaining) == (False, 0)
+    assert quota.retry_after_ms > 0
+    assert quota.reset_ms >= quota.retry_after_ms
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), Response())
+
+
+@pytest.mark.asyncio
+async def test_peek_many(backend):
+    limiter = TokenBucketRateLimiter(capacity=3, tokens_per_minute=1)
+    for ip, calls in (("1.1.1.1", 1), ("2.2.2.2", 3)):
+        for _ in range(calls):
+            await limiter(DummyRequest(ip=ip), Response())
+    keys = [f"{ip}:/test" for ip in ("1.1.1.1", "2.2.2.2", "3.3.3.3")]
+    quotas = await limiter.peek_many(keys)
+    assert [quota.remaining for quota in quotas] == [2, 0, 3]
+    assert [quota.allowed for quota in quotas] == [True, False, True]
+    assert await limiter.peek_many([]) == []
+
+
+@pytest.mark.asyncio
+async def test_limiters_without_peek_rules_are_rejected(backend):
+    class Custom(BaseLimiter):
+        async def __call__(self, request, response):
+            pass
+
+    limiter = Custom()
+    with pytest.raises(TypeError, match="Custom does not support peek"):
+        await limiter.peek("a")
+    with pytest.raises(TypeError, match="Custom does not support peek_many"):
+        await limiter.peek_many(["a"])
+
+
+@pytest.mark.asyncio
+async def test_peek_leased_bucket_reports_the_shared_bucket(redis_ready):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, lease_size=4
+    )
+    await limiter(DummyRequest(), Response())
+    # The worker's lease of 4 tokens is taken from the shared bucket.
+    assert (await limiter.peek("1.2.3.4:/test")).remaining == 6
+
+
+@pytest.mark.asyncio
+async def test_peek_uses_read_only_commands(redis_ready):
+    class RecordingRedis:
+        def __init__(self, redis):
+            self.redis = redis
+            self.commands = []
+
+        async def script_load(self, script):
+            return await self.redis.script_load(script)
+
+        async def execute_command(self, command, *args):
+            self.commands.append(command)
+            if command == "EVALSHA_RO":
+                # Served like Redis 7 would, from the same script cache.
+                command = "EVALSHA"
+            return await self.redis.execute_command(command, *args)
+
+    replica = RecordingRedis(Cap.redis)
+    Cap.init_backend(RedisBackend(Cap.redis, functions=False, replica=replica))
+    limiter = RateLimiter(limit=2, seconds=30)
+    await limiter(DummyRequest(), Response())
+    assert (await limiter.peek("1.2.3.4:/test")).remaining == 1
+    assert replica.commands == ["EVALSHA_RO"]
+
+
+@pytest.mark.asyncio
+async def test_peek_falls_back_to_evalsha(redis_ready):
+    # The test server predates EVALSHA_RO.
+    Cap.init_backend(RedisBackend(Cap.redis, functions=False))
+    limiter = RateLimiter(limit=2, seconds=30)
+    assert (await limiter.peek("k")).remaining == 2
+    assert Cap.backend._evalsha_ro is False
+    assert (await limiter.peek("k")).remaining == 2
+
+
+def test_replica_url_is_not_supported_on_clusters():
+    with pytest.raises(ValueError):
+        Cap.init_app("redis://localhost:7000", cluster=True, replica_url="redis://x")
@@ -0,0 +1,111 @@
+import asyncio
+import time
+
+import pytest
+from fastapicap import (
+    Cap,
+    GCRARateLimiter,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    RateLimiter,
+    SlidingWindowLogRateLimiter,
+    SlidingWindowRateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap import lua
+from fastapicap.backends import MemoryBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+class DummyResponse:
+    pass
+
+
+@pytest.fixture
+def server_time(redis_container):
+    Cap.init_app(redis_container, server_time=True)
+    assert Cap.backend.server_time is True
+    yield
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "limiter",
+    [
+        SlidingWindowRateLimiter(limit=2, seconds=5),
+        TokenBucketRateLimiter(capacity=2, tokens_per_minute=1),
+        LeakyBucketRateLimiter(capacity=2, leaks_per_minute=1),
+        GCRARateLimiter(burst=2, tokens_per_minute=1),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=5),
+        SlidingWindowLogRateLimiter(limit=2, window_seconds=5, bucket_seconds=1),
+        MultiRateLimiter(
+            [
+                (SlidingWindowRateLimiter, {"limit": 2, "seconds": 5}),
+                (GCRARateLimiter, {"burst": 3, "tokens_per_minute": 1}),
+            ]
+        ),
+    ],
+)
+async def test_server_time_limits(server_time, limiter):
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    await asyncio.sleep(0.002)  # Sliding log entries are per millisecond
+    await limiter(request, response)
+    await asyncio.sleep(0.002)
+    with pytest.raises(Exception) as excinfo:
+        await limiter(request, response)
+    assert "Rate limit exceeded" in str(excinfo.value)
+    await limiter(DummyRequest(ip="5.6.7.8"), response)  # Different key
+
+
+@pytest.mark.asyncio
+async def test_server_time_leased_token_bucket(server_time):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=2, tokens_per_minute=1, lease_size=2
+    )
+    request = DummyRequest()
+    await limiter(request, DummyResponse())
+    await limiter(request, DummyResponse())
+    with pytest.raises(Exception):
+        await limiter(request, DummyResponse())
+
+
+@pytest.mark.asyncio
+async def test_server_time_sliding_window_uses_same_keys(server_time):
+    limiter = SlidingWindowRateLimiter(limit=5, seconds=60)
+    request = DummyRequest()
+    await limiter(request, DummyResponse())
+    full_key = limiter._full_key(await limiter.key_func(request))
+    now = int(time.time() * 1000)
+    curr_window_start = now - now % 60000
+    assert await Cap.redis.get(f"{full_key}:{curr_window_start}") == "1"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "script, args",
+    [
+        (lua.TOKEN_BUCKET, ("3", "0.001", lua.SERVER_TIME)),
+        (lua.LEAKY_BUCKET, ("3", "0.001", lua.SERVER_TIME)),
+        (lua.GCRA_LUA, ("3", "0.001", "1000.0", lua.SERVER_TIME)),
+        (lua.SLIDING_LOG_LUA, (lua.SERVER_TIME, "5000", "3")),
+        (lua.SLIDING_LOG_BUCKETED_LUA, (lua.SERVER_TIME, "5000", "3", "1000")),
+    ],
+)
+async def test_memory_backend_server_time_matches_redis(redis_ready, script, args):
+    memory = MemoryBackend()
+    for _ in range(5):
+        await asyncio.sleep(0.002)
+        expected = await Cap.backend.run(script, ("k",), args)
+        actual = await memory.run(script, ("k",), args)
+        assert (actual[0], actual[2], actual[3]) == (expected[0], expected[2], expected[3])
+        assert abs(actual[1] - expected[1]) < 100
+        assert abs(actual[4] - expected[4]) < 100
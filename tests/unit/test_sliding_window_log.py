@@ -138,3 +138,52 @@ async def test_multiple_sliding_log_limiters(redis_ready):
     with pytest.raises(Exception) as excinfo2:
         await limiter2(request, response)
     assert "Rate limit exceeded" in str(excinfo2.value)
+
+
+@pytest.mark.asyncio
+async def test_bucketed_blocks_over_limit(redis_ready):
+    limiter = SlidingWindowLogRateLimiter(limit=3, window_seconds=3, bucket_seconds=1)
+    request = DummyRequest()
+    response = DummyResponse()
+    for _ in range(3):
+        await limiter(request, response)
+    with pytest.raises(Exception) as excinfo:
+        await limiter(request, response)
+    assert "Rate limit exceeded" in str(excinfo.value)
+    await limiter(DummyRequest(ip="5.6.7.8"), response)  # Different key
+
+
+@pytest.mark.asyncio
+async def test_bucketed_memory_is_per_bucket(redis_ready):
+    from fastapicap import Cap
+
+    limiter = SlidingWindowLogRateLimiter(limit=100, window_seconds=60, bucket_seconds=1)
+    request = DummyRequest()
+    response = DummyResponse()
+    await asyncio.gather(*[limiter(request, response) for _ in range(50)])
+    full_key = limiter._full_key(await limiter.key_func(request))
+    counts = await Cap.redis.hgetall(full_key)
+    assert len(counts) <= 2
+    assert sum(int(c) for c in counts.values()) == 50
+
+
+@pytest.mark.asyncio
+async def test_bucketed_resets_after_window(redis_ready):
+    limiter = SlidingWindowLogRateLimiter(limit=1, window_seconds=1, bucket_seconds=0.1)
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)  # Allowed
+    with pytest.raises(Exception):
+        await limiter(request, response)  # Blocked
+    await asyncio.sleep(1.2)  # The request's bucket leaves the window
+    await limiter(request, response)  # Allowed again
+
+
+def test_bucketed_invalid_bucket_size():
+    with pytest.raises(ValueError):
+        SlidingWindowLogRateLimiter(limit=1, window_seconds=1, bucket_seconds=2)
+    with pytest.raises(ValueError):
+        SlidingWindowLogRateLimiter(limit=1, window_seconds=1, bucket_seconds=0.0001)
+    bucketed = SlidingWindowLogRateLimiter(limit=1, window_seconds=1, bucket_seconds=0.5)
+    plain = SlidingWindowLogRateLimiter(limit=1, window_seconds=1)
+    assert bucketed._instance_id != plain._instance_id
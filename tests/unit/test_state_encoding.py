@@ -0,0 +1,131 @@
+import pytest
+import pytest_asyncio
+from fastapi import HTTPException, Response
+
+from fastapicap import (
+    Cap,
+    LeakyBucketRateLimiter,
+    LeasedTokenBucketRateLimiter,
+    MultiRateLimiter,
+    RateLimiter,
+    TokenBucketRateLimiter,
+)
+from fastapicap import lua
+from fastapicap.backends import MemoryBackend
+
+
+class DummyRequest:
+    def __init__(self, path="/test", ip="1.2.3.4"):
+        self.headers = {}
+        self.client = type("client", (), {"host": ip})()
+        self.url = type("url", (), {"path": path})()
+
+
+KEY = "1.2.3.4:/test"
+
+
+@pytest_asyncio.fixture
+async def packing_redis(redis_ready):
+    # Redis embeds Lua's `struct` library; Redis emulations may not.
+    if await Cap.redis.eval("return type(struct)", 0) != "table":
+        pytest.skip("The server's Lua has no struct library.")
+
+
+@pytest.fixture(params=["redis", "memory"])
+def backend(request, redis_ready):
+    if request.param == "memory":
+        Cap.init_backend(MemoryBackend())
+    else:
+        request.getfixturevalue("packing_redis")
+    return request.param
+
+
+async def _remaining(limiter, calls):
+    remaining = []
+    for _ in range(calls):
+        response = Response()
+        try:
+            await limiter(DummyRequest(), response)
+        except HTTPException:
+            remaining.append(None)
+        else:
+            remaining.append(int(response.headers["RateLimit-Remaining"]))
+    return remaining
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "strategy, params",
+    [
+        (TokenBucketRateLimiter, {"capacity": 3, "tokens_per_minute": 1}),
+        (LeakyBucketRateLimiter, {"capacity": 3, "leaks_per_minute": 1}),
+    ],
+)
+async def test_packed_buckets_match_hashes(backend, strategy, params):
+    hashed = strategy(**params, name="hashed")
+    packed = strategy(**params, name="packed", state_encoding="packed")
+    assert await _remaining(packed, 4) == await _remaining(hashed, 4) == [2, 1, 0, None]
+    assert (await packed.peek(KEY))[:3] == (await hashed.peek(KEY))[:3]
+
+
+@pytest.mark.asyncio
+async def test_packed_bucket_is_one_string(packing_redis):
+    limiter = TokenBucketRateLimiter(
+        capacity=3, tokens_per_minute=1, state_encoding="packed"
+    )
+    await limiter(DummyRequest(), Response())
+    full_key = limiter._full_key(KEY)
+    assert await Cap.redis.type(full_key) == "string"
+    assert await Cap.redis.strlen(full_key) == 16
+    assert 0 < await Cap.redis.pttl(full_key) <= 180_000
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "strategy, params",
+    [
+        (TokenBucketRateLimiter, {"capacity": 4, "tokens_per_minute": 1}),
+        (LeakyBucketRateLimiter, {"capacity": 4, "leaks_per_minute": 1}),
+    ],
+)
+async def test_layouts_read_each_other(packing_redis, strategy, params):
+    # Both limiters share their keys, as during a rolling switch.
+    hashed, packed = (
+        strategy(**params, state_encoding=encoding) for encoding in ("hash", "packed")
+    )
+    assert hashed._instance_id == packed._instance_id
+    steps = [hashed, packed, hashed, packed, hashed]
+    assert [(await _remaining(limiter, 1))[0] for limiter in steps] == [
+        3,
+        2,
+        1,
+        0,
+        None,
+    ]
+    assert (await packed.peek(KEY)).remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_packed_leases(backend):
+    limiter = LeasedTokenBucketRateLimiter(
+        capacity=4, tokens_per_minute=1, lease_size=2, state_encoding="packed"
+    )
+    assert limiter.lease_script == lua.TOKEN_BUCKET_LEASE_PACKED
+    assert await _remaining(limiter, 5) == [3, 2, 1, 0, None]
+
+
+def test_invalid_state_encoding():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(capacity=1, tokens_per_minute=1, state_encoding="json")
+    with pytest.raises(ValueError):
+        LeakyBucketRateLimiter(capacity=1, leaks_per_minute=1, state_encoding="")
+    with pytest.raises(ValueError):
+        MultiRateLimiter(
+            [
+                (RateLimiter, {"limit": 5, "seconds": 1}),
+                (
+                    TokenBucketRateLimiter,
+                    {"capacity": 5, "tokens_per_minute": 1, "state_encoding": "packed"},
+                ),
+            ]
+        )
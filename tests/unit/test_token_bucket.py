@@ -134,3 +134,52 @@ async def test_token_bucket_multiple_limiters(redis_ready):
         await limiter1(request, response)  # Blocked for limiter1
     with pytest.raises(Exception):
         await limiter2(request, response)  # Blocked for limiter2
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_static_cost(redis_ready):
+    limiter = TokenBucketRateLimiter(capacity=10, tokens_per_minute=1, cost=4)
+    request = DummyRequest()
+    response = DummyResponse()
+    await limiter(request, response)
+    await limiter(request, response)
+    with pytest.raises(Exception):
+        await limiter(request, response)  # Only 2 tokens left
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_computed_cost(redis_ready):
+    async def cost(request):
+        return int(request.headers.get("x-cost", "1"))
+
+    limiter = TokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, cost=cost, deny_cache=True
+    )
+    response = DummyResponse()
+    expensive = DummyRequest()
+    expensive.headers = {"x-cost": "9"}
+    await limiter(expensive, response)
+    with pytest.raises(Exception):
+        await limiter(expensive, response)
+    # A cheaper request still fits in the remaining token.
+    await limiter(DummyRequest(), response)
+    with pytest.raises(Exception):
+        await limiter(DummyRequest(), response)
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_rejects_computed_cost_above_capacity(redis_ready):
+    limiter = TokenBucketRateLimiter(
+        capacity=10, tokens_per_minute=1, cost=lambda request: 11
+    )
+    with pytest.raises(ValueError):
+        await limiter(DummyRequest(), DummyResponse())
+    with pytest.raises(ValueError):
+        await limiter.check_many(["a"], costs=[11])
+
+
+def test_token_bucket_invalid_cost():
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(capacity=2, tokens_per_second=1, cost=3)
+    with pytest.raises(ValueError):
+        TokenBucketRateLimiter(capacity=2, tokens_per_second=1, cost=0)